@@ -0,0 +1,57 @@
+"""Time a full NDJSON export and re-import of a large blog.
+
+Peak RSS is reported too: both directions stream, so memory should stay
+flat however many posts there are.
+"""
+
+from . import common
+
+import asyncio
+import os
+import resource
+import tempfile
+import time
+
+from blog import bulk
+from blog import database as db
+
+
+N_POSTS = 300_000
+N_USERS = 100
+
+
+def peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def main() -> None:
+    sessionmaker = await db.get_db_sessionmaker()
+    await common.seed(sessionmaker, N_POSTS, N_USERS)
+    print(f"seeded {N_POSTS} posts, peak RSS {peak_rss_mb():.0f}MB")
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "blog.ndjson")
+        start = time.perf_counter()
+        with open(path, "wb") as file:
+            async for chunk in bulk.export_ndjson(sessionmaker):
+                file.write(chunk)
+        elapsed = time.perf_counter() - start
+        size_mb = os.path.getsize(path) / 1024 / 1024
+        print(f"export  {elapsed:6.1f}s  {N_POSTS / elapsed:9.0f} posts/s  "
+              f"{size_mb:.0f}MB  peak RSS {peak_rss_mb():.0f}MB")
+
+        async with db.get_engine().begin() as conn:
+            await conn.run_sync(db.Base.metadata.drop_all)
+            await conn.run_sync(db.Base.metadata.create_all)
+
+        start = time.perf_counter()
+        counts = await bulk.import_ndjson(sessionmaker, bulk._read_file(path))
+        elapsed = time.perf_counter() - start
+        print(f"import  {elapsed:6.1f}s  {counts.posts / elapsed:9.0f} posts/s  "
+              f"{counts.users} users  peak RSS {peak_rss_mb():.0f}MB")
+
+    await db.dispose_engine()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
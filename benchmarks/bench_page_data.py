@@ -0,0 +1,65 @@
+"""Compare serial per-query page loading with the one-checkout page-data loaders"""
+
+from . import common
+
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+import asyncio
+import time
+
+from blog import database as db
+
+
+N_POSTS = 10_000
+CONCURRENCY = [1, 10, 50, 100]
+REQUESTS = 2_000
+
+
+async def serial_homepage(_) -> None:
+    """The old handler: a fresh sessionmaker and one checkout per query"""
+    sessionmaker = async_sessionmaker(db.get_engine(), expire_on_commit=False)
+    await db.fetch_posts(sessionmaker, 10, 0)
+    db.BLOG_CONFIG_CACHE.invalidate()
+    await db.fetch_blog_config(sessionmaker)
+
+
+async def loader_homepage_cold(sessionmaker) -> None:
+    db.BLOG_CONFIG_CACHE.invalidate()
+    await db.fetch_home_page_data(sessionmaker, 10)
+
+
+async def loader_homepage_warm(sessionmaker) -> None:
+    await db.fetch_home_page_data(sessionmaker, 10)
+
+
+async def run(load, sessionmaker, concurrency: int) -> tuple[float, list[float]]:
+    """Issue REQUESTS page loads with `concurrency` in flight at a time"""
+    semaphore = asyncio.Semaphore(concurrency)
+    samples = []
+
+    async def one() -> None:
+        async with semaphore:
+            start = time.perf_counter()
+            await load(sessionmaker)
+            samples.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(REQUESTS)))
+    return time.perf_counter() - start, samples
+
+
+async def main() -> None:
+    sessionmaker = await db.get_db_sessionmaker()
+    await common.seed(sessionmaker, N_POSTS)
+
+    for concurrency in CONCURRENCY:
+        for load in (serial_homepage, loader_homepage_cold, loader_homepage_warm):
+            elapsed, samples = await run(load, sessionmaker, concurrency)
+            print(f"c={concurrency:<4} {load.__name__:<22} {REQUESTS / elapsed:8.0f} req/s  "
+                  f"{common.summarize(samples)}")
+
+    await db.dispose_engine()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
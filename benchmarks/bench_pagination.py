@@ -0,0 +1,56 @@
+"""Compare OFFSET and keyset pagination latency as pages get deeper"""
+
+from . import common
+
+from sqlalchemy import text
+
+import asyncio
+import time
+
+from blog import database as db
+
+
+N_POSTS = 200_000
+PAGE_SIZE = 10
+DEPTHS = [1, 10, 100, 1_000, 10_000, 19_999]
+REPEAT = 50
+
+
+async def cursor_at(sessionmaker, page_no: int) -> str | None:
+    """Cursor that starts page `page_no` (untimed setup)"""
+    if page_no == 1:
+        return None
+    stmt = text(
+        "SELECT date_created, post_id FROM posts "
+        "ORDER BY date_created DESC, post_id DESC "
+        "LIMIT 1 OFFSET :offset"
+    )
+    async with sessionmaker() as session:
+        result = await session.execute(stmt, {"offset": (page_no - 1) * PAGE_SIZE - 1})
+        return db.encode_post_cursor(result.one())
+
+
+async def main() -> None:
+    sessionmaker = await db.get_db_sessionmaker()
+    await common.seed(sessionmaker, N_POSTS)
+
+    for page_no in DEPTHS:
+        cursor = await cursor_at(sessionmaker, page_no)
+        offset_samples, keyset_samples = [], []
+        for _ in range(REPEAT):
+            start = time.perf_counter()
+            await db.fetch_posts(sessionmaker, PAGE_SIZE, (page_no - 1) * PAGE_SIZE)
+            offset_samples.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            await db.fetch_posts_page(sessionmaker, PAGE_SIZE, before=cursor)
+            keyset_samples.append(time.perf_counter() - start)
+
+        print(f"page {page_no:>6}  offset  {common.summarize(offset_samples)}")
+        print(f"page {page_no:>6}  keyset  {common.summarize(keyset_samples)}")
+
+    await db.dispose_engine()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,80 @@
+"""Compare row serialization throughput of rows_to_dicts with the old row_to_dict.
+
+Needs no database server: rows come from an in-memory SQLite table typed
+like the posts listing (ints, strings, datetimes, Decimals, NULLs).
+
+    python -m benchmarks.bench_row_to_dict
+"""
+
+from sqlalchemy import DateTime, Numeric, create_engine, text
+
+import json
+import time
+
+from blog.database.utils import row_to_dict, rows_to_dicts
+
+
+ROW_COUNTS = [100, 1_000, 10_000, 50_000]
+REPEAT = 5
+
+
+def legacy_row_to_dict(row) -> dict:
+    """The original implementation: json.dumps() every value to probe it"""
+    dictionary = dict(row._mapping)
+    for key, value in dictionary.items():
+        try:
+            json.dumps(value)
+        except (TypeError, OverflowError):
+            dictionary[key] = str(value)
+    return dictionary
+
+
+def make_rows(n: int) -> list:
+    engine = create_engine("sqlite://")
+    with engine.connect() as conn:
+        conn.execute(text(
+            "CREATE TABLE posts (post_id INTEGER, title TEXT, description TEXT, "
+            "date_created TIMESTAMP, date_updated TIMESTAMP, price NUMERIC, image_url TEXT)"
+        ))
+        conn.execute(
+            text("INSERT INTO posts VALUES (:i, :title, :description, :date, :date, :price, :image_url)"),
+            [
+                {
+                    "i": i,
+                    "title": f"Post {i}",
+                    "description": "A description " * 5,
+                    "date": "2024-01-01 12:00:00.000000",
+                    "price": f"{i}.99",
+                    "image_url": None if i % 3 else "https://example.com/image.png",
+                }
+                for i in range(n)
+            ],
+        )
+        stmt = text("SELECT * FROM posts").columns(
+            date_created=DateTime, date_updated=DateTime, price=Numeric(asdecimal=True)
+        )
+        return conn.execute(stmt).all()
+
+
+def best_of(func, rows) -> float:
+    timings = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        func(rows)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main() -> None:
+    for n in ROW_COUNTS:
+        rows = make_rows(n)
+        legacy = best_of(lambda rows: [legacy_row_to_dict(row) for row in rows], rows)
+        single = best_of(lambda rows: [row_to_dict(row) for row in rows], rows)
+        bulk = best_of(rows_to_dicts, rows)
+        print(f"{n:>6} rows  legacy {n / legacy:>10,.0f} rows/s  "
+              f"row_to_dict {n / single:>10,.0f} rows/s  "
+              f"rows_to_dicts {n / bulk:>10,.0f} rows/s  ({legacy / bulk:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""Measure full-text search latency on a synthetic 100k-post corpus"""
+
+from . import common
+
+from sqlalchemy import text
+
+import asyncio
+import time
+
+from blog import database as db
+
+
+N_POSTS = 100_000
+REPEAT = 100
+QUERIES = {
+    "broad topic": "postgres",
+    "two topics": "python caching",
+    "phrase": '"notes about security"',
+    "rare token": None,  # filled in from the corpus
+    "no match": "zzzyzzyx",
+}
+
+
+async def main() -> None:
+    sessionmaker = await db.get_db_sessionmaker()
+    await common.seed(sessionmaker, N_POSTS)
+
+    async with sessionmaker() as session:
+        result = await session.execute(text("SELECT left(md5('4242'), 8)"))
+        QUERIES["rare token"] = result.scalar_one()
+
+    for label, query in QUERIES.items():
+        for offset in (0, 40):
+            samples = []
+            for _ in range(REPEAT):
+                start = time.perf_counter()
+                await db.search_posts(sessionmaker, query, 10, offset)
+                samples.append(time.perf_counter() - start)
+            print(f"{label:<12} offset {offset:>3}  {common.summarize(samples)}")
+
+    await db.dispose_engine()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
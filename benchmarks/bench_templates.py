@@ -0,0 +1,84 @@
+"""Measure template startup cost and first-render latency per template mode.
+
+Needs no database server:
+
+    python -m benchmarks.bench_templates
+"""
+
+from starlette.templating import Jinja2Templates
+
+from datetime import datetime
+from types import SimpleNamespace
+
+import tempfile
+import time
+
+from blog.database import PostSummary
+from blog.templates import create_environment, datetime_format, highlight
+
+
+class FakeRequest:
+    """Just enough of a Request for the templates to render"""
+    session = {}
+
+    def url_for(self, name: str, **path_params) -> str:
+        return f"/{name}/" + "/".join(str(value) for value in path_params.values())
+
+    url_path_for = url_for
+
+    @property
+    def app(self) -> "FakeRequest":
+        return self
+
+
+def make_templates(mode: str, cache_dir: str) -> Jinja2Templates:
+    templates = Jinja2Templates(env=create_environment(mode, cache_dir))
+    templates.env.filters["datetime_format"] = datetime_format
+    templates.env.filters["highlight"] = highlight
+    return templates
+
+
+def time_startup(templates: Jinja2Templates) -> float:
+    start = time.perf_counter()
+    for name in templates.env.list_templates(extensions=["html"]):
+        templates.env.get_template(name)
+    return time.perf_counter() - start
+
+
+def time_first_render(templates: Jinja2Templates) -> float:
+    context = {
+        "request": FakeRequest(),
+        "blog_config": SimpleNamespace(navbar_title="Blog", homepage_heading="Heading",
+                                       homepage_subheading="Sub", banner_image_url="", about=""),
+        "posts": [
+            PostSummary(post_id=i, title=f"Post {i}", description="Description", image_url=None,
+                        date_created=datetime.now(), date_updated=datetime.now(), reading_minutes=3, name="Author")
+            for i in range(10)
+        ],
+    }
+    start = time.perf_counter()
+    templates.env.get_template("home.html").render(context)
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    cache_dir = tempfile.mkdtemp(prefix="bench-jinja-")
+    scenarios = [
+        ("development (compile, auto-reload)", "development"),
+        ("production, cold bytecode cache", "production"),
+        ("production, warm bytecode cache", "production"),
+    ]
+    for label, mode in scenarios:
+        startup = time_startup(make_templates(mode, cache_dir))
+        first_render = time_first_render(make_templates(mode, cache_dir))
+        print(f"{label:<38} precompile all {startup * 1000:7.2f}ms  "
+              f"first home.html render {first_render * 1000:7.2f}ms")
+
+    templates = make_templates("production", cache_dir)
+    time_startup(templates)
+    print(f"{'production, after precompile':<38} {'':>26}"
+          f"first home.html render {time_first_render(templates) * 1000:7.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
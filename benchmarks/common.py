@@ -0,0 +1,97 @@
+"""Shared helpers for the benchmark scripts.
+
+Benchmarks seed and query a throwaway database, never the one in .env:
+set BENCH_DATABASE_URL_ASYNC (e.g. postgresql+asyncpg://localhost/blog_bench)
+before running any of them from the repository root, e.g.
+
+    BENCH_DATABASE_URL_ASYNC=... python -m benchmarks.bench_pagination
+"""
+
+import os
+import statistics
+import sys
+
+if "BENCH_DATABASE_URL_ASYNC" not in os.environ:
+    sys.exit("Set BENCH_DATABASE_URL_ASYNC to a scratch database to run benchmarks")
+os.environ["DATABASE_URL_ASYNC"] = os.environ["BENCH_DATABASE_URL_ASYNC"]
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from blog import database as db
+
+import bcrypt
+
+
+BENCH_EMAIL = "bench@example.com"
+BENCH_PASSWORD = "bench-password"
+
+TOPICS = [
+    "python", "postgres", "fastapi", "caching", "asyncio", "testing", "design",
+    "performance", "security", "deployment", "databases", "templates",
+]
+
+
+async def seed(
+        async_session: async_sessionmaker[AsyncSession],
+        n_posts: int,
+        n_users: int = 1,
+    ) -> None:
+    """Recreate the tables and fill them with `n_users` authors and `n_posts` posts
+
+    User 1 is an admin that logs in as BENCH_EMAIL / BENCH_PASSWORD; the
+    others are bench<N>@example.com with the same password.
+
+    Args:
+        async_session (async_sessionmaker[AsyncSession]): SQLAlchemy async sessionmaker
+        n_posts (int): Number of synthetic posts to create
+        n_users (int): Number of synthetic users to create
+    """
+    password = bcrypt.hashpw(BENCH_PASSWORD.encode(), bcrypt.gensalt(int(os.environ.get("BCRYPT_ROUNDS", 12))))
+    async with db.get_engine().begin() as conn:
+        await conn.run_sync(db.Base.metadata.drop_all)
+        await conn.run_sync(db.Base.metadata.create_all)
+
+    async with async_session() as session:
+        async with session.begin():
+            await session.execute(text(
+                "INSERT INTO users "
+                "    (email, password, is_admin, is_author, name, bio, organization, social_media_link) "
+                "SELECT "
+                "    CASE WHEN i = 1 THEN :email ELSE 'bench' || i || '@example.com' END, "
+                "    :password, i = 1, true, 'Bench Author ' || i, '', '', '' "
+                "FROM generate_series(1, :n_users) AS i"
+            ), {"email": BENCH_EMAIL, "password": password.decode(), "n_users": n_users})
+            await session.execute(text(
+                "INSERT INTO blog_config "
+                "    (navbar_title, homepage_heading, homepage_subheading, banner_image_url, about) "
+                "VALUES "
+                "    ('Bench', 'Bench blog', 'Synthetic data', '', '')"
+            ))
+            # Each post gets one of TOPICS (broad matches) and an md5 token
+            # (a near-unique match) so search benchmarks have realistic selectivity
+            await session.execute(text(
+                "INSERT INTO posts "
+                "    (date_created, title, description, content, content_html, excerpt, "
+                "     word_count, reading_minutes, created_by_user_id, image_url) "
+                "SELECT "
+                "    now() at time zone 'utc' - make_interval(mins => i), "
+                "    'Post ' || i || ' on ' || (CAST(:topics AS text[]))[1 + i % cardinality(CAST(:topics AS text[]))], "
+                "    'Notes about ' || (CAST(:topics AS text[]))[1 + (i / 7) % cardinality(CAST(:topics AS text[]))] "
+                "        || ' and ' || left(md5(i::text), 8), "
+                "    body, body, left(body, 280), 321, 2, "
+                "    1 + i % :n_users, "
+                "    '' "
+                "FROM generate_series(1, :n_posts) AS i, "
+                "LATERAL (SELECT repeat('<p>Lorem ipsum dolor sit amet, consectetur adipiscing elit.</p>', 40) "
+                "    || '<p>' || left(md5((i * 31)::text), 8) || '</p>' AS body) AS generated"
+            ), {"n_posts": n_posts, "n_users": n_users, "topics": TOPICS})
+        await session.execute(text("ANALYZE"))
+
+
+def summarize(samples: list[float]) -> str:
+    """Format latency samples (seconds) as mean and p50/p95/p99 in milliseconds"""
+    ms = sorted(sample * 1000 for sample in samples)
+    p50, p95, p99 = (ms[min(len(ms) - 1, int(len(ms) * q))] for q in (0.50, 0.95, 0.99))
+    return (f"mean {statistics.fmean(ms):8.2f}ms  p50 {p50:8.2f}ms  "
+            f"p95 {p95:8.2f}ms  p99 {p99:8.2f}ms")
@@ -0,0 +1,218 @@
+"""Load-test the HTTP routes of a real server.
+
+Seeds the bench database, boots `blog:app` under uvicorn in a subprocess
+and drives each scenario at every concurrency level over keep-alive
+connections, reporting throughput and latency percentiles:
+
+    BENCH_DATABASE_URL_ASYNC=... python -m benchmarks.load --posts 10000 --concurrency 1 8 32
+
+Pass --url to drive a server that is already running (and --skip-seed if
+its database is already seeded). Anonymous scenarios send no cookie, so
+they exercise the page caches the way visitors do; the admin scenarios
+log in once per connection before timing starts.
+"""
+
+from . import common
+
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import time
+import urllib.parse
+
+from blog import database as db
+
+
+class Connection:
+    """Minimal HTTP/1.1 keep-alive client: just enough to time the blog"""
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.cookie = None
+        self._reader = self._writer = None
+
+    async def request(self, method: str, path: str, form: dict | None = None) -> tuple[int, bytes]:
+        if self._writer is None:
+            self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        body = urllib.parse.urlencode(form).encode() if form is not None else b""
+        lines = [f"{method} {path} HTTP/1.1", f"Host: {self.host}:{self.port}", "Accept-Encoding: gzip"]
+        if form is not None:
+            lines.append("Content-Type: application/x-www-form-urlencoded")
+        if body or method == "POST":
+            lines.append(f"Content-Length: {len(body)}")
+        if self.cookie:
+            lines.append(f"Cookie: {self.cookie}")
+        self._writer.write(("\r\n".join(lines) + "\r\n\r\n").encode() + body)
+        await self._writer.drain()
+
+        status_line = await self._reader.readuntil(b"\r\n")
+        status = int(status_line.split()[1])
+        headers = {}
+        while (line := await self._reader.readuntil(b"\r\n")) != b"\r\n":
+            name, _, value = line.decode("latin-1").partition(":")
+            name, value = name.strip().lower(), value.strip()
+            if name == "set-cookie":
+                cookie = value.split(";", 1)[0]
+                self.cookie = None if cookie.endswith("=null") else cookie
+            headers[name] = value
+
+        if headers.get("transfer-encoding") == "chunked":
+            chunks = []
+            while size := int((await self._reader.readuntil(b"\r\n")).split(b";")[0], 16):
+                chunks.append(await self._reader.readexactly(size + 2))
+            await self._reader.readuntil(b"\r\n")
+            content = b"".join(chunk[:-2] for chunk in chunks)
+        else:
+            content = await self._reader.readexactly(int(headers.get("content-length", 0)))
+
+        if headers.get("connection") == "close":
+            await self.close()
+        return status, content
+
+    async def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._reader = self._writer = None
+
+
+async def login(connection: Connection) -> None:
+    form = {"email": common.BENCH_EMAIL, "password": common.BENCH_PASSWORD}
+    status, _ = await connection.request("POST", "/auth/login", form)
+    if status != 303 or not connection.cookie:
+        raise RuntimeError(f"Could not log in as {common.BENCH_EMAIL} (status {status})")
+
+
+async def update_random_post(connection: Connection, n_posts: int) -> tuple[int, bytes]:
+    post_id = random.randint(1, n_posts)
+    form = {
+        "title": f"Post {post_id} (edited)",
+        "description": f"Edited during a load test at {time.time():.0f}",
+        "content": "<p>Lorem ipsum dolor sit amet, consectetur adipiscing elit.</p>" * 40,
+        "image_url": "https://example.com/image.png",
+    }
+    return await connection.request("POST", f"/admin/update-post?post_id={post_id}", form)
+
+
+# Scenario name -> (needs a logged-in connection, request function, expected status)
+SCENARIOS = {
+    "home": (False, lambda c, n: c.request("GET", "/"), 200),
+    "page": (False, lambda c, n: c.request("GET", f"/page/{random.randint(2, max(2, n // 10))}"), 200),
+    "post": (False, lambda c, n: c.request("GET", f"/post/{random.randint(1, n)}"), 200),
+    "login": (False, lambda c, n: c.request("POST", "/auth/login", {
+        "email": common.BENCH_EMAIL, "password": common.BENCH_PASSWORD,
+    }), 303),
+    "admin-edit": (True, lambda c, n: c.request("GET", f"/admin/update-post/{random.randint(1, n)}"), 200),
+    "admin-update": (True, update_random_post, 303),
+}
+
+
+async def run_scenario(host: str, port: int, name: str, concurrency: int, requests: int, n_posts: int) -> str:
+    """Send `requests` requests for one scenario over `concurrency` connections"""
+    needs_login, send, expected = SCENARIOS[name]
+    connections = [Connection(host, port) for _ in range(concurrency)]
+    if needs_login:
+        await asyncio.gather(*(login(connection) for connection in connections))
+
+    samples, errors, remaining = [], 0, requests
+
+    async def worker(connection: Connection) -> None:
+        nonlocal errors, remaining
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            try:
+                status, _ = await send(connection, n_posts)
+            except (OSError, asyncio.IncompleteReadError, ValueError):
+                await connection.close()
+                errors += 1
+                continue
+            samples.append(time.perf_counter() - start)
+            if status != expected:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(connection) for connection in connections))
+    elapsed = time.perf_counter() - start
+    for connection in connections:
+        await connection.close()
+
+    throughput = len(samples) / elapsed if elapsed else 0.0
+    latency = common.summarize(samples) if samples else "no successful requests"
+    return f"{name:<13} c={concurrency:<4} {throughput:9.1f} req/s  errors {errors:<5} {latency}"
+
+
+async def wait_for_port(host: str, port: int, server: subprocess.Popen, timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"Server exited with status {server.returncode}")
+        try:
+            _, writer = await asyncio.open_connection(host, port)
+        except OSError:
+            await asyncio.sleep(0.2)
+            continue
+        writer.close()
+        return
+    raise RuntimeError(f"Server did not listen on {host}:{port} within {timeout}s")
+
+
+def start_server(port: int, workers: int) -> subprocess.Popen:
+    """Boot blog:app under uvicorn against the bench database"""
+    command = [
+        sys.executable, "-m", "uvicorn", "blog:app", "--factory",
+        "--host", "127.0.0.1", "--port", str(port),
+        "--workers", str(workers), "--log-level", "warning", "--no-access-log",
+    ]
+    # Every benchmark login comes from one address with one email; the login
+    # scenario measures bcrypt, not the rate limiter
+    env = {"LOGIN_IP_BURST": "1e9", "LOGIN_EMAIL_BURST": "1e9", **os.environ}
+    return subprocess.Popen(command, env=env)
+
+
+async def main(args: argparse.Namespace) -> None:
+    if not args.skip_seed:
+        sessionmaker = await db.get_db_sessionmaker()
+        await common.seed(sessionmaker, args.posts, args.users)
+        await db.dispose_engine()
+
+    server = None
+    if args.url:
+        url = urllib.parse.urlsplit(args.url)
+        host, port = url.hostname, url.port or 80
+    else:
+        host, port = "127.0.0.1", args.port
+        server = start_server(port, args.workers)
+
+    try:
+        if server is not None:
+            await wait_for_port(host, port, server)
+        for name in args.scenarios:
+            for concurrency in args.concurrency:
+                print(await run_scenario(host, port, name, concurrency, args.requests, args.posts))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--posts", type=int, default=10_000, help="Posts to seed")
+    parser.add_argument("--users", type=int, default=10, help="Users to seed")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32],
+                        help="Concurrent connections; each level is run in turn")
+    parser.add_argument("--requests", type=int, default=2_000, help="Requests per scenario and level")
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--workers", type=int, default=2, help="uvicorn worker processes")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--url", help="Drive this running server instead of booting one")
+    parser.add_argument("--skip-seed", action="store_true", help="Reuse the data already seeded")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
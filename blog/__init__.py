@@ -1,28 +1,96 @@
 from fastapi import FastAPI
 
 from starlette.middleware import Middleware
-from starlette.middleware.sessions import SessionMiddleware
 from starlette.middleware.gzip import GZipMiddleware
 from starlette.routing import Mount
-from starlette.staticfiles import StaticFiles
 
+from contextlib import asynccontextmanager, suppress
+
+import asyncio
+import logging
 import os
 
 from dotenv import load_dotenv
 load_dotenv()
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start and stop per-worker resources"""
+    from . import database as db
+    from . import passwords
+    from . import rate_limit
+    from . import sessions
+    from . import timing
+    from . import view_counts
+    from .routers import metrics
+    from .templates import precompile_templates
+    precompile_templates()
+    engine = db.get_engine()
+    timing.instrument_engine(engine)
+    for replica in db.get_replicas():
+        timing.instrument_engine(replica.engine)
+    replica_monitor = asyncio.create_task(db.monitor_replicas(
+        interval=float(os.environ.get("DB_REPLICA_CHECK_INTERVAL", 5)),
+    )) if db.get_replicas() else None
+    await db.start_invalidation_listener(engine)
+    session_sweeper = asyncio.create_task(sessions.sweep_expired_sessions(
+        app.state.session_backend,
+        interval=float(os.environ.get("SESSION_SWEEP_INTERVAL", 300)),
+        batch_size=int(os.environ.get("SESSION_SWEEP_BATCH", 1000)),
+    ))
+    bucket_sweeper = asyncio.create_task(rate_limit.sweep_idle_buckets(
+        app.state.login_limiter,
+        interval=float(os.environ.get("LOGIN_RATE_LIMIT_SWEEP_INTERVAL", 300)),
+        batch_size=int(os.environ.get("LOGIN_RATE_LIMIT_SWEEP_BATCH", 1000)),
+    ))
+    view_flusher = asyncio.create_task(view_counts.VIEW_BUFFER.run(
+        await db.get_db_sessionmaker(), interval=view_counts.VIEW_FLUSH_INTERVAL,
+    ))
+    metrics_writer = asyncio.create_task(metrics.write_snapshots(metrics.METRICS_WRITE_INTERVAL))
+    yield
+    metrics_writer.cancel()
+    metrics.remove_snapshot()
+    view_flusher.cancel()
+    # An interrupted flush puts its views back as the cancellation lands
+    with suppress(asyncio.CancelledError):
+        await view_flusher
+    try:
+        await view_counts.VIEW_BUFFER.flush(await db.get_db_sessionmaker())
+    except Exception:
+        logging.getLogger(__name__).exception("Writing view counts at shutdown failed")
+    background = [session_sweeper, bucket_sweeper] + ([replica_monitor] if replica_monitor is not None else [])
+    for task in background:
+        task.cancel()
+    # Let a sweep or health check in progress unwind before its engine is disposed
+    await asyncio.gather(*background, return_exceptions=True)
+    await db.stop_invalidation_listener()
+    await db.dispose_replicas()
+    await db.dispose_engine()
+    passwords.shutdown()
+
+
 def app():
+    from .sessions import ReadYourWritesMiddleware, ServerSessionMiddleware, backend_from_env
+    from .rate_limit import limiter_from_env
+    from .static_assets import HashedStaticFiles
+    from .timing import TimingMiddleware
 
+    session_backend = backend_from_env()
     middleware = [
-        Middleware(SessionMiddleware, secret_key=os.environ["SECRET_KEY"]),
+        Middleware(TimingMiddleware),
+        Middleware(ServerSessionMiddleware, backend=session_backend, secret_key=os.environ["SECRET_KEY"]),
+        Middleware(ReadYourWritesMiddleware),
         Middleware(GZipMiddleware)
     ]
 
     routes = [
-        Mount('/static', app=StaticFiles(directory='./blog/static'), name='static'),
+        Mount('/static', app=HashedStaticFiles(directory='./blog/static'), name='static'),
     ]
 
-    app = FastAPI(middleware=middleware, routes=routes)
+    app = FastAPI(middleware=middleware, routes=routes, lifespan=lifespan)
+    app.state.session_backend = session_backend
+    app.state.login_limiter = limiter_from_env()
 
     from .routers import home
     app.include_router(home.router)
@@ -33,4 +101,10 @@ def app():
     from .routers import admin
     app.include_router(admin.router)
 
+    from .routers import feeds
+    app.include_router(feeds.router)
+
+    from .routers import metrics
+    app.include_router(metrics.router)
+
     return app
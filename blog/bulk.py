@@ -0,0 +1,294 @@
+"""Bulk import and export of users and posts as NDJSON.
+
+Each line is one JSON object. Its "type" is "user" or "post", and the rest
+are that table's columns (see USER_EXPORT_COLUMNS and POST_EXPORT_COLUMNS).
+Passwords are bcrypt hashes. An export lists every user before any post,
+so it can be imported as is:
+
+    python -m blog.bulk export blog.ndjson
+    python -m blog.bulk import blog.ndjson
+
+Imports are inserted BULK_BATCH_SIZE records per transaction. A malformed
+line, or a batch the database rejects, stops the import, but the batches
+before it stay committed. Records whose ID already exists are skipped, as
+are users without an ID whose email already exists, so rerunning an import
+is safe.
+"""
+
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import AsyncIterable, AsyncIterator, Awaitable, Callable
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+
+from . import database as db
+from .content import CONTENT_FORMATS, HTML
+
+
+logger = logging.getLogger(__name__)
+
+BULK_BATCH_SIZE = int(os.environ.get("BULK_BATCH_SIZE", 1000))
+BULK_MAX_LINE_BYTES = int(os.environ.get("BULK_MAX_LINE_BYTES", 16 * 1024 * 1024))
+
+USER_DEFAULTS = {
+    "user_id": None, "date_created": None, "is_admin": False, "is_author": False,
+    "name": "", "bio": "", "organization": "", "social_media_link": "",
+}
+USER_REQUIRED = ("email", "password")
+# Exports made before content_format existed only hold HTML posts
+POST_DEFAULTS = {
+    "post_id": None, "date_created": None, "date_updated": None, "description": "", "image_url": "",
+    "content_format": HTML,
+}
+POST_REQUIRED = ("title", "content", "created_by_user_id")
+
+# JSON type of each column; dates are checked by _parse_datetime
+COLUMN_TYPES = {
+    "user_id": int, "post_id": int, "created_by_user_id": int,
+    "is_admin": bool, "is_author": bool,
+    "email": str, "password": str, "name": str, "bio": str, "organization": str, "social_media_link": str,
+    "title": str, "description": str, "content": str, "content_format": str, "image_url": str,
+}
+NULLABLE_COLUMNS = {"user_id", "post_id", "description", "image_url"}
+
+
+class BulkImportError(ValueError):
+    """Raised for a line that isn't a valid user or post record, or a batch the database rejected"""
+
+    def __init__(self, line_no: int, reason: str, last_line_no: int | None = None):
+        if last_line_no is None or last_line_no == line_no:
+            super().__init__(f"Line {line_no}: {reason}")
+        else:
+            super().__init__(f"Lines {line_no}-{last_line_no}: {reason}")
+        self.line_no = line_no
+        self.last_line_no = last_line_no or line_no
+
+
+@dataclass
+class ImportCounts:
+    """Records read from an import, by type"""
+    users: int = 0
+    posts: int = 0
+
+
+def _ndjson(record_type: str, rows: list[dict]) -> bytes:
+    return "".join(json.dumps({"type": record_type, **row}) + "\n" for row in rows).encode()
+
+
+async def export_ndjson(
+        async_session: async_sessionmaker[AsyncSession],
+        chunk_size: int = BULK_BATCH_SIZE
+    ) -> AsyncIterator[bytes]:
+    """Stream every user then every post as NDJSON, one chunk of lines at a time"""
+    async for users in db.export_users(async_session, chunk_size):
+        yield _ndjson("user", users)
+    async for posts in db.export_posts(async_session, chunk_size):
+        yield _ndjson("post", posts)
+
+
+_JSON_TYPE_NAMES = {int: "an integer", bool: "true or false", str: "a string"}
+
+
+def _parse_datetime(line_no: int, value) -> datetime | None:
+    if value is None or isinstance(value, datetime):
+        return value
+    try:
+        parsed = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise BulkImportError(line_no, f"invalid date {value!r}") from None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def parse_record(line_no: int, line: bytes) -> tuple[str, dict]:
+    """Validate one NDJSON line and fill in defaults
+
+    Returns:
+        tuple[str, dict]: Record type ("user" or "post") and its columns
+
+    Raises:
+        BulkImportError: If the line isn't a valid record
+    """
+    try:
+        record = json.loads(line)
+    except ValueError as e:
+        raise BulkImportError(line_no, f"invalid JSON ({e})") from None
+    if not isinstance(record, dict):
+        raise BulkImportError(line_no, "expected a JSON object")
+
+    record_type = record.pop("type", None)
+    if record_type == "user":
+        defaults, required = USER_DEFAULTS, USER_REQUIRED
+    elif record_type == "post":
+        defaults, required = POST_DEFAULTS, POST_REQUIRED
+    else:
+        raise BulkImportError(line_no, f"unknown record type {record_type!r}")
+
+    missing = [name for name in required if record.get(name) is None]
+    if missing:
+        raise BulkImportError(line_no, f"missing {', '.join(missing)}")
+    columns = {name: record.get(name, default) for name, default in defaults.items()}
+    columns.update({name: record[name] for name in required})
+
+    for name, value in columns.items():
+        expected = COLUMN_TYPES.get(name)
+        if expected is None or (value is None and name in NULLABLE_COLUMNS):
+            continue
+        # bool is a subclass of int, but true isn't an ID
+        if not isinstance(value, expected) or (expected is int and isinstance(value, bool)):
+            raise BulkImportError(line_no, f"{name} must be {_JSON_TYPE_NAMES[expected]}")
+
+    if record_type == "post" and columns["content_format"] not in CONTENT_FORMATS:
+        raise BulkImportError(line_no, f"content_format must be one of {', '.join(CONTENT_FORMATS)}")
+    if record_type == "user" and not columns["password"].startswith("$2"):
+        raise BulkImportError(line_no, "password must be a bcrypt hash")
+    for name in ("date_created", "date_updated"):
+        if name in columns:
+            columns[name] = _parse_datetime(line_no, columns[name])
+    return record_type, columns
+
+
+async def _lines(chunks: AsyncIterable[bytes]) -> AsyncIterator[bytes]:
+    """Split a stream of byte chunks into lines"""
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        if len(buffer) > BULK_MAX_LINE_BYTES:
+            raise ValueError(f"A line is longer than BULK_MAX_LINE_BYTES ({BULK_MAX_LINE_BYTES})")
+        for line in lines:
+            yield line
+    yield buffer
+
+
+class _Batch:
+    """Records of one type waiting to be inserted, and the lines they came from"""
+
+    def __init__(self, insert: Callable[[async_sessionmaker[AsyncSession], list[dict]], Awaitable[None]]):
+        self.insert_records = insert
+        self.records: list[dict] = []
+        self.first_line_no = 0
+        self.last_line_no = 0
+        self.committed = False
+
+    def add(self, line_no: int, columns: dict) -> None:
+        if not self.records:
+            self.first_line_no = line_no
+        self.records.append(columns)
+        self.last_line_no = line_no
+
+    async def insert(self, async_session: async_sessionmaker[AsyncSession]) -> None:
+        """Insert and clear the pending records in one transaction
+
+        Raises:
+            BulkImportError: If the database rejected the batch
+        """
+        if not self.records:
+            return
+        try:
+            await self.insert_records(async_session, self.records)
+        except DBAPIError as e:
+            raise BulkImportError(
+                self.first_line_no, f"the database rejected this batch ({e.orig})", self.last_line_no
+            ) from e
+        self.records = []
+        self.committed = True
+
+
+async def import_ndjson(
+        async_session: async_sessionmaker[AsyncSession],
+        chunks: AsyncIterable[bytes],
+        batch_size: int = BULK_BATCH_SIZE
+    ) -> ImportCounts:
+    """Import users and posts from an NDJSON byte stream in batches
+
+    Pending users are always inserted before a batch of posts, so a post
+    may follow its author anywhere earlier in the stream.
+
+    Args:
+        async_session (async_sessionmaker[AsyncSession]): SQLAlchemy async sessionmaker
+        chunks (AsyncIterable[bytes]): NDJSON, split anywhere
+        batch_size (int): Records per transaction
+
+    Returns:
+        ImportCounts
+
+    Raises:
+        BulkImportError: At the first invalid line or rejected batch
+    """
+    counts = ImportCounts()
+    users, posts = _Batch(db.import_users), _Batch(db.import_posts)
+    line_no = 0
+    try:
+        async for line in _lines(chunks):
+            line_no += 1
+            if not line.strip():
+                continue
+            record_type, columns = parse_record(line_no, line)
+            if record_type == "user":
+                users.add(line_no, columns)
+                counts.users += 1
+            else:
+                posts.add(line_no, columns)
+                counts.posts += 1
+
+            if len(users.records) >= batch_size:
+                await users.insert(async_session)
+            if len(posts.records) >= batch_size:
+                await users.insert(async_session)
+                await posts.insert(async_session)
+
+        await users.insert(async_session)
+        await posts.insert(async_session)
+    except Exception as e:
+        if users.committed or posts.committed:
+            # The committed batches' IDs must still move the sequences past them
+            try:
+                await db.finish_import(async_session)
+            except Exception:
+                logger.exception("Finishing a failed import failed")
+        if isinstance(e, ValueError) and not isinstance(e, BulkImportError):  # An overlong line
+            raise BulkImportError(line_no + 1, str(e)) from None
+        raise
+    await db.finish_import(async_session)
+    return counts
+
+
+async def _read_file(path: str, chunk_size: int = 1 << 20) -> AsyncIterator[bytes]:
+    with (open(path, "rb") if path != "-" else sys.stdin.buffer) as file:
+        while chunk := file.read(chunk_size):
+            yield chunk
+
+
+async def main(args: argparse.Namespace) -> None:
+    sessionmaker = await db.get_db_sessionmaker()
+    try:
+        if args.command == "export":
+            with (open(args.path, "wb") if args.path != "-" else sys.stdout.buffer) as file:
+                async for chunk in export_ndjson(sessionmaker, args.batch_size):
+                    file.write(chunk)
+        else:
+            counts = await import_ndjson(sessionmaker, _read_file(args.path), args.batch_size)
+            print(f"Imported {counts.users} users and {counts.posts} posts", file=sys.stderr)
+    finally:
+        await db.dispose_engine()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk import or export users and posts as NDJSON")
+    parser.add_argument("command", choices=["import", "export"])
+    parser.add_argument("path", nargs="?", default="-", help="NDJSON file, or - for stdin/stdout")
+    parser.add_argument("--batch-size", type=int, default=BULK_BATCH_SIZE)
+    try:
+        asyncio.run(main(parser.parse_args()))
+    except BulkImportError as e:
+        sys.exit(str(e))
@@ -0,0 +1,91 @@
+"""Conditional GET (ETag / Last-Modified) support for the public pages.
+
+Only anonymous visitors without a pending flash message get validators:
+their pages are identical for everyone, so a 304 can never hand one visitor
+a page rendered for another.
+"""
+
+from fastapi import Request
+from starlette.responses import Response
+
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Awaitable, Callable
+
+import functools
+
+
+@dataclass(frozen=True)
+class Validator:
+    """Cache validators for one version of a page"""
+    etag: str
+    last_modified: datetime | None
+
+    @classmethod
+    def build(cls, *parts: object, last_modified: datetime | None) -> "Validator":
+        """Make a weak ETag from parts that change whenever the page does
+
+        Args:
+            parts (object): Values identifying the page version
+            last_modified (datetime | None): Naive UTC time of the latest change,
+                or None for a page that can change without a timestamp to show
+                for it; such a page gets no Last-Modified and only ETag matches
+        """
+        if last_modified is not None:
+            last_modified = last_modified.replace(tzinfo=timezone.utc, microsecond=0)
+        return cls('W/"' + "-".join(str(part) for part in parts) + '"', last_modified)
+
+    def headers(self) -> dict[str, str]:
+        """Response headers that advertise this validator"""
+        headers = {"ETag": self.etag, "Cache-Control": "no-cache"}
+        if self.last_modified is not None:
+            headers["Last-Modified"] = format_datetime(self.last_modified, usegmt=True)
+        return headers
+
+
+def is_not_modified(request: Request, validator: Validator) -> bool:
+    """Whether the client's cached copy matches validator.
+
+    If-None-Match takes precedence over If-Modified-Since, as in RFC 9110.
+    """
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match is not None:
+        etags = {etag.strip().removeprefix("W/") for etag in if_none_match.split(",")}
+        return "*" in etags or validator.etag.removeprefix("W/") in etags
+
+    if_modified_since = request.headers.get("If-Modified-Since")
+    if if_modified_since is not None and validator.last_modified is not None:
+        try:
+            return validator.last_modified <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def conditional_page(validator: Callable[..., Awaitable[Validator | None]]) -> Callable:
+    """Answer conditional GETs with 304 before the endpoint runs.
+
+    Args:
+        validator: Async function called with the endpoint's keyword arguments
+            that returns the page's current Validator, or None to skip
+    """
+    def decorator(endpoint: Callable[..., Awaitable[Response]]) -> Callable[..., Awaitable[Response]]:
+        @functools.wraps(endpoint)
+        async def wrapper(*args, **kwargs) -> Response:
+            request: Request = kwargs["request"]
+            if request.session.get("user") or request.session.get("message"):
+                return await endpoint(*args, **kwargs)
+
+            current = await validator(**kwargs)
+            if current is None:
+                return await endpoint(*args, **kwargs)
+            if is_not_modified(request, current):
+                return Response(status_code=304, headers=current.headers())
+
+            response = await endpoint(*args, **kwargs)
+            if response.status_code == 200:
+                response.headers.update(current.headers())
+            return response
+        return wrapper
+    return decorator
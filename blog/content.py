@@ -0,0 +1,118 @@
+"""Write-time content pipeline.
+
+A post's content is Markdown, with inline HTML allowed. Posts written
+before Markdown support are HTML, marked by content_format "html", and
+are only sanitized: as Markdown, any of their lines indented by four or
+more spaces would become a code block of escaped markup. Content is
+rendered and sanitized once, when the post is written, and stored along
+with the fields derived from it. Page views only read the stored columns.
+
+    python -m blog.content rerender
+
+re-renders every stored post, e.g. after changing the pipeline.
+"""
+
+from markdown_it import MarkdownIt
+
+from dataclasses import dataclass
+
+import argparse
+import asyncio
+import html
+import math
+import os
+import re
+import textwrap
+
+import nh3
+
+
+MARKDOWN = "markdown"
+HTML = "html"
+CONTENT_FORMATS = (MARKDOWN, HTML)
+
+WORDS_PER_MINUTE = int(os.environ.get("WORDS_PER_MINUTE", 230))
+EXCERPT_CHARS = int(os.environ.get("EXCERPT_CHARS", 280))
+
+_markdown = MarkdownIt("commonmark", {"html": True}).enable(["table", "strikethrough"])
+_whitespace = re.compile(r"\s+")
+# Block-level closing tags, replaced by a space so words in adjacent blocks don't run together
+_block_end = re.compile(r"</(p|div|h[1-6]|li|blockquote|pre|tr|td|th)>|<br\s*/?>", re.IGNORECASE)
+
+
+@dataclass(frozen=True, slots=True)
+class RenderedContent:
+    """A post's content as stored for display"""
+    html: str
+    excerpt: str
+    word_count: int
+    reading_minutes: int
+
+
+def sanitize_html(unsafe_html: str) -> str:
+    """Remove scripts, event handlers and other unsafe markup"""
+    return nh3.clean(unsafe_html, link_rel="noopener noreferrer nofollow")
+
+
+def plain_text(safe_html: str) -> str:
+    """The text of sanitized HTML, whitespace collapsed"""
+    text = nh3.clean(_block_end.sub(" ", safe_html), tags=set())
+    return _whitespace.sub(" ", html.unescape(text)).strip()
+
+
+def make_excerpt(text: str, limit: int = EXCERPT_CHARS) -> str:
+    """Cut text to at most `limit` characters at a word boundary"""
+    if len(text) <= limit:
+        return text
+    cut = text[:limit]
+    if text[limit] != " " and " " in cut:
+        cut = cut.rsplit(" ", 1)[0]
+    return cut.rstrip(" .,;:") + "…"
+
+
+def render_content(source: str, content_format: str = MARKDOWN) -> RenderedContent:
+    """Render content to sanitized HTML and derive the listing fields from it
+
+    Args:
+        source (str): Content as entered by the author
+        content_format (str): MARKDOWN, or HTML for posts written before Markdown support
+
+    Returns:
+        RenderedContent
+
+    Raises:
+        ValueError: If content_format is unknown
+    """
+    if content_format == MARKDOWN:
+        unsafe_html = _markdown.render(source)
+    elif content_format == HTML:
+        unsafe_html = textwrap.dedent(source).strip()
+    else:
+        raise ValueError(f"Unknown content format {content_format!r}")
+    safe_html = sanitize_html(unsafe_html)
+    text = plain_text(safe_html)
+    word_count = len(text.split())
+    return RenderedContent(
+        html=safe_html,
+        excerpt=make_excerpt(text),
+        word_count=word_count,
+        reading_minutes=max(1, math.ceil(word_count / WORDS_PER_MINUTE)),
+    )
+
+
+async def main(args: argparse.Namespace) -> None:
+    from . import database as db
+
+    sessionmaker = await db.get_db_sessionmaker()
+    try:
+        changed = await db.rerender_posts(sessionmaker, args.batch_size)
+        print(f"Re-rendered {changed} posts whose output changed")
+    finally:
+        await db.dispose_engine()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-render every post's stored HTML and derived fields")
+    parser.add_argument("command", choices=["rerender"])
+    parser.add_argument("--batch-size", type=int, default=500)
+    asyncio.run(main(parser.parse_args()))
@@ -1,3 +1,6 @@
 from .crud import *
+from .engine import *
+from .invalidation import *
 from .models import *
+from .replicas import *
 from .utils import *
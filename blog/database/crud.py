@@ -1,25 +1,78 @@
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.ext.asyncio import async_sessionmaker
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import Row, text
+from sqlalchemy import DateTime, Integer, Row, bindparam, text
+from sqlalchemy.dialects.postgresql import JSONB
 
+from dataclasses import dataclass
+from datetime import datetime
+from typing import AsyncIterator, Awaitable, Callable, Hashable
+
+import asyncio
+import base64
 import os
+import time
 
 from . import models
+from .engine import get_engine, get_sessionmaker
+from .invalidation import dispatch_invalidation, on_invalidate, publish_invalidation
+from .replicas import mark_written, replica_read
+from .utils import rows_to_dicts
 from .. import schema
-
-
-ENGINE = create_async_engine(os.environ["DATABASE_URL_ASYNC"])
+from ..content import MARKDOWN, RenderedContent, render_content
+from ..utils.cache import LRUCache
 
 
 async def get_db_sessionmaker() -> async_sessionmaker[AsyncSession]:
-    return async_sessionmaker(ENGINE, expire_on_commit=False)
+    return get_sessionmaker()
 
 
 async def create_tables() -> None:
-    async with ENGINE.begin() as conn:
+    async with get_engine().begin() as conn:
         await conn.run_sync(models.Base.metadata.create_all)
 
 
+@dataclass(slots=True)
+class PostSummary:
+    """The columns needed to list a post"""
+    post_id: int
+    title: str
+    description: str
+    image_url: str | None
+    date_created: datetime
+    date_updated: datetime
+    reading_minutes: int
+    name: str
+
+
+@dataclass(slots=True)
+class PostDetail:
+    """The columns needed to show or edit a post"""
+    post_id: int
+    title: str
+    description: str
+    content: str
+    content_html: str
+    image_url: str | None
+    date_created: datetime
+    date_updated: datetime
+    reading_minutes: int
+    created_by_user_id: int
+    name: str
+
+
+# Explicit projections keep post content out of listings and the author's
+# password hash out of every post query
+POST_SUMMARY_COLUMNS = (
+    "posts.post_id, posts.title, posts.description, posts.image_url, "
+    "posts.date_created, posts.date_updated, posts.reading_minutes, users.name "
+)
+POST_DETAIL_COLUMNS = (
+    "posts.post_id, posts.title, posts.description, posts.content, posts.content_html, posts.image_url, "
+    "posts.date_created, posts.date_updated, posts.reading_minutes, posts.created_by_user_id, users.name "
+)
+
+
+@replica_read
 async def fetch_user(
         async_session: async_sessionmaker[AsyncSession], 
         selector: int | str
@@ -46,10 +99,11 @@ async def fetch_user(
         return result.one_or_none()
 
 
+@replica_read
 async def fetch_post(
         async_session: async_sessionmaker[AsyncSession], 
         selector: int
-    ) -> Row | None:
+    ) -> PostDetail | None:
     """Fetch a post with author by post ID.
     
     Args:
@@ -57,21 +111,79 @@ async def fetch_post(
         selector (int): ID to fetch a post by
 
     Returns:
-        Post
+        PostDetail | None
     """
+    async with async_session() as session:
+        return await _select_post(session, selector)
+
+
+async def _select_post(session: AsyncSession, selector: int) -> PostDetail | None:
     stmt = text(
-        "SELECT * FROM posts "
+        f"SELECT {POST_DETAIL_COLUMNS}"
+        "FROM posts "
         "JOIN users ON posts.created_by_user_id = users.user_id "
         "WHERE post_id = :selector"
     )
-    async with async_session() as session:
-        params = {"selector": selector}
-        result = await session.execute(stmt, params)
-        return result.one_or_none()
+    params = {"selector": selector}
+    result = await session.execute(stmt, params)
+    row = result.one_or_none()
+    return PostDetail(**row._mapping) if row else None
+
+
+class BlogConfigCache:
+    """In-process cache of the single blog_config row.
+
+    The row is dropped whenever any worker commits a config update (delivered
+    through LISTEN/NOTIFY, see invalidation.py) and otherwise expires after
+    `ttl` seconds in case a notification is missed.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._row: Row | None = None
+        self._expires_at = 0.0
+        self._generation = 0
+
+    @property
+    def generation(self) -> int:
+        """Counter bumped on every invalidation"""
+        return self._generation
+
+    def get(self) -> Row | None:
+        """Return the cached row, or None on a miss"""
+        if self._row is not None and time.monotonic() < self._expires_at:
+            self.hits += 1
+            return self._row
+        self.misses += 1
+        return None
+
+    def set(self, row: Row, generation: int) -> None:
+        """Cache a row unless the cache was invalidated since `generation` was read"""
+        if generation != self._generation:
+            return
+        self._row = row
+        self._expires_at = time.monotonic() + self.ttl
+
+    def invalidate(self) -> None:
+        """Drop the cached row"""
+        self._generation += 1
+        self._row = None
+
+
+BLOG_CONFIG_CACHE = BlogConfigCache(float(os.environ.get("BLOG_CONFIG_CACHE_TTL", 300)))
+
 
+@on_invalidate
+def _invalidate_blog_config(key: str) -> None:
+    if key in ("blog_config", "*"):
+        BLOG_CONFIG_CACHE.invalidate()
 
+
+@replica_read
 async def fetch_blog_config(async_session: async_sessionmaker[AsyncSession]) -> Row:
-    """Fetch the blog's config table row
+    """Fetch the blog's config table row, served from BLOG_CONFIG_CACHE when possible
     
     Args:
         async_session (AsyncSession): SQLAlchemy async session
@@ -79,65 +191,787 @@ async def fetch_blog_config(async_session: async_sessionmaker[AsyncSession]) ->
     Returns:
         BlogConfig
     """
-    stmt = text("SELECT * FROM blog_config WHERE blog_config_id = 1")
+    blog_config = BLOG_CONFIG_CACHE.get()
+    if blog_config is not None:
+        return blog_config
+
     async with async_session() as session:
-        result = await session.execute(stmt)
-        return result.one()
+        return await _select_blog_config(session)
 
 
+async def _select_blog_config(session: AsyncSession) -> Row:
+    generation = BLOG_CONFIG_CACHE.generation
+    stmt = text("SELECT * FROM blog_config WHERE blog_config_id = 1")
+    result = await session.execute(stmt)
+    blog_config = result.one()
+    BLOG_CONFIG_CACHE.set(blog_config, generation)
+    return blog_config
+
+
+@replica_read
 async def fetch_posts(
         async_session: async_sessionmaker[AsyncSession], 
         limit: int,
         offset: int,
-    ) -> list[Row]:
-    """Fetch a post by ID.
+    ) -> list[PostSummary]:
+    """Fetch a page of posts by offset, newest first.
     
     Args:
-        selector (int): ID to fetch a post by
         async_session (AsyncSession): SQLAlchemy async session
+        limit (int): Number of posts
+        offset (int): Number of posts to skip
 
     Returns:
-        Post
+        list[PostSummary]
     """
     stmt = text(
-        "SELECT * FROM posts "
+        f"SELECT {POST_SUMMARY_COLUMNS}"
+        "FROM posts "
         "JOIN users ON posts.created_by_user_id = users.user_id "
-        "ORDER BY posts.date_created DESC "
+        "ORDER BY posts.date_created DESC, posts.post_id DESC "
         "LIMIT :limit "
         "OFFSET :offset"
     )
     async with async_session() as session:
         params = {"limit": limit, "offset": offset}
         results = await session.execute(stmt, params)
-        return [result for result in results.all()] 
+        return [PostSummary(**result._mapping) for result in results.all()]
+
+
+class LastModifiedCache:
+    """In-process cache of post modification times, the basis of page validators.
+
+    Entries are tagged with the invalidation keys that change them, so the
+    same notifications that purge the page cache drop them too. They
+    otherwise expire after `ttl` seconds in case a notification is missed.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._cache = LRUCache(maxsize=maxsize, ttl=ttl)
+        self._generation = 0
+
+    @property
+    def hits(self) -> int:
+        return self._cache.hits
+
+    @property
+    def misses(self) -> int:
+        return self._cache.misses
+
+    async def get(self, key: Hashable, tags: list[str], load: Callable[[], Awaitable[datetime | None]]) -> datetime | None:
+        """Return the cached time for key, loading it on a miss"""
+        value = self._cache.get(key)
+        if value is not None:
+            return value
+        generation = self._generation
+        value = await load()
+        # Don't store a time read before an invalidation that arrived meanwhile
+        if value is not None and generation == self._generation:
+            self._cache.set(key, value, tags)
+        return value
+
+    def invalidate(self, key: str) -> None:
+        self._generation += 1
+        if key == "*":
+            self._cache.clear()
+        else:
+            self._cache.purge_tag(key)
+
+
+LAST_MODIFIED_CACHE = LastModifiedCache(
+    maxsize=int(os.environ.get("LAST_MODIFIED_CACHE_SIZE", 4096)),
+    ttl=float(os.environ.get("LAST_MODIFIED_CACHE_TTL", 300)),
+)
+
+
+@on_invalidate
+def _invalidate_last_modified(key: str) -> None:
+    LAST_MODIFIED_CACHE.invalidate(key)
+
+
+@replica_read
+async def fetch_post_last_modified(
+        async_session: async_sessionmaker[AsyncSession],
+        selector: int
+    ) -> datetime | None:
+    """Fetch when a post was last changed, without loading the post,
+    served from LAST_MODIFIED_CACHE when possible
+    
+    Args:
+        async_session (async_sessionmaker[AsyncSession]): SQLAlchemy async sessionmaker
+        selector (int): ID of the post
+
+    Returns:
+        datetime | None: None if the post doesn't exist
+    """
+    async def load() -> datetime | None:
+        stmt = text("SELECT date_updated FROM posts WHERE post_id = :selector")
+        async with async_session() as session:
+            result = await session.execute(stmt, {"selector": selector})
+            return result.scalar_one_or_none()
+
+    return await LAST_MODIFIED_CACHE.get(("post", selector), [f"post:{selector}"], load)
+
+
+@replica_read
+async def fetch_posts_last_modified(async_session: async_sessionmaker[AsyncSession]) -> datetime | None:
+    """Fetch when any post was last created or changed, served from
+    LAST_MODIFIED_CACHE when possible
+    
+    Args:
+        async_session (async_sessionmaker[AsyncSession]): SQLAlchemy async sessionmaker
+
+    Returns:
+        datetime | None: None if there are no posts
+    """
+    async def load() -> datetime | None:
+        stmt = text("SELECT max(date_updated) FROM posts")
+        async with async_session() as session:
+            result = await session.execute(stmt)
+            return result.scalar_one()
+
+    return await LAST_MODIFIED_CACHE.get("posts", ["listing"], load)
+
+
+@dataclass
+class PostPage:
+    """One page of the post listing with cursors to the neighbouring pages"""
+    posts: list[PostSummary]
+    older_cursor: str | None
+    newer_cursor: str | None
+
+
+def encode_post_cursor(post: PostSummary | PostDetail) -> str:
+    """Encode a post's (date_created, post_id) sort key as an opaque cursor
+
+    Args:
+        post (PostSummary | PostDetail): Post with date_created and post_id
+
+    Returns:
+        str
+    """
+    key = f"{post.date_created.isoformat()}|{post.post_id}"
+    return base64.urlsafe_b64encode(key.encode()).decode().rstrip("=")
+
+
+def decode_post_cursor(cursor: str) -> tuple[datetime, int]:
+    """Decode a cursor made by encode_post_cursor
+
+    Args:
+        cursor (str): Opaque cursor
+
+    Returns:
+        tuple[datetime, int]: (date_created, post_id)
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        date_created, post_id = base64.urlsafe_b64decode(padded).decode().split("|")
+        return datetime.fromisoformat(date_created), int(post_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid post cursor: {cursor!r}") from e
+
+
+def _sort_key(post: PostSummary) -> tuple[datetime, int]:
+    return post.date_created, post.post_id
+
+
+class HomeFeed:
+    """The newest `size` post summaries, kept in memory, newest first.
+
+    Writes made by this worker are applied incrementally (see create_post and
+    update_post). Writes made by other workers arrive as a "feed"
+    invalidation, and the snapshot is then reloaded with one query on the
+    next read. It is also reloaded `ttl` seconds after it was loaded, in
+    case a notification is missed.
+    """
+
+    def __init__(self, size: int, ttl: float):
+        self.size = size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._posts: list[PostSummary] | None = None
+        self._expires_at = 0.0
+        self._generation = 0
+        self._lock = asyncio.Lock()
+
+    def _current(self) -> list[PostSummary] | None:
+        if self._posts is not None and time.monotonic() < self._expires_at:
+            return self._posts
+        return None
+
+    async def posts(self, async_session: async_sessionmaker[AsyncSession]) -> list[PostSummary]:
+        """Return the snapshot, loading it if needed"""
+        posts = self._current()
+        if posts is not None:
+            self.hits += 1
+            return posts
+        async with self._lock:
+            posts = self._current()
+            if posts is not None:
+                self.hits += 1
+                return posts
+            self.misses += 1
+            generation = self._generation
+            posts = await fetch_posts(async_session, self.size, 0)
+            if generation == self._generation:
+                self._posts = posts
+                self._expires_at = time.monotonic() + self.ttl
+            return posts
+
+    async def page(
+            self,
+            async_session: async_sessionmaker[AsyncSession],
+            limit: int,
+            before: str | None = None,
+            after: str | None = None,
+        ) -> PostPage | None:
+        """Serve a keyset page from the snapshot
+
+        Returns:
+            PostPage | None: None if the page reaches past the snapshot
+
+        Raises:
+            ValueError: If a cursor is malformed
+        """
+        posts = await self.posts(async_session)
+        complete = len(posts) < self.size
+
+        if after is not None:
+            cursor = decode_post_cursor(after)
+            end = next((i for i, post in enumerate(posts) if _sort_key(post) <= cursor), None)
+            if end is None:
+                if not complete:
+                    return None
+                end = len(posts)
+            start = max(end - limit, 0)
+            page = posts[start:end]
+            return PostPage(
+                posts=page,
+                older_cursor=encode_post_cursor(page[-1]) if page else None,
+                newer_cursor=encode_post_cursor(page[0]) if page and start > 0 else None,
+            )
+
+        start = 0
+        if before is not None:
+            cursor = decode_post_cursor(before)
+            start = next((i for i, post in enumerate(posts) if _sort_key(post) < cursor), len(posts))
+        if start + limit >= len(posts) and not complete:
+            return None
+        page = posts[start:start + limit]
+        return PostPage(
+            posts=page,
+            older_cursor=encode_post_cursor(page[-1]) if page and start + limit < len(posts) else None,
+            newer_cursor=encode_post_cursor(page[0]) if page and before is not None else None,
+        )
+
+    async def slice(
+            self,
+            async_session: async_sessionmaker[AsyncSession],
+            limit: int,
+            offset: int,
+        ) -> list[PostSummary] | None:
+        """Serve an offset page from the snapshot, or None if it reaches past it"""
+        posts = await self.posts(async_session)
+        if offset + limit > len(posts) and len(posts) == self.size:
+            return None
+        return posts[offset:offset + limit]
+
+    def upsert(self, post: PostSummary) -> None:
+        """Apply a created or updated post to the snapshot"""
+        if self._current() is None:
+            # A load may be in flight that started before this write
+            self._generation += 1
+            return
+        posts = [existing for existing in self._posts if existing.post_id != post.post_id]
+        position = next((i for i, existing in enumerate(posts) if _sort_key(existing) < _sort_key(post)), len(posts))
+        if position < self.size:
+            posts.insert(position, post)
+        self._posts = posts[:self.size]
+
+    def invalidate(self) -> None:
+        """Drop the snapshot so the next read reloads it"""
+        self._generation += 1
+        self._posts = None
+
+
+HOME_FEED = HomeFeed(
+    int(os.environ.get("HOME_FEED_SIZE", 100)),
+    float(os.environ.get("HOME_FEED_TTL", 300)),
+)
+
+
+@on_invalidate
+def _invalidate_home_feed(key: str) -> None:
+    if key in ("feed", "*"):
+        HOME_FEED.invalidate()
+
+
+@replica_read
+async def fetch_posts_page(
+        async_session: async_sessionmaker[AsyncSession],
+        limit: int,
+        before: str | None = None,
+        after: str | None = None,
+    ) -> PostPage:
+    """Fetch a page of posts, newest first, using keyset pagination.
+
+    Seeks on the (date_created, post_id) index instead of skipping rows with
+    OFFSET, so every page costs the same no matter how deep it is.
+
+    Args:
+        async_session (async_sessionmaker[AsyncSession]): SQLAlchemy async sessionmaker
+        limit (int): Number of posts per page
+        before (str | None): Cursor; fetch the posts older than it
+        after (str | None): Cursor; fetch the posts newer than it
+
+    Returns:
+        PostPage
+
+    Raises:
+        ValueError: If a cursor is malformed
+    """
+    async with async_session() as session:
+        return await _select_posts_page(session, limit, before, after)
+
+
+async def _select_posts_page(
+        session: AsyncSession,
+        limit: int,
+        before: str | None,
+        after: str | None,
+    ) -> PostPage:
+    if after is not None:
+        date_created, post_id = decode_post_cursor(after)
+        where = "WHERE (posts.date_created, posts.post_id) > (:date_created, :post_id) "
+        order = "ASC"
+    elif before is not None:
+        date_created, post_id = decode_post_cursor(before)
+        where = "WHERE (posts.date_created, posts.post_id) < (:date_created, :post_id) "
+        order = "DESC"
+    else:
+        date_created, post_id = None, None
+        where = ""
+        order = "DESC"
+
+    stmt = text(
+        f"SELECT {POST_SUMMARY_COLUMNS}"
+        "FROM posts "
+        "JOIN users ON posts.created_by_user_id = users.user_id "
+        f"{where}"
+        f"ORDER BY posts.date_created {order}, posts.post_id {order} "
+        "LIMIT :limit"
+    )
+    params = {"limit": limit + 1}
+    if where:
+        stmt = stmt.bindparams(
+            bindparam("date_created", type_=DateTime),
+            bindparam("post_id", type_=Integer),
+        )
+        params.update({"date_created": date_created, "post_id": post_id})
+
+    results = await session.execute(stmt, params)
+    posts = [PostSummary(**result._mapping) for result in results.all()]
+
+    has_more = len(posts) > limit
+    posts = posts[:limit]
+    if after is not None:
+        posts.reverse()
+        has_older, has_newer = True, has_more
+    else:
+        has_older, has_newer = has_more, before is not None
+
+    return PostPage(
+        posts=posts,
+        older_cursor=encode_post_cursor(posts[-1]) if posts and has_older else None,
+        newer_cursor=encode_post_cursor(posts[0]) if posts and has_newer else None,
+    )
+
+
+@dataclass
+class HomePageData:
+    """Everything the homepage template needs"""
+    blog_config: Row
+    page: PostPage
+
+
+@dataclass
+class PostPageData:
+    """Everything the post page template needs"""
+    blog_config: Row
+    post: PostDetail | None
+
+
+@replica_read
+async def fetch_home_page_data(
+        async_session: async_sessionmaker[AsyncSession],
+        limit: int,
+        before: str | None = None,
+        after: str | None = None,
+    ) -> HomePageData:
+    """Fetch a page of posts and the blog config with one connection checkout
+
+    The config comes from BLOG_CONFIG_CACHE when possible; otherwise it is
+    queried on the same connection as the posts.
+
+    Args:
+        async_session (async_sessionmaker[AsyncSession]): SQLAlchemy async sessionmaker
+        limit (int): Number of posts per page
+        before (str | None): Cursor; fetch the posts older than it
+        after (str | None): Cursor; fetch the posts newer than it
+
+    Returns:
+        HomePageData
+
+    Raises:
+        ValueError: If a cursor is malformed
+    """
+    page = await HOME_FEED.page(async_session, limit, before, after)
+    blog_config = BLOG_CONFIG_CACHE.get()
+    if page is not None and blog_config is not None:
+        return HomePageData(blog_config=blog_config, page=page)
+
+    async with async_session() as session:
+        if page is None:
+            page = await _select_posts_page(session, limit, before, after)
+        if blog_config is None:
+            blog_config = await _select_blog_config(session)
+    return HomePageData(blog_config=blog_config, page=page)
+
+
+@replica_read
+async def fetch_post_page_data(
+        async_session: async_sessionmaker[AsyncSession],
+        selector: int
+    ) -> PostPageData:
+    """Fetch a post with author and the blog config with one connection checkout
+
+    Args:
+        async_session (async_sessionmaker[AsyncSession]): SQLAlchemy async sessionmaker
+        selector (int): ID to fetch a post by
+
+    Returns:
+        PostPageData
+    """
+    blog_config = BLOG_CONFIG_CACHE.get()
+    async with async_session() as session:
+        post = await _select_post(session, selector)
+        if blog_config is None:
+            blog_config = await _select_blog_config(session)
+    return PostPageData(blog_config=blog_config, post=post)
+
+
+@dataclass(slots=True)
+class PopularPost(PostSummary):
+    """A post summary with its view count"""
+    views: int
+
+
+# Keyed by limit. View counts only reach the database in batches (see
+# blog/view_counts.py), so a short TTL loses nothing
+POPULAR_POSTS_CACHE = LRUCache(maxsize=8, ttl=float(os.environ.get("POPULAR_POSTS_TTL", 60)))
+
+
+@on_invalidate
+def _invalidate_popular_posts(key: str) -> None:
+    # Any post write may have changed a title or description shown in the list
+    POPULAR_POSTS_CACHE.clear()
+
+
+@replica_read
+async def fetch_popular_posts(async_session: async_sessionmaker[AsyncSession], limit: int) -> list[PopularPost]:
+    """Fetch the most viewed posts, served from POPULAR_POSTS_CACHE when possible
+
+    Args:
+        async_session (async_sessionmaker[AsyncSession]): SQLAlchemy async sessionmaker
+        limit (int): Number of posts
+
+    Returns:
+        list[PopularPost]: Most viewed first
+    """
+    popular = POPULAR_POSTS_CACHE.get(limit)
+    if popular is not None:
+        return popular
+
+    stmt = text(
+        f"SELECT {POST_SUMMARY_COLUMNS}, post_views.views "
+        "FROM post_views "
+        "JOIN posts ON posts.post_id = post_views.post_id "
+        "JOIN users ON posts.created_by_user_id = users.user_id "
+        "ORDER BY post_views.views DESC, post_views.post_id DESC "
+        "LIMIT :limit"
+    )
+    async with async_session() as session:
+        results = await session.execute(stmt, {"limit": limit})
+        popular = [PopularPost(**result._mapping) for result in results.all()]
+    POPULAR_POSTS_CACHE.set(limit, popular)
+    return popular
+
+
+async def add_post_views(async_session: async_sessionmaker[AsyncSession], views: dict[int, int]) -> None:
+    """Add view counts to posts with a single upsert
+
+    Posts deleted since they were viewed are skipped. IDs are written in
+    order so concurrent flushes from several workers can't deadlock.
+
+    Args:
+        async_session (async_sessionmaker[AsyncSession]): SQLAlchemy async sessionmaker
+        views (dict[int, int]): Views to add, by post ID
+    """
+    stmt = text(
+        "INSERT INTO post_views (post_id, views) "
+        "SELECT counts.post_id, counts.views "
+        "FROM unnest(CAST(:post_ids AS integer[]), CAST(:views AS bigint[])) AS counts (post_id, views) "
+        "JOIN posts ON posts.post_id = counts.post_id "
+        "ORDER BY counts.post_id "
+        "ON CONFLICT (post_id) DO UPDATE SET views = post_views.views + EXCLUDED.views"
+    )
+    post_ids = sorted(views)
+    async with async_session() as session:
+        async with session.begin():
+            await session.execute(stmt, {"post_ids": post_ids, "views": [views[post_id] for post_id in post_ids]})
+
+
+@dataclass(slots=True)
+class SitemapChunk:
+    """One sitemap file's worth of post IDs and when the newest of them changed"""
+    chunk: int
+    last_modified: datetime
+
+
+@replica_read
+async def fetch_sitemap_chunks(
+        async_session: async_sessionmaker[AsyncSession],
+        urls_per_chunk: int
+    ) -> list[SitemapChunk]:
+    """Fetch the non-empty sitemap chunks, chunk n holding post IDs
+    ((n - 1) * urls_per_chunk, n * urls_per_chunk]
+
+    IDs never change chunk, so a new post only changes the last one.
+
+    Args:
+        async_session (async_sessionmaker[AsyncSession]): SQLAlchemy async sessionmaker
+        urls_per_chunk (int): Post IDs per chunk
+
+    Returns:
+        list[SitemapChunk]: In chunk order
+    """
+    stmt = text(
+        "SELECT (post_id - 1) / :size + 1 AS chunk, max(date_updated) AS last_modified "
+        "FROM posts "
+        "GROUP BY 1 "
+        "ORDER BY 1"
+    )
+    async with async_session() as session:
+        results = await session.execute(stmt, {"size": urls_per_chunk})
+        return [SitemapChunk(**result._mapping) for result in results.all()]
+
+
+@replica_read
+async def fetch_sitemap_chunk_last_modified(
+        async_session: async_sessionmaker[AsyncSession],
+        chunk: int,
+        urls_per_chunk: int
+    ) -> datetime | None:
+    """Fetch when a post in one sitemap chunk last changed, served from
+    LAST_MODIFIED_CACHE when possible
+
+    Args:
+        async_session (async_sessionmaker[AsyncSession]): SQLAlchemy async sessionmaker
+        chunk (int): Chunk number, from 1 (see fetch_sitemap_chunks)
+        urls_per_chunk (int): Post IDs per chunk
+
+    Returns:
+        datetime | None: None if the chunk has no posts
+    """
+    async def load() -> datetime | None:
+        stmt = text("SELECT max(date_updated) FROM posts WHERE post_id > :low AND post_id <= :high")
+        params = {"low": (chunk - 1) * urls_per_chunk, "high": chunk * urls_per_chunk}
+        async with async_session() as session:
+            return (await session.execute(stmt, params)).scalar_one()
+
+    return await LAST_MODIFIED_CACHE.get(("sitemap_chunk", chunk, urls_per_chunk), ["listing"], load)
+
+
+def stream_sitemap_posts(
+        async_session: async_sessionmaker[AsyncSession],
+        chunk: int,
+        urls_per_chunk: int,
+        fetch_size: int = 1000
+    ) -> AsyncIterator[list[Row]]:
+    """Stream the post_id and date_updated of one sitemap chunk's posts through
+    a server-side cursor
+
+    Args:
+        async_session (async_sessionmaker[AsyncSession]): SQLAlchemy async sessionmaker
+        chunk (int): Chunk number, from 1 (see fetch_sitemap_chunks)
+        urls_per_chunk (int): Post IDs per chunk
+        fetch_size (int): Rows fetched per round trip
+
+    Returns:
+        AsyncIterator[list[Row]]: Rows in post_id order
+    """
+    stmt = text(
+        "SELECT post_id, date_updated FROM posts "
+        "WHERE post_id > :low AND post_id <= :high "
+        "ORDER BY post_id"
+    )
+    params = {"low": (chunk - 1) * urls_per_chunk, "high": chunk * urls_per_chunk}
+    return _stream_rows(async_session, stmt, fetch_size, params)
+
+
+def stream_feed_posts(
+        async_session: async_sessionmaker[AsyncSession],
+        limit: int,
+        fetch_size: int = 10
+    ) -> AsyncIterator[list[Row]]:
+    """Stream the newest posts with their rendered content through a server-side cursor
+
+    Args:
+        async_session (async_sessionmaker[AsyncSession]): SQLAlchemy async sessionmaker
+        limit (int): Number of posts
+        fetch_size (int): Rows fetched per round trip
+
+    Returns:
+        AsyncIterator[list[Row]]: Rows with POST_DETAIL_COLUMNS and excerpt, newest first
+    """
+    stmt = text(
+        f"SELECT {POST_DETAIL_COLUMNS}, posts.excerpt "
+        "FROM posts "
+        "JOIN users ON posts.created_by_user_id = users.user_id "
+        "ORDER BY posts.date_created DESC, posts.post_id DESC "
+        "LIMIT :limit"
+    )
+    return _stream_rows(async_session, stmt, fetch_size, {"limit": limit})
+
+
+SNIPPET_START = "\x02"
+SNIPPET_STOP = "\x03"
+
+
+# The text of sanitized HTML: tags become spaces and the entities the
+# sanitizer emits are decoded, since snippets are escaped again for display
+_HTML_TEXT = (
+    "replace(replace(replace(replace(replace("
+    "regexp_replace({html}, '<[^>]*>', ' ', 'g'), "
+    "'&lt;', '<'), '&gt;', '>'), '&quot;', '\"'), '&#39;', ''''), '&amp;', '&')"
+)
+
+
+@replica_read
+async def search_posts(
+        async_session: async_sessionmaker[AsyncSession],
+        query: str,
+        limit: int,
+        offset: int,
+    ) -> list[Row]:
+    """Full-text search posts, best match first.
+
+    Matches are ranked on the weighted title/description/content tsvector.
+    Snippets are only built for the returned page, from the rendered text
+    rather than the Markdown source, with matched words wrapped
+    in SNIPPET_START and SNIPPET_STOP so the caller can escape the text
+    before marking it up.
+    
+    Args:
+        async_session (async_sessionmaker[AsyncSession]): SQLAlchemy async sessionmaker
+        query (str): Search terms in websearch syntax ("quoted phrases", -excluded, or)
+        limit (int): Number of results
+        offset (int): Number of results to skip
+
+    Returns:
+        list[Row]: Rows with post_id, title, description, date_created, name, rank and snippet
+    """
+    stmt = text(
+        "SELECT ranked.post_id, ranked.title, ranked.description, ranked.date_created, "
+        "    ranked.name, ranked.rank, "
+        "    ts_headline('english', "
+        f"        {_HTML_TEXT.format(html='ranked.content_html')}, "
+        "        ranked.query, :headline_options) AS snippet "
+        "FROM ("
+        "    SELECT posts.post_id, posts.title, posts.description, posts.content_html, "
+        "        posts.date_created, users.name, query, "
+        "        ts_rank_cd(posts.search_vector, query) AS rank "
+        "    FROM posts "
+        "    JOIN users ON posts.created_by_user_id = users.user_id "
+        "    CROSS JOIN websearch_to_tsquery('english', :query) AS query "
+        "    WHERE posts.search_vector @@ query "
+        "    ORDER BY rank DESC, posts.post_id DESC "
+        "    LIMIT :limit "
+        "    OFFSET :offset"
+        ") AS ranked "
+        "ORDER BY ranked.rank DESC, ranked.post_id DESC"
+    )
+    params = {
+        "query": query,
+        "limit": limit,
+        "offset": offset,
+        "headline_options": (
+            f"StartSel={SNIPPET_START}, StopSel={SNIPPET_STOP}, "
+            "MaxWords=35, MinWords=15, MaxFragments=2"
+        ),
+    }
+    async with async_session() as session:
+        results = await session.execute(stmt, params)
+        return results.all()
+
+
+def _rendered_params(rendered: RenderedContent) -> dict:
+    return {
+        "content_html": rendered.html,
+        "excerpt": rendered.excerpt,
+        "word_count": rendered.word_count,
+        "reading_minutes": rendered.reading_minutes,
+    }
 
 
 async def create_post(
         async_session: async_sessionmaker[AsyncSession],
         post: schema.Post
     ) -> None:
-    """Create a new post
+    """Create a new post, rendering its Markdown content once for display
+
+    The description defaults to the content's excerpt.
     
     Args:
         async_session (AsyncSession): SQLAlchemy async session
         post (schema.Post): Post for blog as defined in schema
     """
     stmt = text(
-        "INSERT INTO posts "
-        "    (title, content, description, created_by_user_id, image_url) "
-        "VALUES "
-        "   (:title, :content, :description, :created_by_user_id, :image_url)"
+        "WITH inserted AS ("
+        "    INSERT INTO posts "
+        "        (title, content, content_format, content_html, excerpt, word_count, reading_minutes, "
+        "         description, created_by_user_id, image_url) "
+        "    VALUES "
+        "       (:title, :content, :content_format, :content_html, :excerpt, :word_count, :reading_minutes, "
+        "        :description, :created_by_user_id, :image_url) "
+        "    RETURNING *"
+        ") "
+        f"SELECT {POST_SUMMARY_COLUMNS}"
+        "FROM inserted AS posts "
+        "JOIN users ON posts.created_by_user_id = users.user_id"
     )
+    rendered = await asyncio.to_thread(render_content, post.content)
+    mark_written()
     async with async_session() as session:
         async with session.begin():
             params = {
                 "title": post.title,
                 "image_url": post.image_url,
                 "content": post.content,
-                "description": post.description,
+                "content_format": MARKDOWN,
+                **_rendered_params(rendered),
+                "description": post.description or rendered.excerpt,
                 "created_by_user_id": post.user_id
             }
-            await session.execute(stmt, params)
+            result = await session.execute(stmt, params)
+            summary = PostSummary(**result.one()._mapping)
+            await publish_invalidation(session, "listing", "feed")
+    HOME_FEED.upsert(summary)
+    dispatch_invalidation(["listing"])
 
 
 async def create_user(
@@ -156,6 +990,7 @@ async def create_user(
         "VALUES "
         "   (:email, :password, :is_admin, :name, :bio)"
     )
+    mark_written()
     async with async_session() as session:
         async with session.begin():
             params = {
@@ -185,6 +1020,7 @@ async def update_user(
         "    (email = :email, password = :password, is_admin = :is_admin) "
         "WHERE user_id = :user_id"
     )
+    mark_written()
     async with async_session() as session:
         async with session.begin():
             params = {
@@ -196,12 +1032,35 @@ async def update_user(
             await session.execute(stmt, params)
 
 
+async def update_user_password(
+        async_session: async_sessionmaker[AsyncSession],
+        user_id: int,
+        password: str
+    ) -> None:
+    """Replace a user's password hash
+    
+    Args:
+        async_session (AsyncSession): SQLAlchemy async session
+        user_id (int): ID of the user to update
+        password (str): New bcrypt hash
+    """
+    stmt = text("UPDATE users SET password = :password WHERE user_id = :user_id")
+    mark_written()
+    async with async_session() as session:
+        async with session.begin():
+            params = {"password": password, "user_id": user_id}
+            await session.execute(stmt, params)
+
+
 async def update_post(
         async_session: async_sessionmaker[AsyncSession],
         post_id: int,
         new_post: schema.Post
     ) -> None:
-    """Create a new post
+    """Update a post, rendering its content once for display
+
+    The post keeps its content_format, so legacy HTML posts stay HTML. The
+    description defaults to the content's excerpt.
     
     Args:
         async_session (AsyncSession): SQLAlchemy async session
@@ -209,22 +1068,43 @@ async def update_post(
         new_post (schema.Post): New post data
     """
     stmt = text(
-        "UPDATE posts SET"
-        "    (title, content, image_url, description) ="
-        "    (:title, :content, :image_url, :description) "
-        "WHERE post_id = :post_id"
+        "WITH updated AS ("
+        "    UPDATE posts SET"
+        "        (title, content, content_html, excerpt, word_count, reading_minutes, "
+        "         image_url, description, date_updated) ="
+        "        (:title, :content, :content_html, :excerpt, :word_count, :reading_minutes, "
+        "         :image_url, :description, now() at time zone 'utc') "
+        "    WHERE post_id = :post_id "
+        "    RETURNING *"
+        ") "
+        f"SELECT {POST_SUMMARY_COLUMNS}"
+        "FROM updated AS posts "
+        "JOIN users ON posts.created_by_user_id = users.user_id"
     )
+    # Posts keep the format they were written in
+    async with async_session() as session:
+        content_format = (await session.execute(
+            text("SELECT content_format FROM posts WHERE post_id = :post_id"), {"post_id": post_id}
+        )).scalar_one_or_none()
+    rendered = await asyncio.to_thread(render_content, new_post.content, content_format or MARKDOWN)
+    mark_written()
     async with async_session() as session:
         async with session.begin():
             params = {
                 "title": new_post.title,
                 "content": new_post.content,
+                **_rendered_params(rendered),
                 "image_url": new_post.image_url,
-                "description": new_post.description,
+                "description": new_post.description or rendered.excerpt,
                 "created_by_user_id": new_post.user_id,
                 "post_id": post_id,
             }
-            await session.execute(stmt, params)
+            result = await session.execute(stmt, params)
+            summary = result.one_or_none()
+            await publish_invalidation(session, f"post:{post_id}", "listing", "feed")
+    if summary is not None:
+        HOME_FEED.upsert(PostSummary(**summary._mapping))
+    dispatch_invalidation([f"post:{post_id}", "listing"])
 
 
 async def update_blog_config(
@@ -239,10 +1119,12 @@ async def update_blog_config(
     """
     stmt = text(
         "UPDATE blog_config SET"
-        "    (banner_image_url, homepage_heading, homepage_subheading, navbar_title, about) = "
-        "    (:banner_image_url, :homepage_heading, :homepage_subheading, :navbar_title, :about) "
+        "    (banner_image_url, homepage_heading, homepage_subheading, navbar_title, about, version, date_updated) = "
+        "    (:banner_image_url, :homepage_heading, :homepage_subheading, :navbar_title, :about, "
+        "     version + 1, now() at time zone 'utc') "
         "WHERE blog_config_id = 1"
     )
+    mark_written()
     async with async_session() as session:
         async with session.begin():
             params = {
@@ -253,3 +1135,390 @@ async def update_blog_config(
                 "about": blog_config.about,
             }
             await session.execute(stmt, params)
+            await publish_invalidation(session, "blog_config")
+    dispatch_invalidation(["blog_config"])
+
+
+async def fetch_web_session(
+        async_session: async_sessionmaker[AsyncSession],
+        session_id: str
+    ) -> dict | None:
+    """Fetch the data of an unexpired server-side session
+    
+    Args:
+        async_session (async_sessionmaker[AsyncSession]): SQLAlchemy async sessionmaker
+        session_id (str): ID from the session cookie
+
+    Returns:
+        dict | None
+    """
+    stmt = text(
+        "SELECT data FROM web_sessions "
+        "WHERE session_id = :session_id AND expires_at > now() at time zone 'utc'"
+    ).columns(data=JSONB)
+    async with async_session() as session:
+        result = await session.execute(stmt, {"session_id": session_id})
+        return result.scalar_one_or_none()
+
+
+async def save_web_session(
+        async_session: async_sessionmaker[AsyncSession],
+        session_id: str,
+        data: dict,
+        max_age: int
+    ) -> None:
+    """Create or replace a server-side session
+    
+    Args:
+        async_session (async_sessionmaker[AsyncSession]): SQLAlchemy async sessionmaker
+        session_id (str): Session ID
+        data (dict): JSON-serializable session data
+        max_age (int): Seconds until the session expires
+    """
+    stmt = text(
+        "INSERT INTO web_sessions (session_id, data, expires_at) "
+        "VALUES (:session_id, :data, now() at time zone 'utc' + make_interval(secs => :max_age)) "
+        "ON CONFLICT (session_id) DO UPDATE "
+        "SET data = excluded.data, expires_at = excluded.expires_at"
+    ).bindparams(bindparam("data", type_=JSONB), bindparam("max_age", type_=Integer))
+    async with async_session() as session:
+        async with session.begin():
+            params = {"session_id": session_id, "data": data, "max_age": max_age}
+            await session.execute(stmt, params)
+
+
+async def delete_web_session(
+        async_session: async_sessionmaker[AsyncSession],
+        session_id: str
+    ) -> None:
+    """Delete a server-side session
+    
+    Args:
+        async_session (async_sessionmaker[AsyncSession]): SQLAlchemy async sessionmaker
+        session_id (str): Session ID
+    """
+    stmt = text("DELETE FROM web_sessions WHERE session_id = :session_id")
+    async with async_session() as session:
+        async with session.begin():
+            await session.execute(stmt, {"session_id": session_id})
+
+
+async def delete_expired_web_sessions(
+        async_session: async_sessionmaker[AsyncSession],
+        batch_size: int
+    ) -> int:
+    """Delete one batch of expired sessions.
+
+    Rows locked by another worker's sweep are skipped rather than waited on.
+    
+    Args:
+        async_session (async_sessionmaker[AsyncSession]): SQLAlchemy async sessionmaker
+        batch_size (int): Maximum number of sessions to delete
+
+    Returns:
+        int: Number of sessions deleted
+    """
+    stmt = text(
+        "DELETE FROM web_sessions WHERE session_id IN ("
+        "    SELECT session_id FROM web_sessions "
+        "    WHERE expires_at <= now() at time zone 'utc' "
+        "    LIMIT :batch_size "
+        "    FOR UPDATE SKIP LOCKED"
+        ")"
+    )
+    async with async_session() as session:
+        async with session.begin():
+            result = await session.execute(stmt, {"batch_size": batch_size})
+            return result.rowcount
+
+
+# Tokens in a bucket after refilling it for the time since it was last used
+_REFILLED_TOKENS = (
+    "least(excluded.burst, buckets.tokens "
+    "    + extract(epoch FROM excluded.updated_at - buckets.updated_at) * excluded.rate)"
+)
+
+
+async def take_rate_limit_token(
+        async_session: async_sessionmaker[AsyncSession],
+        key: str,
+        burst: float,
+        rate: float
+    ) -> bool:
+    """Take one token from a token bucket in a single statement
+
+    A bucket is created full on first use. The refill and the take happen
+    in one upsert, so concurrent workers can't both spend the last token.
+
+    Args:
+        async_session (async_sessionmaker[AsyncSession]): SQLAlchemy async sessionmaker
+        key (str): Bucket key
+        burst (float): Most tokens the bucket holds
+        rate (float): Tokens added per second
+
+    Returns:
+        bool: Whether the bucket had a token
+    """
+    stmt = text(
+        "INSERT INTO rate_limit_buckets AS buckets (key, tokens, burst, rate, allowed, updated_at) "
+        "VALUES (:key, CAST(:burst AS float8) - 1, :burst, :rate, true, now() at time zone 'utc') "
+        "ON CONFLICT (key) DO UPDATE SET "
+        f"    tokens = {_REFILLED_TOKENS} - CASE WHEN {_REFILLED_TOKENS} >= 1 THEN 1 ELSE 0 END, "
+        f"    allowed = {_REFILLED_TOKENS} >= 1, "
+        "    burst = excluded.burst, "
+        "    rate = excluded.rate, "
+        "    updated_at = excluded.updated_at "
+        "RETURNING allowed"
+    )
+    async with async_session() as session:
+        async with session.begin():
+            return (await session.execute(stmt, {"key": key, "burst": burst, "rate": rate})).scalar_one()
+
+
+async def give_back_rate_limit_token(async_session: async_sessionmaker[AsyncSession], key: str) -> None:
+    """Return one token to a token bucket, up to its burst
+
+    Args:
+        async_session (async_sessionmaker[AsyncSession]): SQLAlchemy async sessionmaker
+        key (str): Bucket key
+    """
+    stmt = text("UPDATE rate_limit_buckets SET tokens = least(burst, tokens + 1) WHERE key = :key")
+    async with async_session() as session:
+        async with session.begin():
+            await session.execute(stmt, {"key": key})
+
+
+async def delete_idle_rate_limit_buckets(
+        async_session: async_sessionmaker[AsyncSession],
+        idle_seconds: float,
+        batch_size: int
+    ) -> int:
+    """Delete one batch of token buckets unused for idle_seconds
+
+    Args:
+        async_session (async_sessionmaker[AsyncSession]): SQLAlchemy async sessionmaker
+        idle_seconds (float): Seconds after which a bucket has refilled completely
+        batch_size (int): Maximum number of buckets to delete
+
+    Returns:
+        int: Number of buckets deleted
+    """
+    stmt = text(
+        "DELETE FROM rate_limit_buckets WHERE key IN ("
+        "    SELECT key FROM rate_limit_buckets "
+        "    WHERE updated_at <= now() at time zone 'utc' - make_interval(secs => :idle_seconds) "
+        "    LIMIT :batch_size "
+        "    FOR UPDATE SKIP LOCKED"
+        ")"
+    )
+    async with async_session() as session:
+        async with session.begin():
+            result = await session.execute(stmt, {"idle_seconds": idle_seconds, "batch_size": batch_size})
+            return result.rowcount
+
+
+USER_EXPORT_COLUMNS = (
+    "user_id, date_created, email, password, is_admin, is_author, name, bio, organization, social_media_link"
+)
+POST_EXPORT_COLUMNS = (
+    "post_id, date_created, date_updated, title, description, content, content_format, image_url, "
+    "created_by_user_id"
+)
+
+
+async def _stream_rows(
+        async_session: async_sessionmaker[AsyncSession],
+        stmt,
+        chunk_size: int,
+        params: dict | None = None
+    ) -> AsyncIterator[list[Row]]:
+    async with async_session() as session:
+        result = await session.stream(stmt.execution_options(yield_per=chunk_size), params)
+        async for rows in result.partitions():
+            yield rows
+
+
+async def _stream_dicts(
+        async_session: async_sessionmaker[AsyncSession],
+        stmt,
+        chunk_size: int
+    ) -> AsyncIterator[list[dict]]:
+    async for rows in _stream_rows(async_session, stmt, chunk_size):
+        yield rows_to_dicts(rows)
+
+
+def export_users(
+        async_session: async_sessionmaker[AsyncSession],
+        chunk_size: int = 1000
+    ) -> AsyncIterator[list[dict]]:
+    """Stream every user, oldest first, through a server-side cursor
+
+    Args:
+        async_session (async_sessionmaker[AsyncSession]): SQLAlchemy async sessionmaker
+        chunk_size (int): Rows fetched per round trip
+
+    Returns:
+        AsyncIterator[list[dict]]: Chunks of JSON-serializable users, password hashes included
+    """
+    stmt = text(f"SELECT {USER_EXPORT_COLUMNS} FROM users ORDER BY user_id")
+    return _stream_dicts(async_session, stmt, chunk_size)
+
+
+def export_posts(
+        async_session: async_sessionmaker[AsyncSession],
+        chunk_size: int = 1000
+    ) -> AsyncIterator[list[dict]]:
+    """Stream every post, oldest first, through a server-side cursor
+
+    Args:
+        async_session (async_sessionmaker[AsyncSession]): SQLAlchemy async sessionmaker
+        chunk_size (int): Rows fetched per round trip
+
+    Returns:
+        AsyncIterator[list[dict]]: Chunks of JSON-serializable posts
+    """
+    stmt = text(f"SELECT {POST_EXPORT_COLUMNS} FROM posts ORDER BY post_id")
+    return _stream_dicts(async_session, stmt, chunk_size)
+
+
+async def import_users(
+        async_session: async_sessionmaker[AsyncSession],
+        users: list[dict]
+    ) -> None:
+    """Insert a batch of users in one transaction with a single executemany.
+
+    A user whose user_id already exists is skipped. One without a user_id
+    gets a new one, unless a user with the same email already exists, so
+    rerunning an import doesn't duplicate them.
+
+    Args:
+        async_session (async_sessionmaker[AsyncSession]): SQLAlchemy async sessionmaker
+        users (list[dict]): Users with the USER_EXPORT_COLUMNS keys; date_created
+            must be a datetime or None
+    """
+    stmt = text(
+        "INSERT INTO users "
+        f"    ({USER_EXPORT_COLUMNS}) "
+        "SELECT "
+        "    COALESCE(CAST(:user_id AS integer), nextval(pg_get_serial_sequence('users', 'user_id'))), "
+        "    COALESCE(CAST(:date_created AS timestamp), now() at time zone 'utc'), "
+        "    CAST(:email AS varchar), CAST(:password AS varchar), CAST(:is_admin AS boolean), "
+        "    CAST(:is_author AS boolean), CAST(:name AS varchar), CAST(:bio AS varchar), "
+        "    CAST(:organization AS varchar), CAST(:social_media_link AS varchar) "
+        "WHERE CAST(:user_id AS integer) IS NOT NULL "
+        "    OR NOT EXISTS (SELECT 1 FROM users WHERE email = CAST(:email AS varchar)) "
+        "ON CONFLICT (user_id) DO NOTHING"
+    )
+    mark_written()
+    async with async_session() as session:
+        async with session.begin():
+            await session.execute(stmt, users)
+
+
+async def import_posts(
+        async_session: async_sessionmaker[AsyncSession],
+        posts: list[dict]
+    ) -> None:
+    """Insert a batch of posts in one transaction with a single executemany.
+
+    A post whose post_id already exists is skipped; one without a post_id
+    gets a new one. Their authors must already exist. Content is rendered
+    as in create_post.
+
+    Args:
+        async_session (async_sessionmaker[AsyncSession]): SQLAlchemy async sessionmaker
+        posts (list[dict]): Posts with the POST_EXPORT_COLUMNS keys; dates
+            must be datetimes or None
+    """
+    stmt = text(
+        "INSERT INTO posts "
+        f"    ({POST_EXPORT_COLUMNS}, content_html, excerpt, word_count, reading_minutes) "
+        "VALUES ("
+        "    COALESCE(CAST(:post_id AS integer), nextval(pg_get_serial_sequence('posts', 'post_id'))), "
+        "    COALESCE(CAST(:date_created AS timestamp), now() at time zone 'utc'), "
+        "    COALESCE(CAST(:date_updated AS timestamp), CAST(:date_created AS timestamp), now() at time zone 'utc'), "
+        "    :title, :description, :content, :content_format, :image_url, :created_by_user_id, "
+        "    :content_html, :excerpt, :word_count, :reading_minutes"
+        ") "
+        "ON CONFLICT (post_id) DO NOTHING"
+    )
+    rendered = await asyncio.to_thread(
+        lambda: [render_content(post["content"], post["content_format"]) for post in posts]
+    )
+    params = [
+        {**post, **_rendered_params(content), "description": post["description"] or content.excerpt}
+        for post, content in zip(posts, rendered)
+    ]
+    mark_written()
+    async with async_session() as session:
+        async with session.begin():
+            await session.execute(stmt, params)
+
+
+async def finish_import(async_session: async_sessionmaker[AsyncSession]) -> None:
+    """Move the ID sequences past imported IDs and drop every worker's caches
+    
+    Args:
+        async_session (async_sessionmaker[AsyncSession]): SQLAlchemy async sessionmaker
+    """
+    mark_written()
+    async with async_session() as session:
+        async with session.begin():
+            for table, column in (("users", "user_id"), ("posts", "post_id")):
+                sequence = f"pg_get_serial_sequence('{table}', '{column}')"
+                await session.execute(text(
+                    f"SELECT setval({sequence}, max({column})) FROM {table} "
+                    f"HAVING max({column}) > COALESCE(pg_sequence_last_value({sequence}::regclass), 0)"
+                ))
+            await publish_invalidation(session, "*")
+    dispatch_invalidation(["*"])
+
+
+async def rerender_posts(async_session: async_sessionmaker[AsyncSession], batch_size: int = 500) -> int:
+    """Re-render every post's stored HTML and derived fields from its content.
+
+    Posts whose rendering changed get a new date_updated, so cached pages,
+    fragments and validators pick up the change.
+
+    Args:
+        async_session (async_sessionmaker[AsyncSession]): SQLAlchemy async sessionmaker
+        batch_size (int): Posts per transaction
+
+    Returns:
+        int: Number of posts whose rendering changed
+    """
+    select_stmt = text(
+        "SELECT post_id, content, content_format FROM posts WHERE post_id > :after ORDER BY post_id LIMIT :limit"
+    )
+    update_stmt = text(
+        "UPDATE posts SET "
+        "    (content_html, excerpt, word_count, reading_minutes, date_updated) = "
+        "    (:content_html, :excerpt, :word_count, :reading_minutes, now() at time zone 'utc') "
+        "WHERE post_id = :post_id AND ("
+        "    content_html, excerpt, word_count, reading_minutes"
+        ") IS DISTINCT FROM (:content_html, :excerpt, :word_count, :reading_minutes)"
+    )
+    mark_written()
+    changed, after = 0, 0
+    while True:
+        async with async_session() as session:
+            async with session.begin():
+                rows = (await session.execute(select_stmt, {"after": after, "limit": batch_size})).all()
+                if not rows:
+                    break
+                rendered = await asyncio.to_thread(
+                    lambda: [render_content(row.content, row.content_format) for row in rows]
+                )
+                params = [
+                    {"post_id": row.post_id, **_rendered_params(content)}
+                    for row, content in zip(rows, rendered)
+                ]
+                result = await session.execute(update_stmt, params)
+                changed += max(result.rowcount, 0)
+        after = rows[-1].post_id
+
+    async with async_session() as session:
+        async with session.begin():
+            await publish_invalidation(session, "*")
+    dispatch_invalidation(["*"])
+    return changed
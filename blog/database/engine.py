@@ -0,0 +1,155 @@
+"""Engine construction, pool configuration and lifecycle"""
+
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import AsyncAdaptedQueuePool, PoolProxiedConnection
+
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+import os
+import time
+
+
+@dataclass
+class PoolStats:
+    """Checkout counters for one connection pool"""
+    checkouts: int = 0
+    wait_seconds_total: float = 0.0
+    wait_seconds_max: float = 0.0
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool that records how long each checkout waits in its own stats.
+
+    Each engine (the primary and every replica) has its own pool, and so
+    its own counters. They carry over when the engine is disposed and the
+    pool recreated.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    def recreate(self) -> "InstrumentedQueuePool":
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+    def connect(self) -> PoolProxiedConnection:
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        finally:
+            waited = time.perf_counter() - start
+            self.stats.checkouts += 1
+            self.stats.wait_seconds_total += waited
+            self.stats.wait_seconds_max = max(self.stats.wait_seconds_max, waited)
+
+
+_engine: AsyncEngine | None = None
+_sessionmaker: async_sessionmaker[AsyncSession] | None = None
+
+# Replica engine that reads in the current context go to (see replicas.py)
+read_engine: ContextVar[AsyncEngine | None] = ContextVar("read_engine", default=None)
+
+
+class RoutingSession(Session):
+    """Session that sends statements to read_engine when one is set, else to the primary"""
+
+    def get_bind(self, mapper=None, *, clause=None, **kwargs):
+        engine = read_engine.get()
+        if engine is not None:
+            return engine.sync_engine
+        return super().get_bind(mapper, clause=clause, **kwargs)
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.environ.get(name, default))
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    return os.environ.get(name, str(default)).lower() in ("1", "true", "yes", "on")
+
+
+def create_engine_from_env(database_url: str | None = None) -> AsyncEngine:
+    """Build the async engine from DATABASE_URL_ASYNC and the DB_* pool settings
+
+    Environment:
+        DB_POOL_SIZE: Connections kept open per worker (default 5)
+        DB_MAX_OVERFLOW: Extra connections allowed under load (default 10)
+        DB_POOL_TIMEOUT: Seconds to wait for a connection (default 30)
+        DB_POOL_RECYCLE: Reconnect connections older than this many seconds (default 1800)
+        DB_POOL_PRE_PING: Test connections on checkout (default true)
+        DB_STATEMENT_CACHE_SIZE: asyncpg prepared statement cache size (default 100)
+
+    Args:
+        database_url (str | None): Connect here instead of DATABASE_URL_ASYNC (e.g. a replica)
+
+    Returns:
+        AsyncEngine
+    """
+    url = make_url(database_url or os.environ["DATABASE_URL_ASYNC"])
+    options = {"pool_pre_ping": _env_bool("DB_POOL_PRE_PING", True)}
+    if url.get_backend_name() != "sqlite":
+        options.update(
+            poolclass=InstrumentedQueuePool,
+            pool_size=_env_int("DB_POOL_SIZE", 5),
+            max_overflow=_env_int("DB_MAX_OVERFLOW", 10),
+            pool_timeout=_env_int("DB_POOL_TIMEOUT", 30),
+            pool_recycle=_env_int("DB_POOL_RECYCLE", 1800),
+        )
+    if url.get_driver_name() == "asyncpg":
+        options["connect_args"] = {
+            "prepared_statement_cache_size": _env_int("DB_STATEMENT_CACHE_SIZE", 100),
+        }
+    return create_async_engine(url, **options)
+
+
+def get_engine() -> AsyncEngine:
+    """Return this worker's engine, creating it on first use"""
+    global _engine
+    if _engine is None:
+        _engine = create_engine_from_env()
+    return _engine
+
+
+def get_sessionmaker() -> async_sessionmaker[AsyncSession]:
+    """Return the sessionmaker bound to this worker's engine"""
+    global _sessionmaker
+    if _sessionmaker is None:
+        _sessionmaker = async_sessionmaker(get_engine(), expire_on_commit=False, sync_session_class=RoutingSession)
+    return _sessionmaker
+
+
+async def dispose_engine() -> None:
+    """Close every pooled connection and forget the engine"""
+    global _engine, _sessionmaker
+    engine, _engine, _sessionmaker = _engine, None, None
+    if engine is not None:
+        await engine.dispose()
+
+
+def pool_metrics(engine: AsyncEngine | None = None) -> dict[str, float]:
+    """Current pool gauges and checkout counters for monitoring
+
+    Args:
+        engine (AsyncEngine | None): Engine whose pool to report, by default this worker's primary
+
+    Returns:
+        dict[str, float]: Empty if the engine hasn't been created or isn't pooled
+    """
+    engine = engine or _engine
+    if engine is None or not isinstance(engine.pool, InstrumentedQueuePool):
+        return {}
+    pool = engine.pool
+    return {
+        "size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        "overflow": max(pool.overflow(), 0),
+        "checkouts": pool.stats.checkouts,
+        "wait_seconds_total": pool.stats.wait_seconds_total,
+        "wait_seconds_max": pool.stats.wait_seconds_max,
+    }
@@ -0,0 +1,168 @@
+"""Cross-worker cache invalidation over Postgres LISTEN/NOTIFY"""
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, AsyncSession
+
+from typing import Callable, Iterable
+
+import asyncio
+import contextlib
+import logging
+import os
+import uuid
+
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = "blog_cache_invalidate"
+INVALIDATION_RETRY_MIN_SECONDS = 1.0
+INVALIDATION_RETRY_MAX_SECONDS = float(os.environ.get("INVALIDATION_RETRY_MAX_SECONDS", 30))
+
+# Tags this worker's notifications so it can skip its own: it has already
+# dispatched them locally
+WORKER_ID = uuid.uuid4().hex
+
+_invalidation_handlers: list[Callable[[str], None]] = []
+_listener_connection: AsyncConnection | None = None
+_listener_task: asyncio.Task | None = None
+_connection_lost: asyncio.Event | None = None
+
+
+def on_invalidate(handler: Callable[[str], None]) -> Callable[[str], None]:
+    """Register a handler called with every invalidated key.
+
+    The key ``"*"`` is dispatched when notifications may have been lost and
+    every cache should be dropped.
+
+    Args:
+        handler (Callable[[str], None]): Function taking the invalidated key
+
+    Returns:
+        The handler, so this can be used as a decorator
+    """
+    _invalidation_handlers.append(handler)
+    return handler
+
+
+def dispatch_invalidation(keys: Iterable[str]) -> None:
+    """Run the registered handlers for each key in this worker
+
+    Args:
+        keys (Iterable[str]): Keys that were invalidated
+    """
+    for key in keys:
+        for handler in _invalidation_handlers:
+            try:
+                handler(key)
+            except Exception:
+                logger.exception("Invalidation handler failed for key %r", key)
+
+
+async def publish_invalidation(session: AsyncSession, *keys: str) -> None:
+    """Notify every worker that keys changed.
+
+    Must be called inside the writing transaction: Postgres only delivers the
+    notification once that transaction commits. Other workers dispatch the
+    keys when it arrives; the calling worker ignores its own notification and
+    should call ``dispatch_invalidation`` itself after commit.
+
+    Args:
+        session (AsyncSession): Session with an open transaction
+        keys (str): Keys that were invalidated
+    """
+    if session.get_bind().dialect.name != "postgresql":
+        return
+    stmt = text("SELECT pg_notify(:channel, :payload)")
+    params = {"channel": INVALIDATION_CHANNEL, "payload": f"{WORKER_ID}|{','.join(keys)}"}
+    await session.execute(stmt, params)
+
+
+def _handle_notification(connection, pid, channel, payload) -> None:
+    origin, _, keys = payload.partition("|")
+    if origin != WORKER_ID:
+        dispatch_invalidation(keys.split(","))
+
+
+def _handle_termination(connection) -> None:
+    logger.warning("Lost the invalidation listener connection; dropping all caches")
+    dispatch_invalidation(["*"])
+    if _connection_lost is not None:
+        _connection_lost.set()
+
+
+async def _listen(engine: AsyncEngine) -> AsyncConnection:
+    connection = await engine.connect()
+    try:
+        raw_connection = await connection.get_raw_connection()
+        driver_connection = raw_connection.driver_connection
+        await driver_connection.add_listener(INVALIDATION_CHANNEL, _handle_notification)
+        driver_connection.add_termination_listener(_handle_termination)
+    except BaseException:
+        await connection.close()
+        raise
+    return connection
+
+
+async def _listen_forever(engine: AsyncEngine) -> None:
+    """Keep a listening connection open, reconnecting with backoff when it fails"""
+    global _listener_connection, _connection_lost
+    delay = INVALIDATION_RETRY_MIN_SECONDS
+    missed = False
+    while True:
+        _connection_lost = asyncio.Event()
+        try:
+            _listener_connection = await _listen(engine)
+        except Exception:
+            logger.exception("Could not start the invalidation listener; retrying in %.0fs", delay)
+            missed = True
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, INVALIDATION_RETRY_MAX_SECONDS)
+            continue
+
+        if missed:
+            # Notifications sent while nothing was listening are lost
+            dispatch_invalidation(["*"])
+        delay = INVALIDATION_RETRY_MIN_SECONDS
+        await _connection_lost.wait()
+        missed = True
+        connection, _listener_connection = _listener_connection, None
+        with contextlib.suppress(Exception):
+            await connection.invalidate()
+            await connection.close()
+
+
+async def start_invalidation_listener(engine: AsyncEngine) -> None:
+    """Start listening for invalidations from other workers on one held connection.
+
+    The connection is made in the background and remade whenever it fails,
+    retrying with exponential backoff up to INVALIDATION_RETRY_MAX_SECONDS.
+    Every cache is dropped after a reconnect, since notifications sent in
+    between are lost; until then caches rely on their TTLs.
+
+    Args:
+        engine (AsyncEngine): Engine to borrow the listening connection from
+    """
+    global _listener_task
+    if _listener_task is not None or engine.dialect.driver != "asyncpg":
+        return
+    _listener_task = asyncio.create_task(_listen_forever(engine))
+
+
+async def stop_invalidation_listener() -> None:
+    """Stop listening and return the connection to the pool"""
+    global _listener_task, _listener_connection
+    task, _listener_task = _listener_task, None
+    if task is not None:
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+    connection, _listener_connection = _listener_connection, None
+    if connection is None:
+        return
+    try:
+        raw_connection = await connection.get_raw_connection()
+        driver_connection = raw_connection.driver_connection
+        driver_connection.remove_termination_listener(_handle_termination)
+        await driver_connection.remove_listener(INVALIDATION_CHANNEL, _handle_notification)
+    finally:
+        await connection.close()
@@ -0,0 +1,80 @@
+"""Bring an existing database up to the current models.
+
+    python -m blog.database.migrate
+
+Safe to run any number of times; the Procfile runs it on every release:
+
+- missing tables are created (create_all);
+- missing columns are added to existing tables with ADD COLUMN IF NOT
+  EXISTS, from the same DDL create_all would emit. New NOT NULL columns
+  all have server defaults, so existing rows get those;
+- missing indexes are created with CREATE INDEX IF NOT EXISTS;
+- column defaults are reset to the models', e.g. timestamps to naive UTC;
+- posts written before content was rendered at write time (empty
+  content_html) are rendered. The new content_format column defaults
+  them to "html", so they are only sanitized, not read as Markdown.
+
+Columns are never dropped or retyped. Timestamps already stored in the
+server's local time are left as they are.
+"""
+
+from sqlalchemy import Column, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.schema import CreateColumn, CreateIndex, DefaultClause
+
+import asyncio
+import logging
+
+from . import crud, models
+from .engine import dispose_engine, get_engine
+
+
+logger = logging.getLogger(__name__)
+
+
+def _default_sql(column: Column, connection: Connection) -> str:
+    argument = column.server_default.arg
+    if isinstance(argument, str):
+        return "'" + argument.replace("'", "''") + "'"
+    return str(argument.compile(dialect=connection.dialect))
+
+
+def _upgrade_schema(connection: Connection) -> None:
+    models.Base.metadata.create_all(connection)
+    preparer = connection.dialect.identifier_preparer
+    for table in models.Base.metadata.sorted_tables:
+        table_name = preparer.format_table(table)
+        for column in table.columns:
+            column_ddl = CreateColumn(column).compile(dialect=connection.dialect)
+            connection.exec_driver_sql(f"ALTER TABLE {table_name} ADD COLUMN IF NOT EXISTS {column_ddl}")
+            if isinstance(column.server_default, DefaultClause):
+                connection.exec_driver_sql(
+                    f"ALTER TABLE {table_name} ALTER COLUMN {preparer.format_column(column)} "
+                    f"SET DEFAULT {_default_sql(column, connection)}"
+                )
+        for index in table.indexes:
+            connection.execute(CreateIndex(index, if_not_exists=True))
+
+
+async def migrate() -> None:
+    """Upgrade the schema in one transaction, then render unrendered posts"""
+    async with get_engine().begin() as connection:
+        await connection.run_sync(_upgrade_schema)
+        unrendered = (await connection.execute(
+            text("SELECT EXISTS (SELECT 1 FROM posts WHERE content_html = '' AND content <> '')")
+        )).scalar_one()
+    if unrendered:
+        changed = await crud.rerender_posts(await crud.get_db_sessionmaker())
+        logger.info("Rendered %d posts", changed)
+
+
+async def main() -> None:
+    try:
+        await migrate()
+    finally:
+        await dispose_engine()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
@@ -1,8 +1,13 @@
-from sqlalchemy import Integer, String, DateTime, Identity, ForeignKey
+from sqlalchemy import BigInteger, Boolean, Float, Integer, String, DateTime, Identity, ForeignKey, Index, Computed
+from sqlalchemy.dialects.postgresql import JSONB, TSVECTOR
 from sqlalchemy.orm import DeclarativeBase
 from sqlalchemy.orm import Mapped
 from sqlalchemy.orm import mapped_column
-from sqlalchemy.sql.functions import now
+from sqlalchemy import text
+
+
+# Timestamps are naive UTC whatever the server's TimeZone setting
+UTC_NOW = text("(now() at time zone 'utc')")
 
 
 class Base(DeclarativeBase):
@@ -13,8 +18,8 @@ class User(Base):
     __tablename__ = "users"
 
     user_id: Mapped[int] = mapped_column(Integer, Identity(), primary_key=True)
-    date_created: Mapped[DateTime] = mapped_column(DateTime, server_default=now())
-    email: Mapped[str] = mapped_column(String, nullable=False)
+    date_created: Mapped[DateTime] = mapped_column(DateTime, server_default=UTC_NOW)
+    email: Mapped[str] = mapped_column(String, nullable=False, index=True)
     password: Mapped[str] = mapped_column(String, nullable=False)
     is_admin: Mapped[bool]
     is_author: Mapped[bool]
@@ -26,14 +31,49 @@ class User(Base):
 
 class Post(Base):
     __tablename__ = "posts"
+    __table_args__ = (
+        Index("ix_posts_date_created_post_id", "date_created", "post_id"),
+        Index("ix_posts_date_updated", "date_updated"),
+        Index("ix_posts_search_vector", "search_vector", postgresql_using="gin"),
+    )
 
     post_id: Mapped[int] = mapped_column(Integer, Identity(), primary_key=True)
-    date_created: Mapped[DateTime] = mapped_column(DateTime, server_default=now())
+    date_created: Mapped[DateTime] = mapped_column(DateTime, server_default=UTC_NOW)
+    date_updated: Mapped[DateTime] = mapped_column(DateTime, server_default=UTC_NOW, nullable=False)
     title: Mapped[str]
     description: Mapped[str]
+    # Markdown source; the columns below are rendered from it on write (see content.py)
     content: Mapped[str]
-    created_by_user_id: Mapped[str]
+    # "markdown", or "html" for posts written before Markdown support. The
+    # default marks existing rows as HTML when the column is added
+    content_format: Mapped[str] = mapped_column(String, server_default="html", nullable=False)
+    content_html: Mapped[str] = mapped_column(String, server_default="", nullable=False)
+    excerpt: Mapped[str] = mapped_column(String, server_default="", nullable=False)
+    word_count: Mapped[int] = mapped_column(Integer, server_default="0", nullable=False)
+    reading_minutes: Mapped[int] = mapped_column(Integer, server_default="0", nullable=False)
+    created_by_user_id: Mapped[int] = mapped_column(ForeignKey("users.user_id"))
     image_url: Mapped[str] = mapped_column(String, nullable=True)
+    search_vector: Mapped[str] = mapped_column(
+        TSVECTOR,
+        Computed(
+            "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+            "setweight(to_tsvector('english', coalesce(description, '')), 'B') || "
+            "setweight(to_tsvector('english', "
+            "    regexp_replace(coalesce(content, ''), '<[^>]*>', ' ', 'g')), 'C')",
+            persisted=True,
+        ),
+    )
+
+
+# Kept out of posts so counting a view never rewrites a post row
+class PostView(Base):
+    __tablename__ = "post_views"
+    __table_args__ = (
+        Index("ix_post_views_views_post_id", "views", "post_id"),
+    )
+
+    post_id: Mapped[int] = mapped_column(ForeignKey("posts.post_id", ondelete="CASCADE"), primary_key=True)
+    views: Mapped[int] = mapped_column(BigInteger, server_default="0", nullable=False)
 
 
 class BlogConfig(Base):
@@ -45,3 +85,27 @@ class BlogConfig(Base):
     homepage_subheading: Mapped[str]
     banner_image_url: Mapped[str]
     about: Mapped[str]
+    version: Mapped[int] = mapped_column(Integer, server_default="0", nullable=False)
+    date_updated: Mapped[DateTime] = mapped_column(DateTime, server_default=UTC_NOW, nullable=False)
+
+
+class WebSession(Base):
+    __tablename__ = "web_sessions"
+
+    session_id: Mapped[str] = mapped_column(String, primary_key=True)
+    data: Mapped[dict] = mapped_column(JSONB, nullable=False)
+    expires_at: Mapped[DateTime] = mapped_column(DateTime, nullable=False, index=True)
+
+
+# Login throttling state (see blog/rate_limit.py). Unlogged: losing it in a
+# crash only resets the buckets, and it isn't worth WAL traffic
+class RateLimitBucket(Base):
+    __tablename__ = "rate_limit_buckets"
+    __table_args__ = {"prefixes": ["UNLOGGED"]}
+
+    key: Mapped[str] = mapped_column(String, primary_key=True)
+    tokens: Mapped[float] = mapped_column(Float, nullable=False)
+    burst: Mapped[float] = mapped_column(Float, nullable=False)
+    rate: Mapped[float] = mapped_column(Float, nullable=False)
+    allowed: Mapped[bool] = mapped_column(Boolean, nullable=False)
+    updated_at: Mapped[DateTime] = mapped_column(DateTime, nullable=False, index=True)
@@ -0,0 +1,199 @@
+"""Routing of read-only queries to read replicas.
+
+Set DATABASE_URL_ASYNC_REPLICA to one or more comma-separated replica URLs.
+crud functions decorated with ``replica_read`` then run on a healthy
+replica, chosen round-robin. Their sessions come from the primary's
+sessionmaker, and RoutingSession sends the statements to the chosen
+replica. Everything else stays on the primary. Reads go to the primary
+instead when:
+
+- no replica is healthy: a replica is skipped after a connection failure
+  for DB_REPLICA_RETRY_SECONDS, and while the health check measures its
+  replay lag above DB_REPLICA_MAX_LAG;
+- the request wrote, or the visitor wrote recently (see mark_written and
+  ReadYourWritesMiddleware);
+- this worker saw a cache invalidation less than DB_REPLICA_MAX_LAG
+  seconds ago. Caches refilled right after a write must not be filled
+  from a replica that hasn't replayed it yet.
+"""
+
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError
+
+from contextvars import ContextVar, Token
+from dataclasses import dataclass
+from typing import Awaitable, Callable, TypeVar
+
+import asyncio
+import functools
+import itertools
+import logging
+import os
+import time
+
+from .engine import create_engine_from_env, read_engine
+from .invalidation import on_invalidate
+
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+DB_REPLICA_RETRY_SECONDS = float(os.environ.get("DB_REPLICA_RETRY_SECONDS", 30))
+DB_REPLICA_MAX_LAG = float(os.environ.get("DB_REPLICA_MAX_LAG", 2))
+
+# Zero when the replica has replayed everything it received, even if the
+# primary has been idle for a while
+REPLICA_LAG_SQL = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+
+class Replica:
+    """One read replica and its health"""
+
+    def __init__(self, url: str):
+        self.engine = create_engine_from_env(url)
+        self.name = self.engine.url.render_as_string(hide_password=True)
+        self.lag = 0.0
+        self.down_until = 0.0
+
+    def healthy(self) -> bool:
+        return time.monotonic() >= self.down_until and self.lag <= DB_REPLICA_MAX_LAG
+
+    def mark_down(self) -> None:
+        """Stop routing reads here for DB_REPLICA_RETRY_SECONDS"""
+        self.down_until = time.monotonic() + DB_REPLICA_RETRY_SECONDS
+
+
+@dataclass
+class ReplicaStats:
+    """Counters for read routing"""
+    replica_reads: int = 0
+    primary_fallbacks: int = 0
+
+
+REPLICA_STATS = ReplicaStats()
+
+
+@dataclass
+class ReadRouting:
+    """Per-request routing state"""
+    pinned: bool = False
+    wrote: bool = False
+
+
+_replicas: list[Replica] | None = None
+_round_robin = itertools.count()
+_primary_until = 0.0
+_read_routing: ContextVar[ReadRouting | None] = ContextVar("read_routing", default=None)
+
+
+def get_replicas() -> list[Replica]:
+    """Return this worker's replicas, creating their engines on first use"""
+    global _replicas
+    if _replicas is None:
+        urls = os.environ.get("DATABASE_URL_ASYNC_REPLICA", "")
+        _replicas = [Replica(url.strip()) for url in urls.split(",") if url.strip()]
+    return _replicas
+
+
+async def dispose_replicas() -> None:
+    """Close every replica's pooled connections and forget the replicas"""
+    global _replicas
+    replicas, _replicas = _replicas or [], None
+    for replica in replicas:
+        await replica.engine.dispose()
+
+
+@on_invalidate
+def _route_to_primary_after_invalidation(key: str) -> None:
+    global _primary_until
+    _primary_until = time.monotonic() + DB_REPLICA_MAX_LAG
+
+
+def choose_replica() -> Replica | None:
+    """The replica for the next read, or None to read from the primary"""
+    routing = _read_routing.get()
+    if routing is not None and routing.pinned:
+        return None
+    if time.monotonic() < _primary_until:
+        return None
+    healthy = [replica for replica in get_replicas() if replica.healthy()]
+    if not healthy:
+        return None
+    return healthy[next(_round_robin) % len(healthy)]
+
+
+def begin_read_routing(pinned: bool) -> tuple[ReadRouting, Token]:
+    """Start routing state for a request; pinned sends all its reads to the primary"""
+    routing = ReadRouting(pinned=pinned)
+    return routing, _read_routing.set(routing)
+
+
+def end_read_routing(token: Token) -> None:
+    _read_routing.reset(token)
+
+
+def mark_written() -> None:
+    """Send the rest of this request's reads to the primary, which has its writes"""
+    routing = _read_routing.get()
+    if routing is not None:
+        routing.pinned = routing.wrote = True
+
+
+def _is_connection_error(error: Exception) -> bool:
+    if isinstance(error, DBAPIError):
+        return error.connection_invalidated or isinstance(error, (OperationalError, InterfaceError))
+    return isinstance(error, (OSError, asyncio.TimeoutError))
+
+
+def replica_read(func: Callable[..., Awaitable[T]]) -> Callable[..., Awaitable[T]]:
+    """Run a read-only crud function on a replica, retrying on the primary if it fails"""
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs) -> T:
+        if read_engine.get() is not None:
+            return await func(*args, **kwargs)
+        replica = choose_replica()
+        if replica is None:
+            return await func(*args, **kwargs)
+
+        token = read_engine.set(replica.engine)
+        try:
+            REPLICA_STATS.replica_reads += 1
+            return await func(*args, **kwargs)
+        except Exception as e:
+            if not _is_connection_error(e):
+                raise
+            logger.warning("Read from replica %s failed; using the primary", replica.name, exc_info=True)
+            replica.mark_down()
+        finally:
+            read_engine.reset(token)
+        REPLICA_STATS.primary_fallbacks += 1
+        return await func(*args, **kwargs)
+
+    return wrapper
+
+
+async def check_replicas() -> None:
+    """Measure every replica's replay lag, marking unreachable ones down"""
+    for replica in get_replicas():
+        try:
+            async with replica.engine.connect() as connection:
+                lag = (await connection.execute(REPLICA_LAG_SQL)).scalar_one()
+        except Exception:
+            logger.warning("Replica %s failed its health check", replica.name, exc_info=True)
+            replica.mark_down()
+            continue
+        replica.lag = float(lag)
+        if replica.lag > DB_REPLICA_MAX_LAG:
+            logger.warning("Replica %s is %.1fs behind; reading from others", replica.name, replica.lag)
+
+
+async def monitor_replicas(interval: float) -> None:
+    """Check replica health every `interval` seconds, forever"""
+    while True:
+        await check_replicas()
+        await asyncio.sleep(interval)
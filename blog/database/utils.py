@@ -1,9 +1,88 @@
 """Database util functions"""
 
 from sqlalchemy import Row
+
+from datetime import date, datetime, time
+from decimal import Decimal
+from typing import Any, Callable, Sequence
+from uuid import UUID
+
 import json
 
 
+def _identity(value: Any) -> Any:
+    return value
+
+
+def _json_or_str(value: Any) -> Any:
+    try:
+        json.dumps(value)
+    except (TypeError, OverflowError, ValueError):
+        return str(value)
+    return value
+
+
+# JSON-native types pass through; everything else is converted by type
+_CONVERTERS: dict[type, Callable[[Any], Any]] = {
+    str: _identity,
+    int: _identity,
+    bool: _identity,
+    float: _identity,
+    type(None): _identity,
+    datetime: datetime.isoformat,
+    date: date.isoformat,
+    time: time.isoformat,
+    Decimal: str,
+    UUID: str,
+    list: _json_or_str,
+    dict: _json_or_str,
+}
+
+
+def _converter_for(value_type: type) -> Callable[[Any], Any]:
+    """Find the converter for a type, caching the answer for subclasses"""
+    converter = _CONVERTERS.get(value_type)
+    if converter is None:
+        converter = next(
+            (_CONVERTERS[base] for base in value_type.__mro__ if base in _CONVERTERS),
+            str,
+        )
+        _CONVERTERS[value_type] = converter
+    return converter
+
+
+def rows_to_dicts(rows: Sequence[Row]) -> list[dict]:
+    """Convert rows to JSON-serializable dicts.
+
+    Converters are chosen once per column from the first row's value types;
+    a value of a different type (e.g. a NULL first row) falls back to a
+    per-value lookup. Datetimes become ISO 8601 strings, Decimals and UUIDs
+    strings, and any other non-JSON type its str().
+
+    Args:
+        rows (Sequence[Row]): Sqlalchemy rows from the same result
+
+    Returns:
+        list[dict]
+    """
+    if not rows:
+        return []
+    keys = rows[0]._fields
+    column_types = [type(value) for value in rows[0]]
+    converters = [_converter_for(value_type) for value_type in column_types]
+    columns = list(zip(keys, column_types, converters))
+
+    dictionaries = []
+    for row in rows:
+        dictionary = {}
+        for (key, column_type, converter), value in zip(columns, row):
+            if type(value) is not column_type:
+                converter = _converter_for(type(value))
+            dictionary[key] = value if converter is _identity else converter(value)
+        dictionaries.append(dictionary)
+    return dictionaries
+
+
 def row_to_dict(row: Row) -> dict:
     """Convert row to dict, casting non-JSON-serializable objects as str
 
@@ -13,11 +92,4 @@ def row_to_dict(row: Row) -> dict:
     Returns:
         dict
     """
-    dictionary = dict(row._mapping)
-    for key, value in dictionary.items():
-        try:
-            json.dumps(value)
-        except (TypeError, OverflowError):
-            dictionary[key] = str(value)
-    return dictionary
-
+    return rows_to_dicts([row])[0]
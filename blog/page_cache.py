@@ -0,0 +1,122 @@
+"""Rendered-page cache for the public pages.
+
+Pages are stored gzipped, keyed by base URL, path, the endpoint's own
+parameters and the visitor's login state, and purged when the admin write paths publish an invalidation
+(see database/invalidation.py).
+"""
+
+from fastapi import Request
+from starlette.responses import HTMLResponse, Response
+
+from dataclasses import dataclass
+from typing import AsyncIterator, Awaitable, Callable
+
+import functools
+import gzip
+import os
+
+from . import database as db
+from .templates import StreamingTemplateResponse
+from .utils.cache import LRUCache
+
+
+PAGE_CACHE = LRUCache(
+    maxsize=int(os.environ.get("PAGE_CACHE_SIZE", 512)),
+    ttl=float(os.environ.get("PAGE_CACHE_TTL", 60)),
+)
+
+
+@dataclass(frozen=True)
+class CachedPage:
+    """A rendered page, gzipped once at store time"""
+    body: bytes
+    media_type: str
+
+
+# Bumped on every purge so a page that streamed while one happened isn't stored
+_purge_generation = 0
+
+
+@db.on_invalidate
+def _purge_pages(key: str) -> None:
+    global _purge_generation
+    _purge_generation += 1
+    if key in ("blog_config", "*"):
+        PAGE_CACHE.clear()
+    else:
+        PAGE_CACHE.purge_tag(key)
+
+
+def login_state(request: Request) -> str:
+    """Which variant of a page the visitor sees: anon, user or admin"""
+    user = request.session.get("user")
+    if not user:
+        return "anon"
+    return "admin" if user["is_admin"] else "user"
+
+
+def page_response(request: Request, page: CachedPage) -> Response:
+    """Send a cached page, gzipped if the client accepts it"""
+    if "gzip" in request.headers.get("Accept-Encoding", ""):
+        # GZipMiddleware leaves responses that already have a Content-Encoding alone
+        headers = {"Content-Encoding": "gzip", "Vary": "Accept-Encoding"}
+        return Response(page.body, media_type=page.media_type, headers=headers)
+    return Response(gzip.decompress(page.body), media_type=page.media_type,
+                    headers={"Vary": "Accept-Encoding"})
+
+
+async def _store_when_sent(
+        body_iterator: AsyncIterator[bytes],
+        key: tuple,
+        tags: list[str],
+        media_type: str,
+    ) -> AsyncIterator[bytes]:
+    generation = _purge_generation
+    body = []
+    async for chunk in body_iterator:
+        body.append(chunk)
+        yield chunk
+    if generation == _purge_generation:
+        PAGE_CACHE.set(key, CachedPage(gzip.compress(b"".join(body)), media_type), tags)
+
+
+def cached_page(*tags: str) -> Callable:
+    """Serve an endpoint's successful HTML responses from PAGE_CACHE.
+
+    Tags are formatted with the endpoint's keyword arguments, so
+    ``cached_page("post:{post_no}")`` tags each post page with its ID. Visitors
+    with a pending flash message always get a fresh render. A streamed page
+    is sent as it renders and stored once it has been sent in full.
+
+    Args:
+        tags (str): Invalidation keys that should purge the page
+    """
+    def decorator(endpoint: Callable[..., Awaitable[Response]]) -> Callable[..., Awaitable[Response]]:
+        @functools.wraps(endpoint)
+        async def wrapper(*args, **kwargs) -> Response:
+            request: Request = kwargs["request"]
+            if request.session.get("message"):
+                return await endpoint(*args, **kwargs)
+
+            # Pages hold absolute URLs built from the Host header, so a forged
+            # Host must not be able to fill the cache for everyone else
+            # Only the parameters the endpoint reads: any other query string
+            # would let a visitor force a render and evict real pages
+            params = tuple(sorted((name, value) for name, value in kwargs.items() if name != "request"))
+            key = (str(request.base_url), request.url.path, params, login_state(request))
+            page = PAGE_CACHE.get(key)
+            if page is None:
+                response = await endpoint(*args, **kwargs)
+                page_tags = [tag.format(**kwargs) for tag in tags]
+                if response.status_code == 200 and isinstance(response, StreamingTemplateResponse):
+                    response.body_iterator = _store_when_sent(
+                        response.body_iterator, key, page_tags, response.media_type
+                    )
+                    return response
+                if response.status_code != 200 or not isinstance(response, HTMLResponse):
+                    return response
+                page = CachedPage(gzip.compress(response.body), response.media_type)
+                PAGE_CACHE.set(key, page, page_tags)
+            return page_response(request, page)
+        return wrapper
+    return decorator
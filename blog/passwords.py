@@ -0,0 +1,141 @@
+"""Password hashing on a bounded thread pool.
+
+bcrypt takes hundreds of milliseconds of CPU per call. Running it on the
+event loop stalls every other request in the worker, so hashing and
+verification run on a small dedicated pool instead (bcrypt releases the
+GIL while it works, so threads are enough).
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import suppress
+from dataclasses import dataclass
+from typing import Callable, TypeVar
+
+import asyncio
+import os
+
+import bcrypt
+
+from .timing import timed
+
+
+T = TypeVar("T")
+
+BCRYPT_ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", 12))
+PASSWORD_HASH_WORKERS = int(os.environ.get("PASSWORD_HASH_WORKERS", 2))
+PASSWORD_HASH_MAX_QUEUE = int(os.environ.get("PASSWORD_HASH_MAX_QUEUE", 32))
+
+
+class PasswordQueueFull(Exception):
+    """Raised when too many hashing jobs are already waiting"""
+
+
+@dataclass
+class PasswordPoolStats:
+    """Queue depth and throughput counters for the hashing pool"""
+    queued: int = 0
+    running: int = 0
+    completed: int = 0
+    rejected: int = 0
+
+
+PASSWORD_POOL_STATS = PasswordPoolStats()
+
+_executor: ThreadPoolExecutor | None = None
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+    return _executor
+
+
+def shutdown() -> None:
+    """Stop the hashing pool's threads"""
+    global _executor
+    executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+async def _run(func: Callable[..., T], *args) -> T:
+    if PASSWORD_POOL_STATS.queued >= PASSWORD_HASH_MAX_QUEUE:
+        PASSWORD_POOL_STATS.rejected += 1
+        raise PasswordQueueFull("Too many password hashing jobs are waiting")
+
+    # The counters are only ever changed on the event loop's thread: `+=`
+    # from the pool's threads could lose updates, and queued is the
+    # admission gate above
+    loop = asyncio.get_running_loop()
+
+    def started() -> None:
+        PASSWORD_POOL_STATS.queued -= 1
+        PASSWORD_POOL_STATS.running += 1
+
+    def finished(cancelled: bool) -> None:
+        if cancelled:
+            # Cancelled before it started, so it never left the queue
+            PASSWORD_POOL_STATS.queued -= 1
+        else:
+            PASSWORD_POOL_STATS.running -= 1
+            PASSWORD_POOL_STATS.completed += 1
+
+    def job() -> T:
+        loop.call_soon_threadsafe(started)
+        return func(*args)
+
+    def on_done(future) -> None:
+        # Runs on whichever thread finished or cancelled the job
+        with suppress(RuntimeError):  # The loop has closed
+            loop.call_soon_threadsafe(finished, future.cancelled())
+
+    PASSWORD_POOL_STATS.queued += 1
+    future = _get_executor().submit(job)
+    future.add_done_callback(on_done)
+    with timed("password_seconds"):
+        return await asyncio.wrap_future(future)
+
+
+async def hash_password(password: str) -> str:
+    """Hash a password with the configured bcrypt cost
+
+    Args:
+        password (str): Plain-text password
+
+    Returns:
+        str
+
+    Raises:
+        PasswordQueueFull: If the hashing pool is saturated
+    """
+    hashed = await _run(bcrypt.hashpw, password.encode(), bcrypt.gensalt(BCRYPT_ROUNDS))
+    return hashed.decode()
+
+
+async def verify_password(password: str, hashed: str) -> bool:
+    """Check a password against a bcrypt hash
+
+    Args:
+        password (str): Plain-text password
+        hashed (str): Stored bcrypt hash
+
+    Returns:
+        bool
+
+    Raises:
+        PasswordQueueFull: If the hashing pool is saturated
+    """
+    return await _run(bcrypt.checkpw, password.encode(), hashed.encode())
+
+
+def needs_rehash(hashed: str) -> bool:
+    """Whether a stored hash was made with a different cost than BCRYPT_ROUNDS
+
+    Args:
+        hashed (str): Stored bcrypt hash, e.g. $2b$12$...
+    """
+    try:
+        return int(hashed.split("$")[2]) != BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return True
@@ -0,0 +1,115 @@
+"""Slow-query log and repeated-statement detector.
+
+Both are fed by the engine hooks in blog.timing and are safe to leave on in
+production: parameters are logged by type only, never by value.
+
+    SLOW_QUERY_SECONDS: Log statements slower than this at WARNING (default 0.2, 0 disables)
+    SLOW_QUERY_EXPLAIN: Append the EXPLAIN plan of slow statements (default false)
+    REPEATED_QUERY_THRESHOLD: Warn when a request runs one statement this many
+        times (default 3, 0 disables)
+
+Every statement is also logged at DEBUG with its parameter shape and
+duration. To see them, enable DEBUG for the "blog.query_log" logger.
+"""
+
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any
+
+import logging
+import os
+
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERY_SECONDS = float(os.environ.get("SLOW_QUERY_SECONDS", 0.2))
+SLOW_QUERY_EXPLAIN = os.environ.get("SLOW_QUERY_EXPLAIN", "false").lower() in ("1", "true", "yes", "on")
+REPEATED_QUERY_THRESHOLD = int(os.environ.get("REPEATED_QUERY_THRESHOLD", 3))
+
+_EXPLAINABLE = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE")
+
+
+@dataclass
+class QueryLogStats:
+    """Counters for the slow-query log and repeated-statement detector"""
+    slow_queries: int = 0
+    repeated_statement_requests: int = 0
+
+
+QUERY_LOG_STATS = QueryLogStats()
+
+
+def parameters_shape(parameters: Any, executemany: bool = False) -> str:
+    """Describe bound parameters by type, e.g. "(int, str)" or "3 x {'id': int}" """
+    if executemany:
+        rows = list(parameters)
+        return f"{len(rows)} x {parameters_shape(rows[0])}" if rows else "0 rows"
+    if isinstance(parameters, dict):
+        return "{" + ", ".join(f"{key!r}: {type(value).__name__}" for key, value in parameters.items()) + "}"
+    if isinstance(parameters, (list, tuple)):
+        return "(" + ", ".join(type(value).__name__ for value in parameters) + ")"
+    return type(parameters).__name__
+
+
+def _explain(conn, statement: str, parameters: Any) -> str:
+    # A separate cursor: the statement's own results haven't been fetched yet
+    cursor = conn.connection.cursor()
+    try:
+        cursor.execute(f"EXPLAIN {statement}", parameters)
+        return "\n".join(row[0] for row in cursor.fetchall())
+    finally:
+        cursor.close()
+
+
+def log_statement(conn, statement: str, parameters: Any, executemany: bool, elapsed: float, path: str) -> None:
+    """Log one finished statement at DEBUG, or at WARNING if it was slow
+
+    Args:
+        conn: SQLAlchemy Connection the statement ran on
+        statement (str): SQL as sent to the driver
+        parameters (Any): Parameters as sent to the driver
+        executemany (bool): Whether parameters is a sequence of parameter sets
+        elapsed (float): Seconds the statement took
+        path (str): Request path, or "" outside a request
+    """
+    slow = 0 < SLOW_QUERY_SECONDS <= elapsed
+    if not slow:
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Query %.1fms %s params=%s: %s", elapsed * 1000, path,
+                         parameters_shape(parameters, executemany), statement)
+        return
+
+    QUERY_LOG_STATS.slow_queries += 1
+    plan = ""
+    if (SLOW_QUERY_EXPLAIN and not executemany and conn.dialect.name == "postgresql"
+            and statement.lstrip().upper().startswith(_EXPLAINABLE)):
+        try:
+            plan = "\n" + _explain(conn, statement, parameters)
+        except Exception as exception:
+            plan = f"\n(EXPLAIN failed: {exception})"
+    logger.warning("Slow query %.1fms %s params=%s: %s%s", elapsed * 1000, path,
+                   parameters_shape(parameters, executemany), statement, plan)
+
+
+def report_repeated_statements(path: str, statements: Counter) -> None:
+    """Warn about statements a request ran at least REPEATED_QUERY_THRESHOLD times
+
+    Args:
+        path (str): Request path
+        statements (Counter): Runs per (statement, parameters) pair
+    """
+    if REPEATED_QUERY_THRESHOLD <= 0:
+        return
+    runs, identical = Counter(), Counter()
+    for (statement, _), count in statements.items():
+        runs[statement] += count
+        identical[statement] = max(identical[statement], count)
+
+    repeated = [(statement, count) for statement, count in runs.items() if count >= REPEATED_QUERY_THRESHOLD]
+    if not repeated:
+        return
+    QUERY_LOG_STATS.repeated_statement_requests += 1
+    for statement, count in repeated:
+        kind = "identical" if identical[statement] == count else "N+1"
+        logger.warning("Repeated statement (%s): %s ran it %d times (%d with the same parameters): %s",
+                       kind, path, count, identical[statement], statement)
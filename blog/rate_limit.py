@@ -0,0 +1,239 @@
+"""Login throttling.
+
+Every login attempt takes a token from the bucket for the client's IP
+address (its /64 for IPv6) and, only if that had one, from the bucket for
+the email address. When either is empty the attempt gets a 429 before the
+user is looked up or bcrypt runs, and without touching the session, so a
+credential-stuffing burst costs a bucket update per request (a dictionary
+lookup with the memory backend, one upsert with postgres) rather than a
+hash. A successful login gives
+its email token back, so only failed passwords count against an account,
+and a flood from one address can't lock its owner out.
+
+The client address is request.client.host, which behind a proxy is the
+proxy's own. Run gunicorn with --forwarded-allow-ips (or set
+FORWARDED_ALLOW_IPS) to the proxy's addresses so uvicorn takes the client
+from X-Forwarded-For instead; the Procfile trusts 10.0.0.0/8, where the
+Heroku router connects from. Never use "*": uvicorn then believes the
+leftmost X-Forwarded-For entry, which the client writes itself.
+
+Use the "memory" backend for a single worker. Its buckets are kept for at
+most LOGIN_RATE_LIMIT_MAX_KEYS keys per kind, least recently used dropped
+first. Use "postgres" to share buckets between gunicorn workers.
+Keys are hashed, so neither backend stores email addresses.
+"""
+
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import asyncio
+import hashlib
+import ipaddress
+import logging
+import os
+import time
+
+from . import database as db
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Rate:
+    """A token bucket's size and refill rate"""
+    burst: float
+    per_second: float
+
+
+LOGIN_IP_RATE = Rate(
+    burst=float(os.environ.get("LOGIN_IP_BURST", 20)),
+    per_second=float(os.environ.get("LOGIN_IP_PER_MINUTE", 10)) / 60,
+)
+LOGIN_EMAIL_RATE = Rate(
+    burst=float(os.environ.get("LOGIN_EMAIL_BURST", 5)),
+    per_second=float(os.environ.get("LOGIN_EMAIL_PER_MINUTE", 1)) / 60,
+)
+LOGIN_RATE_LIMIT_MAX_KEYS = int(os.environ.get("LOGIN_RATE_LIMIT_MAX_KEYS", 100_000))
+
+
+@dataclass
+class RateLimitStats:
+    """Counters for login throttling"""
+    allowed: int = 0
+    rejected_ip: int = 0
+    rejected_email: int = 0
+    errors: int = 0
+
+
+RATE_LIMIT_STATS = RateLimitStats()
+
+
+def client_key(host: str) -> str:
+    """The bucket key for a client address; IPv6 clients are grouped by /64"""
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return host
+    if address.version == 4:
+        return str(address)
+    if address.ipv4_mapped is not None:
+        return str(address.ipv4_mapped)
+    return str(ipaddress.ip_network(f"{address}/64", strict=False))
+
+
+def _hash_key(kind: str, value: str) -> str:
+    return kind + ":" + hashlib.blake2b(value.encode(), digest_size=16).hexdigest()
+
+
+def _email_key(email: str) -> str:
+    return _hash_key("email", email.strip().lower())
+
+
+class LoginLimiter:
+    """Token buckets per client and per email address"""
+
+    async def take(self, kind: str, key: str) -> bool:
+        """Take a token from the "ip" or "email" bucket for key and return whether it had one"""
+        raise NotImplementedError
+
+    async def give_back(self, kind: str, key: str) -> None:
+        """Return a token taken from a bucket"""
+        raise NotImplementedError
+
+    async def sweep(self, batch_size: int) -> int:
+        """Forget up to batch_size idle buckets and return how many were forgotten"""
+        raise NotImplementedError
+
+    async def check(self, host: str, email: str) -> str | None:
+        """Count a login attempt
+
+        Fails open: an attempt is allowed if the buckets can't be reached.
+
+        Args:
+            host (str): Client address
+            email (str): Email address as entered
+
+        Returns:
+            str | None: "ip" or "email" for the bucket that rejected the attempt,
+                or None if it may proceed
+        """
+        try:
+            if not await self.take("ip", _hash_key("ip", client_key(host))):
+                RATE_LIMIT_STATS.rejected_ip += 1
+                return "ip"
+            if not await self.take("email", _email_key(email)):
+                RATE_LIMIT_STATS.rejected_email += 1
+                return "email"
+        except Exception:
+            RATE_LIMIT_STATS.errors += 1
+            logger.exception("Login rate limiting failed; allowing the attempt")
+            return None
+        RATE_LIMIT_STATS.allowed += 1
+        return None
+
+    async def refund(self, email: str) -> None:
+        """Give back the email token of an attempt that didn't fail a password check
+
+        Args:
+            email (str): Email address as entered
+        """
+        try:
+            await self.give_back("email", _email_key(email))
+        except Exception:
+            logger.exception("Returning a login rate limit token failed")
+
+
+class TokenBuckets:
+    """Token buckets for at most max_keys keys, least recently used dropped first"""
+
+    def __init__(self, rate: Rate, max_keys: int):
+        self.rate = rate
+        self.max_keys = max_keys
+        # key -> (tokens, monotonic time they were counted)
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def take(self, key: str) -> bool:
+        """Take a token from key's bucket, returning False if it had none"""
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            tokens = self.rate.burst
+        else:
+            tokens = min(self.rate.burst, bucket[0] + (now - bucket[1]) * self.rate.per_second)
+            self._buckets.move_to_end(key)
+        allowed = tokens >= 1
+        self._buckets[key] = (tokens - 1 if allowed else tokens, now)
+        if len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return allowed
+
+    def give_back(self, key: str) -> None:
+        """Return a token to key's bucket, up to its burst"""
+        bucket = self._buckets.get(key)
+        if bucket is not None:
+            self._buckets[key] = (min(self.rate.burst, bucket[0] + 1), bucket[1])
+
+
+class MemoryLoginLimiter(LoginLimiter):
+    """Buckets in this process; not shared between workers"""
+
+    def __init__(self, ip_rate: Rate, email_rate: Rate, max_keys: int):
+        self.buckets = {"ip": TokenBuckets(ip_rate, max_keys), "email": TokenBuckets(email_rate, max_keys)}
+
+    async def take(self, kind: str, key: str) -> bool:
+        return self.buckets[kind].take(key)
+
+    async def give_back(self, kind: str, key: str) -> None:
+        self.buckets[kind].give_back(key)
+
+    async def sweep(self, batch_size: int) -> int:
+        return 0  # Bounded by max_keys
+
+
+class PostgresLoginLimiter(LoginLimiter):
+    """Buckets in the rate_limit_buckets table, shared by every worker"""
+
+    def __init__(self, ip_rate: Rate, email_rate: Rate):
+        self.rates = {"ip": ip_rate, "email": email_rate}
+
+    async def take(self, kind: str, key: str) -> bool:
+        rate = self.rates[kind]
+        sessionmaker = await db.get_db_sessionmaker()
+        return await db.take_rate_limit_token(sessionmaker, key, rate.burst, rate.per_second)
+
+    async def give_back(self, kind: str, key: str) -> None:
+        sessionmaker = await db.get_db_sessionmaker()
+        await db.give_back_rate_limit_token(sessionmaker, key)
+
+    async def sweep(self, batch_size: int) -> int:
+        # A bucket left alone this long has refilled, so forgetting it changes nothing
+        idle_seconds = max(rate.burst / rate.per_second for rate in self.rates.values())
+        sessionmaker = await db.get_db_sessionmaker()
+        return await db.delete_idle_rate_limit_buckets(sessionmaker, idle_seconds, batch_size)
+
+
+def limiter_from_env() -> LoginLimiter:
+    """Build the limiter named by LOGIN_RATE_LIMIT_BACKEND (memory or postgres)"""
+    if os.environ.get("FORWARDED_ALLOW_IPS", "").strip() == "*":
+        logger.warning("FORWARDED_ALLOW_IPS=* lets clients choose the address they are rate limited by")
+    name = os.environ.get("LOGIN_RATE_LIMIT_BACKEND", "memory")
+    if name == "memory":
+        return MemoryLoginLimiter(LOGIN_IP_RATE, LOGIN_EMAIL_RATE, LOGIN_RATE_LIMIT_MAX_KEYS)
+    if name == "postgres":
+        return PostgresLoginLimiter(LOGIN_IP_RATE, LOGIN_EMAIL_RATE)
+    raise ValueError(f"Unknown LOGIN_RATE_LIMIT_BACKEND: {name!r}")
+
+
+async def sweep_idle_buckets(limiter: LoginLimiter, interval: float, batch_size: int) -> None:
+    """Forget idle buckets in batches every `interval` seconds, forever"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            while await limiter.sweep(batch_size) == batch_size:
+                await asyncio.sleep(0)
+        except Exception:
+            logger.exception("Rate limit bucket sweep failed")
@@ -1,15 +1,16 @@
 from fastapi import Query, Request, Form, Path
 from fastapi.routing import APIRouter
-from fastapi.responses import RedirectResponse
-
-import bcrypt
+from fastapi.responses import JSONResponse, RedirectResponse, StreamingResponse
 
+from dataclasses import asdict
 from typing import Annotated
 
 from .. import schema
 from ..schema import BlogConfig, Post
 from ..templates import templates
 from .. import database as db
+from .. import bulk
+from .. import passwords
 
 
 router = APIRouter(prefix="/admin")
@@ -38,8 +39,8 @@ async def create_post(
         request.session["message"] = "You need to login to make a post."    
         return RedirectResponse("/auth/login", status_code=303)
 
-    if not all([image_url, content, title, description]):
-        request.session["message"] = "Title, image URL, description, and content are required."    
+    if not all([image_url, content, title]):
+        request.session["message"] = "Title, image URL, and content are required."    
         return RedirectResponse("/admin/create-post", status_code=303)
 
     user_id = user["user_id"]
@@ -84,8 +85,8 @@ async def update_post(
         request.session["message"] = "You need to login to make a post."    
         return RedirectResponse("/auth/login", status_code=303)
 
-    if not all([image_url, content, title, description]):
-        request.session["message"] = "Title, image URL, description, and content are required."    
+    if not all([image_url, content, title]):
+        request.session["message"] = "Title, image URL, and content are required."    
         return RedirectResponse("/create-post", status_code=303)
 
     user_id = user["user_id"]
@@ -188,7 +189,12 @@ async def create_user(
         request.session["message"] = "You must be logged in as an admin to create users."
         return RedirectResponse("/", 303)
 
-    password = bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
+    try:
+        password = await passwords.hash_password(password)
+    except passwords.PasswordQueueFull:
+        request.session["message"] = "The server is busy. Please try again shortly."
+        return RedirectResponse("/admin/create-user", 303)
+
     user = schema.User(
         email=email,
         password=password,
@@ -205,3 +211,33 @@ async def create_user(
     await db.create_user(sessionmaker, user)
     request.session["message"] = "New user created"
     return RedirectResponse("/", 303)
+
+
+@router.get("/export")
+async def export_blog(request: Request):
+    """Download every user and post as NDJSON"""
+    if not request.session.get("user"):
+        request.session["message"] = "You must be logged in as an admin to export the blog."
+        return RedirectResponse("/", 303)
+
+    if not request.session["user"]["is_admin"]:
+        request.session["message"] = "You must be logged in as an admin to export the blog."
+        return RedirectResponse("/", 303)
+
+    sessionmaker = await db.get_db_sessionmaker()
+    headers = {"Content-Disposition": 'attachment; filename="blog.ndjson"'}
+    return StreamingResponse(bulk.export_ndjson(sessionmaker), media_type="application/x-ndjson", headers=headers)
+
+
+@router.post("/import")
+async def import_blog(request: Request):
+    """Import users and posts from an NDJSON request body, as written by /admin/export"""
+    if not request.session.get("user") or not request.session["user"]["is_admin"]:
+        return JSONResponse({"error": "You must be logged in as an admin to import."}, 403)
+
+    sessionmaker = await db.get_db_sessionmaker()
+    try:
+        counts = await bulk.import_ndjson(sessionmaker, request.stream())
+    except bulk.BulkImportError as e:
+        return JSONResponse({"error": str(e), "line": e.line_no}, 400)
+    return JSONResponse(asdict(counts))
@@ -2,14 +2,13 @@
 
 from fastapi import Form, Request
 from fastapi.routing import APIRouter
-from fastapi.responses import RedirectResponse
+from fastapi.responses import PlainTextResponse, RedirectResponse
 
 from ..templates import templates
 from .. import database as db
+from .. import passwords
 from .. import schema
 
-import bcrypt
-
 import os
 import re
 
@@ -50,13 +49,45 @@ async def login_user(
         request.session["message"] = "Please enter your username or password before proceeding."
         return RedirectResponse("/auth/login", 303)
 
+    # Before the user lookup and bcrypt, which are what an attacker wants us to spend.
+    # Behind a proxy this is the client's address only if the proxy is trusted
+    # with --forwarded-allow-ips (see rate_limit.py)
+    host = request.client.host if request.client is not None else ""
+    limiter = request.app.state.login_limiter
+    if await limiter.check(host, email) is not None:
+        # Leaves the session alone, so a throttled burst writes nothing
+        return PlainTextResponse(
+            "Too many login attempts. Please wait a minute and try again.", 429, headers={"Retry-After": "60"}
+        )
+
     sessionmaker = await db.get_db_sessionmaker()
     user = await db.fetch_user(sessionmaker, email)
     
-    if not user or not bcrypt.checkpw(password.encode(), user.password.encode()):
+    try:
+        valid = user is not None and await passwords.verify_password(password, user.password)
+    except passwords.PasswordQueueFull:
+        await limiter.refund(email)
+        request.session["message"] = "We're handling a lot of logins right now. Please try again shortly."
+        return RedirectResponse("/auth/login", 303)
+
+    if not valid:
         request.session["message"] = "Invalid email or password."
         return RedirectResponse("/auth/login", 303)
+
+    await limiter.refund(email)
+
+    if passwords.needs_rehash(user.password):
+        try:
+            new_hash = await passwords.hash_password(password)
+            await db.update_user_password(sessionmaker, user.user_id, new_hash)
+        except passwords.PasswordQueueFull:
+            pass  # Upgrade the hash on a later login instead
     
-    request.session["user"] = db.row_to_dict(user)
+    request.session["user"] = {
+        "user_id": user.user_id,
+        "email": user.email,
+        "name": user.name,
+        "is_admin": user.is_admin,
+    }
     request.session["message"] = "Welcome to your blog!"
     return RedirectResponse("/", 303)
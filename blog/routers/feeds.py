@@ -0,0 +1,225 @@
+"""Sitemap and Atom feed for crawlers and feed readers.
+
+/sitemap.xml lists every post. Once any post ID is above
+SITEMAP_URLS_PER_FILE it becomes a sitemap index pointing at
+/sitemaps/posts-<n>.xml files of that many IDs each. /feed.xml has the
+newest FEED_POSTS posts.
+
+Each document streams from a server-side cursor the first time it is
+requested and is then served from FEED_CACHE. It is only regenerated once
+its validator, which is also its ETag, changes: for /sitemap.xml and
+/feed.xml the newest post modification time or the blog config; for a
+sitemap file, the newest modification time among its own posts, so an
+edit only regenerates the file holding that post.
+"""
+
+from fastapi import Request, Path
+from fastapi.routing import APIRouter
+from sqlalchemy import Row
+from starlette.responses import Response, StreamingResponse
+
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Annotated, AsyncIterator, Callable
+from xml.sax.saxutils import escape
+
+import gzip
+import os
+
+from ..conditional import Validator, is_not_modified
+from ..page_cache import CachedPage, page_response
+from ..utils.cache import LRUCache
+from .. import database as db
+
+
+router = APIRouter(prefix="")
+
+
+# The sitemap protocol allows at most 50,000 URLs per file
+SITEMAP_URLS_PER_FILE = min(int(os.environ.get("SITEMAP_URLS_PER_FILE", 10_000)), 50_000)
+FEED_POSTS = int(os.environ.get("FEED_POSTS", 20))
+
+FEED_CACHE = LRUCache(
+    maxsize=int(os.environ.get("FEED_CACHE_SIZE", 64)),
+    ttl=float(os.environ.get("FEED_CACHE_TTL", 24 * 3600)),
+)
+
+XML_MEDIA_TYPE = "application/xml"
+ATOM_MEDIA_TYPE = "application/atom+xml"
+XML_DECLARATION = '<?xml version="1.0" encoding="UTF-8"?>\n'
+SITEMAP_NAMESPACE = "http://www.sitemaps.org/schemas/sitemap/0.9"
+
+
+@dataclass(frozen=True)
+class CachedDocument:
+    """A generated document and the ETag of the data it was generated from"""
+    version: str
+    page: CachedPage
+
+
+async def documents_validator() -> Validator | None:
+    """Validator for the sitemap and feed: changes with any post or the blog config"""
+    sessionmaker = await db.get_db_sessionmaker()
+    blog_config = await db.fetch_blog_config(sessionmaker)
+    posts_modified = await db.fetch_posts_last_modified(sessionmaker)
+    if posts_modified is None:
+        return None
+    return Validator.build(
+        "x", posts_modified.timestamp(), "c", blog_config.version,
+        last_modified=max(posts_modified, blog_config.date_updated)
+    )
+
+
+async def sitemap_chunk_validator(chunk: int) -> Validator | None:
+    """Validator for one sitemap file: changes with the posts in it"""
+    sessionmaker = await db.get_db_sessionmaker()
+    chunk_modified = await db.fetch_sitemap_chunk_last_modified(sessionmaker, chunk, SITEMAP_URLS_PER_FILE)
+    if chunk_modified is None:
+        return None
+    return Validator.build(
+        "s", chunk, SITEMAP_URLS_PER_FILE, chunk_modified.timestamp(), last_modified=chunk_modified
+    )
+
+
+async def _store_when_sent(
+        parts: AsyncIterator[str],
+        key: tuple,
+        version: str,
+        media_type: str,
+    ) -> AsyncIterator[bytes]:
+    body = []
+    async for part in parts:
+        chunk = part.encode()
+        body.append(chunk)
+        yield chunk
+    FEED_CACHE.set(key, CachedDocument(version, CachedPage(gzip.compress(b"".join(body)), media_type)))
+
+
+async def cached_document(
+        request: Request,
+        media_type: str,
+        validator: Validator | None,
+        generate: Callable[[], AsyncIterator[str]],
+    ) -> Response:
+    """Answer a conditional GET, or serve the document from FEED_CACHE if it is
+    current, or else stream it from `generate` and store it once sent
+
+    Documents are the same for every visitor, so unlike conditional_page
+    this validates logged-in requests too.
+
+    Args:
+        request (Request): The request
+        media_type (str): Content type of the document
+        validator (Validator | None): Current version of the document's data
+        generate (Callable[[], AsyncIterator[str]]): Produces the document in parts
+    """
+    if validator is not None and is_not_modified(request, validator):
+        return Response(status_code=304, headers=validator.headers())
+
+    version = validator.etag if validator is not None else ""
+    key = (request.url.path, str(request.base_url))
+    cached = FEED_CACHE.get(key)
+    if cached is not None and cached.version == version:
+        response = page_response(request, cached.page)
+    else:
+        response = StreamingResponse(_store_when_sent(generate(), key, version, media_type), media_type=media_type)
+    if validator is not None:
+        response.headers.update(validator.headers())
+    return response
+
+
+def _w3c_datetime(value: datetime) -> str:
+    """Format a naive UTC datetime as used by both sitemaps and Atom"""
+    return value.replace(microsecond=0).isoformat() + "Z"
+
+
+def _attribute(value: str) -> str:
+    return escape(value, {'"': "&quot;"})
+
+
+async def _sitemap_index(request: Request, chunks: list[db.SitemapChunk]) -> AsyncIterator[str]:
+    yield f'{XML_DECLARATION}<sitemapindex xmlns="{SITEMAP_NAMESPACE}">\n'
+    for chunk in chunks:
+        location = escape(str(request.url_for("sitemap_chunk", chunk=chunk.chunk)))
+        yield f"<sitemap><loc>{location}</loc><lastmod>{_w3c_datetime(chunk.last_modified)}</lastmod></sitemap>\n"
+    yield "</sitemapindex>\n"
+
+
+def _sitemap_url(request: Request, row: Row) -> str:
+    location = escape(str(request.url_for("blog_post_page", post_no=row.post_id)))
+    return f"<url><loc>{location}</loc><lastmod>{_w3c_datetime(row.date_updated)}</lastmod></url>\n"
+
+
+async def _sitemap_urls(request: Request, chunk: int) -> AsyncIterator[str]:
+    sessionmaker = await db.get_db_sessionmaker()
+    yield f'{XML_DECLARATION}<urlset xmlns="{SITEMAP_NAMESPACE}">\n'
+    async for rows in db.stream_sitemap_posts(sessionmaker, chunk, SITEMAP_URLS_PER_FILE):
+        yield "".join(_sitemap_url(request, row) for row in rows)
+    yield "</urlset>\n"
+
+
+@router.get("/sitemap.xml")
+async def sitemap(request: Request):
+    """The sitemap, or a sitemap index once the posts need more than one file"""
+    async def generate() -> AsyncIterator[str]:
+        sessionmaker = await db.get_db_sessionmaker()
+        chunks = await db.fetch_sitemap_chunks(sessionmaker, SITEMAP_URLS_PER_FILE)
+        # A lone chunk other than the first (e.g. after importing posts with
+        # high IDs) still needs the index: _sitemap_urls(1) would be empty
+        if [chunk.chunk for chunk in chunks] in ([], [1]):
+            parts = _sitemap_urls(request, 1)
+        else:
+            parts = _sitemap_index(request, chunks)
+        async for part in parts:
+            yield part
+
+    return await cached_document(request, XML_MEDIA_TYPE, await documents_validator(), generate)
+
+
+@router.get("/sitemaps/posts-{chunk}.xml")
+async def sitemap_chunk(request: Request, chunk: Annotated[int, Path(gt=0, lt=10e6)]):
+    """One file of a split sitemap"""
+    validator = await sitemap_chunk_validator(chunk)
+    if validator is None:
+        return Response(status_code=404)
+    return await cached_document(request, XML_MEDIA_TYPE, validator, lambda: _sitemap_urls(request, chunk))
+
+
+def _atom_entry(request: Request, row: Row) -> str:
+    url = _attribute(str(request.url_for("blog_post_page", post_no=row.post_id)))
+    return (
+        "<entry>"
+        f"<title>{escape(row.title)}</title>"
+        f'<link rel="alternate" type="text/html" href="{url}"/>'
+        f"<id>{url}</id>"
+        f"<published>{_w3c_datetime(row.date_created)}</published>"
+        f"<updated>{_w3c_datetime(row.date_updated)}</updated>"
+        f"<author><name>{escape(row.name)}</name></author>"
+        f"<summary>{escape(row.description or row.excerpt)}</summary>"
+        f'<content type="html">{escape(row.content_html)}</content>'
+        "</entry>\n"
+    )
+
+
+@router.get("/feed.xml")
+async def atom_feed(request: Request):
+    """Atom feed of the newest posts"""
+    async def generate() -> AsyncIterator[str]:
+        sessionmaker = await db.get_db_sessionmaker()
+        blog_config = await db.fetch_blog_config(sessionmaker)
+        updated = await db.fetch_posts_last_modified(sessionmaker) or blog_config.date_updated
+        home = _attribute(str(request.url_for("homepage")))
+        yield (
+            f'{XML_DECLARATION}<feed xmlns="http://www.w3.org/2005/Atom">\n'
+            f"<title>{escape(blog_config.navbar_title)}</title>\n"
+            f"<subtitle>{escape(blog_config.homepage_subheading)}</subtitle>\n"
+            f'<link rel="alternate" type="text/html" href="{home}"/>\n'
+            f'<link rel="self" type="{ATOM_MEDIA_TYPE}" href="{_attribute(str(request.url_for("atom_feed")))}"/>\n'
+            f"<id>{home}</id>\n"
+            f"<updated>{_w3c_datetime(max(updated, blog_config.date_updated))}</updated>\n"
+        )
+        async for rows in db.stream_feed_posts(sessionmaker, FEED_POSTS):
+            yield "".join(_atom_entry(request, row) for row in rows)
+        yield "</feed>\n"
+
+    return await cached_document(request, ATOM_MEDIA_TYPE, await documents_validator(), generate)
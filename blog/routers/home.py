@@ -6,61 +6,154 @@ from typing import Annotated
 from starlette.responses import RedirectResponse
 
 from ..schema import BlogConfig, Post
-from ..templates import templates
+from ..templates import stream_template
+from ..conditional import Validator, conditional_page
+from ..page_cache import cached_page
+from ..view_counts import counts_views
 from .. import database as db
 
 
 router = APIRouter(prefix="")
 
 
-@router.get("/")
-async def homepage(request: Request):
+POSTS_PER_PAGE = 10
+POPULAR_POSTS = 5
+SEARCH_RESULTS_PER_PAGE = 10
+
+
+async def listing_validator(**kwargs) -> Validator | None:
+    """Validator for listing pages: changes with any post, the blog config or the popular posts
+
+    The popular posts change with view counts, which have no modification
+    time, so listing pages get an ETag but no Last-Modified.
+    """
     sessionmaker = await db.get_db_sessionmaker()
-    posts = await db.fetch_posts(sessionmaker, 10, 0)
     blog_config = await db.fetch_blog_config(sessionmaker)
+    posts_modified = await db.fetch_posts_last_modified(sessionmaker)
+    if posts_modified is None:
+        return None
+    popular = await db.fetch_popular_posts(sessionmaker, POPULAR_POSTS)
+    return Validator.build(
+        "l", posts_modified.timestamp(), "c", blog_config.version,
+        "v", ".".join(str(post.post_id) for post in popular),
+        last_modified=None
+    )
+
+
+async def post_validator(post_no: int, **kwargs) -> Validator | None:
+    """Validator for a post page: changes with the post or the blog config"""
+    sessionmaker = await db.get_db_sessionmaker()
+    post_modified = await db.fetch_post_last_modified(sessionmaker, post_no)
+    if post_modified is None:
+        return None
+    blog_config = await db.fetch_blog_config(sessionmaker)
+    return Validator.build(
+        "p", post_no, post_modified.timestamp(), "c", blog_config.version,
+        last_modified=max(post_modified, blog_config.date_updated)
+    )
+
+
+@router.get("/")
+@conditional_page(listing_validator)
+@cached_page("listing")
+async def homepage(
+        request: Request,
+        before: Annotated[str | None, Query(max_length=128)] = None,
+        after: Annotated[str | None, Query(max_length=128)] = None,
+    ):
+    sessionmaker = await db.get_db_sessionmaker()
+    try:
+        data = await db.fetch_home_page_data(sessionmaker, POSTS_PER_PAGE, before, after)
+    except ValueError:
+        request.session["message"] = "That page link is invalid."
+        return RedirectResponse("/", 303)
 
     context = {
         "request": request,
-        "posts": posts,
-        "blog_config": blog_config
+        "posts": data.page.posts,
+        "older_cursor": data.page.older_cursor,
+        "newer_cursor": data.page.newer_cursor,
+        "popular_posts": await db.fetch_popular_posts(sessionmaker, POPULAR_POSTS),
+        "blog_config": data.blog_config
     }
     
-    return templates.TemplateResponse("home.html", context)
+    return stream_template("home.html", context)
 
 
 @router.get("/page/{page_no}")
+@conditional_page(listing_validator)
+@cached_page("listing")
 async def homepage(request: Request, page_no: Annotated[int, Path(gt=0, lt=10e6)] ):
     if page_no == 1:
         return RedirectResponse("/", 303)
 
     sessionmaker = await db.get_db_sessionmaker()
-    limit = (page_no - 1) * 10 + 10
-    offset = (page_no - 1) * 10
-    posts = await db.fetch_posts(sessionmaker, limit, offset) 
+    offset = (page_no - 1) * POSTS_PER_PAGE
+    posts = await db.HOME_FEED.slice(sessionmaker, POSTS_PER_PAGE, offset)
+    if posts is None:
+        # Numbered pages are only served from the feed snapshot. Past it, go
+        # to the same page by cursor while the snapshot holds the post just
+        # before it; deeper pages can't be found without an OFFSET scan
+        snapshot = await db.HOME_FEED.posts(sessionmaker)
+        if offset > len(snapshot):
+            request.session["message"] = "That page is too far back. Use the older posts links instead."
+            return RedirectResponse("/", 303)
+        return RedirectResponse(f"/?before={db.encode_post_cursor(snapshot[offset - 1])}", 303)
     blog_config = await db.fetch_blog_config(sessionmaker)
 
+    # Hand off to cursor links so readers don't keep paging by OFFSET
     context = {
         "request": request,
         "posts": posts,
+        "older_cursor": db.encode_post_cursor(posts[-1]) if len(posts) == POSTS_PER_PAGE else None,
+        "newer_cursor": db.encode_post_cursor(posts[0]) if posts else None,
+        "popular_posts": await db.fetch_popular_posts(sessionmaker, POPULAR_POSTS),
         "blog_config": blog_config
     }
     
-    return templates.TemplateResponse("home.html", context)
+    return stream_template("home.html", context)
 
 
 
 @router.get("/post/{post_no}")
+@counts_views
+@conditional_page(post_validator)
+@cached_page("post:{post_no}")
 async def blog_post_page(
         request: Request,
         post_no: Annotated[int, Path(gt=0, lt=10e6)]
     ):
     """Load a blog post page by post number"""
     sessionmaker = await db.get_db_sessionmaker()
-    blog_config = await db.fetch_blog_config(sessionmaker)
-    post = await db.fetch_post(sessionmaker, post_no)
-    if not post:
+    data = await db.fetch_post_page_data(sessionmaker, post_no)
+    if not data.post:
         request.session["message"] = "Could not find that post."    
         return RedirectResponse("/", status_code=303)
 
-    context = {"request": request, "blog_config": blog_config, "post": post}
-    return templates.TemplateResponse("blog_post.html", context)
+    context = {"request": request, "blog_config": data.blog_config, "post": data.post}
+    return stream_template("blog_post.html", context)
+
+
+@router.get("/search")
+async def search_page(
+        request: Request,
+        q: Annotated[str, Query(max_length=200)] = "",
+        page: Annotated[int, Query(gt=0, le=50)] = 1,
+    ):
+    """Search posts by title, description and content"""
+    sessionmaker = await db.get_db_sessionmaker()
+    blog_config = await db.fetch_blog_config(sessionmaker)
+    results = []
+    if q.strip():
+        offset = (page - 1) * SEARCH_RESULTS_PER_PAGE
+        results = await db.search_posts(sessionmaker, q, SEARCH_RESULTS_PER_PAGE + 1, offset)
+
+    context = {
+        "request": request,
+        "blog_config": blog_config,
+        "q": q,
+        "page": page,
+        "results": results[:SEARCH_RESULTS_PER_PAGE],
+        "has_more": len(results) > SEARCH_RESULTS_PER_PAGE and page < 50,
+    }
+    return stream_template("search.html", context)
@@ -0,0 +1,283 @@
+"""Monitoring endpoint in the Prometheus text exposition format"""
+
+from fastapi import Request
+from fastapi.routing import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from contextlib import suppress
+
+import asyncio
+import logging
+import os
+import secrets
+import tempfile
+
+from .. import database as db
+from ..passwords import PASSWORD_POOL_STATS
+from ..query_log import QUERY_LOG_STATS
+from ..rate_limit import RATE_LIMIT_STATS
+from ..page_cache import PAGE_CACHE
+from ..templates.fragments import FRAGMENT_CACHE
+from ..timing import REQUEST_HISTOGRAMS
+from .feeds import FEED_CACHE
+from ..view_counts import VIEW_BUFFER, VIEW_COUNT_STATS
+
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="")
+
+# Shared by the workers of one gunicorn master, whose pid is their parent's
+METRICS_DIR = os.environ.get("METRICS_DIR") or os.path.join(tempfile.gettempdir(), f"blog-metrics-{os.getppid()}")
+METRICS_WRITE_INTERVAL = float(os.environ.get("METRICS_WRITE_INTERVAL", 5))
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+
+
+def format_metric(name: str, kind: str, help: str, value: float) -> str:
+    """Format one unlabelled sample with its HELP and TYPE lines"""
+    return f"# HELP {name} {help}\n# TYPE {name} {kind}\n{name} {value}\n"
+
+
+def _label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labelled_metric(name: str, kind: str, help: str, samples: list[tuple[dict[str, str], float]]) -> str:
+    """Format a metric family with one sample per label set"""
+    lines = [f"# HELP {name} {help}\n# TYPE {name} {kind}\n"]
+    for labels, value in samples:
+        label_text = ",".join(f'{key}="{_label_value(label)}"' for key, label in labels.items())
+        lines.append(f"{name}{{{label_text}}} {value}\n")
+    return "".join(lines)
+
+
+POOL_METRICS = [
+    ("blog_db_pool_size", "gauge", "Configured pool size", "size"),
+    ("blog_db_pool_checked_in", "gauge", "Idle pooled connections", "checked_in"),
+    ("blog_db_pool_checked_out", "gauge", "Connections in use", "checked_out"),
+    ("blog_db_pool_overflow", "gauge", "Connections open beyond the pool size", "overflow"),
+    ("blog_db_pool_checkouts_total", "counter", "Connection checkouts", "checkouts"),
+    ("blog_db_pool_wait_seconds_total", "counter", "Time spent waiting for a connection", "wait_seconds_total"),
+    ("blog_db_pool_wait_seconds_max", "gauge", "Longest wait for a connection", "wait_seconds_max"),
+]
+
+
+def pool_metric_lines() -> list[str]:
+    """Pool metrics labelled engine="primary", or with the replica's URL for each replica"""
+    pools = [("primary", db.pool_metrics())]
+    pools += [(replica.name, db.pool_metrics(replica.engine)) for replica in db.get_replicas()]
+    pools = [(engine, pool) for engine, pool in pools if pool]
+    if not pools:
+        return []
+    return [
+        format_labelled_metric(name, kind, help, [({"engine": engine}, pool[key]) for engine, pool in pools])
+        for name, kind, help, key in POOL_METRICS
+    ]
+
+
+def cache_metric_lines() -> list[str]:
+    return [
+        format_metric("blog_config_cache_hits_total", "counter", "Blog config cache hits", db.BLOG_CONFIG_CACHE.hits),
+        format_metric("blog_config_cache_misses_total", "counter", "Blog config cache misses", db.BLOG_CONFIG_CACHE.misses),
+        format_metric("blog_page_cache_hits_total", "counter", "Page cache hits", PAGE_CACHE.hits),
+        format_metric("blog_page_cache_misses_total", "counter", "Page cache misses", PAGE_CACHE.misses),
+        format_metric("blog_page_cache_entries", "gauge", "Pages in the page cache", len(PAGE_CACHE)),
+        format_metric("blog_fragment_cache_hits_total", "counter", "Template fragment cache hits", FRAGMENT_CACHE.hits),
+        format_metric("blog_fragment_cache_misses_total", "counter", "Template fragment cache misses", FRAGMENT_CACHE.misses),
+        format_metric("blog_home_feed_hits_total", "counter", "Listing reads served from the feed snapshot", db.HOME_FEED.hits),
+        format_metric("blog_home_feed_misses_total", "counter", "Feed snapshot reloads", db.HOME_FEED.misses),
+        format_metric("blog_last_modified_cache_hits_total", "counter", "Page validators served from memory",
+                      db.LAST_MODIFIED_CACHE.hits),
+        format_metric("blog_last_modified_cache_misses_total", "counter", "Page validators loaded from the database",
+                      db.LAST_MODIFIED_CACHE.misses),
+        format_metric("blog_popular_posts_cache_hits_total", "counter", "Popular posts cache hits",
+                      db.POPULAR_POSTS_CACHE.hits),
+        format_metric("blog_popular_posts_cache_misses_total", "counter", "Popular posts cache misses",
+                      db.POPULAR_POSTS_CACHE.misses),
+        format_metric("blog_feed_cache_hits_total", "counter", "Sitemap and feed cache hits", FEED_CACHE.hits),
+        format_metric("blog_feed_cache_misses_total", "counter", "Sitemap and feed cache misses", FEED_CACHE.misses),
+    ]
+
+
+def view_metric_lines() -> list[str]:
+    return [
+        format_metric("blog_post_views_recorded_total", "counter", "Post views counted", VIEW_COUNT_STATS.recorded),
+        format_metric("blog_post_views_flushed_total", "counter", "Post views written to the database",
+                      VIEW_COUNT_STATS.flushed),
+        format_metric("blog_post_views_pending_posts", "gauge", "Posts with views not yet written", len(VIEW_BUFFER)),
+        format_metric("blog_post_view_flush_failures_total", "counter", "Failed view count writes",
+                      VIEW_COUNT_STATS.flush_failures),
+    ]
+
+
+def replica_metric_lines() -> list[str]:
+    replicas = db.get_replicas()
+    if not replicas:
+        return []
+    return [
+        format_metric("blog_db_replicas_healthy", "gauge", "Replicas reads can be routed to",
+                      sum(replica.healthy() for replica in replicas)),
+        format_metric("blog_db_replica_reads_total", "counter", "Reads routed to a replica",
+                      db.REPLICA_STATS.replica_reads),
+        format_metric("blog_db_replica_fallbacks_total", "counter",
+                      "Replica reads retried on the primary after a connection failure",
+                      db.REPLICA_STATS.primary_fallbacks),
+    ]
+
+
+def password_metric_lines() -> list[str]:
+    return [
+        format_metric("blog_password_hash_queued", "gauge", "Hashing jobs waiting for a thread", PASSWORD_POOL_STATS.queued),
+        format_metric("blog_password_hash_running", "gauge", "Hashing jobs in progress", PASSWORD_POOL_STATS.running),
+        format_metric("blog_password_hash_completed_total", "counter", "Hashing jobs finished", PASSWORD_POOL_STATS.completed),
+        format_metric("blog_password_hash_rejected_total", "counter",
+                      "Hashing jobs refused because the queue was full", PASSWORD_POOL_STATS.rejected),
+    ]
+
+
+def login_metric_lines() -> list[str]:
+    return [
+        format_metric("blog_login_attempts_allowed_total", "counter", "Login attempts let through the rate limiter",
+                      RATE_LIMIT_STATS.allowed),
+        format_metric("blog_login_attempts_rejected_ip_total", "counter",
+                      "Login attempts rejected by the per-client limit", RATE_LIMIT_STATS.rejected_ip),
+        format_metric("blog_login_attempts_rejected_email_total", "counter",
+                      "Login attempts rejected by the per-email limit", RATE_LIMIT_STATS.rejected_email),
+        format_metric("blog_login_rate_limit_errors_total", "counter",
+                      "Login attempts allowed because the rate limiter failed", RATE_LIMIT_STATS.errors),
+    ]
+
+
+def request_metric_lines() -> list[str]:
+    return [line for histogram in REQUEST_HISTOGRAMS for line in histogram.metric_lines()] + [
+        format_metric("blog_slow_queries_total", "counter",
+                      "Statements slower than SLOW_QUERY_SECONDS", QUERY_LOG_STATS.slow_queries),
+        format_metric("blog_repeated_statement_requests_total", "counter",
+                      "Requests that ran one statement REPEATED_QUERY_THRESHOLD or more times",
+                      QUERY_LOG_STATS.repeated_statement_requests),
+    ]
+
+
+def worker_metric_lines() -> list[str]:
+    """Every metric of this worker, unlabelled"""
+    return (pool_metric_lines() + replica_metric_lines() + cache_metric_lines() + view_metric_lines()
+            + password_metric_lines() + login_metric_lines() + request_metric_lines())
+
+
+def _snapshot_path(pid: int) -> str:
+    return os.path.join(METRICS_DIR, f"{pid}.prom")
+
+
+def write_snapshot() -> None:
+    """Atomically replace this worker's snapshot in METRICS_DIR"""
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    path = _snapshot_path(os.getpid())
+    with open(path + ".tmp", "w") as f:
+        f.write("".join(worker_metric_lines()))
+    os.replace(path + ".tmp", path)
+
+
+def remove_snapshot() -> None:
+    """Drop this worker's snapshot so its values stop being reported"""
+    with suppress(FileNotFoundError):
+        os.remove(_snapshot_path(os.getpid()))
+
+
+async def write_snapshots(interval: float) -> None:
+    """Keep this worker's snapshot fresh for scrapes served by other workers"""
+    while True:
+        try:
+            write_snapshot()
+        except OSError:
+            logger.exception("Writing the metrics snapshot failed")
+        await asyncio.sleep(interval)
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _read_snapshots() -> dict[int, str]:
+    snapshots = {}
+    for name in os.listdir(METRICS_DIR):
+        pid, _, suffix = name.partition(".")
+        if suffix != "prom" or not pid.isdigit():
+            continue
+        path = os.path.join(METRICS_DIR, name)
+        if not _alive(int(pid)):
+            # A worker that died without cleaning up; gunicorn has replaced it
+            with suppress(FileNotFoundError):
+                os.remove(path)
+            continue
+        with suppress(FileNotFoundError), open(path) as f:
+            snapshots[int(pid)] = f.read()
+    return snapshots
+
+
+def _with_worker_label(sample: str, pid: int) -> str:
+    name, _, rest = sample.rpartition(" ")
+    if name.endswith("}"):
+        base, _, labels = name.partition("{")
+        return f'{base}{{worker="{pid}",{labels} {rest}'
+    return f'{name}{{worker="{pid}"}} {rest}'
+
+
+def merge_snapshots(snapshots: dict[int, str]) -> str:
+    """Merge per-worker expositions into one, labelling each sample with its worker.
+
+    Samples are regrouped under one HELP and TYPE line per metric family,
+    as the text format requires.
+
+    Args:
+        snapshots (dict[int, str]): Exposition text by worker pid
+
+    Returns:
+        The merged exposition text
+    """
+    headers: dict[str, list[str]] = {}
+    samples: dict[str, list[str]] = {}
+    for pid, text in sorted(snapshots.items()):
+        family = None
+        for line in text.splitlines():
+            if line.startswith("# "):
+                family = line.split(" ", 3)[2]
+                header = headers.setdefault(family, [])
+                if line not in header:
+                    header.append(line)
+                samples.setdefault(family, [])
+            elif line and family is not None:
+                samples[family].append(_with_worker_label(line, pid))
+    return "".join(
+        "\n".join(headers[family] + samples[family]) + "\n" for family in headers
+    )
+
+
+def _authorized(request: Request) -> bool:
+    user = request.session.get("user")
+    if user and user["is_admin"]:
+        return True
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    return bool(METRICS_TOKEN) and scheme.lower() == "bearer" and secrets.compare_digest(token, METRICS_TOKEN)
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics(request: Request):
+    """Expose every worker's metrics for Prometheus to scrape.
+
+    Counters live in each worker process, so workers write snapshots to
+    METRICS_DIR and whichever worker serves the scrape merges them, with a
+    ``worker`` label per sample. Aggregate across workers in the query, e.g.
+    ``sum without (worker) (rate(blog_page_cache_hits_total[5m]))``.
+
+    Only admins and requests bearing METRICS_TOKEN may read it.
+    """
+    if not _authorized(request):
+        return PlainTextResponse("Forbidden\n", 403)
+    write_snapshot()
+    return merge_snapshots(_read_snapshots())
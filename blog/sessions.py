@@ -0,0 +1,246 @@
+"""Server-side sessions.
+
+A signed-in visitor's session cookie carries only a signed, opaque
+session ID; the session data lives in a backend. Use "memory" for a single
+worker and "postgres" when several gunicorn workers must share sessions.
+
+Anonymous sessions only ever hold a flash message or a replica pin, so
+they travel in the signed cookie itself and never reach the backend: a
+bot hitting a page that sets a flash message costs no session write.
+"""
+
+from itsdangerous import BadSignature, Signer
+from starlette.datastructures import MutableHeaders
+from starlette.requests import HTTPConnection
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+import asyncio
+import base64
+import json
+import logging
+import os
+import secrets
+import time
+
+from . import database as db
+from .utils.cache import LRUCache
+
+
+logger = logging.getLogger(__name__)
+
+
+class SessionBackend:
+    """Storage for session data keyed by session ID"""
+
+    async def load(self, session_id: str) -> dict | None:
+        raise NotImplementedError
+
+    async def save(self, session_id: str, data: dict, max_age: int) -> None:
+        raise NotImplementedError
+
+    async def delete(self, session_id: str) -> None:
+        raise NotImplementedError
+
+    async def sweep(self, batch_size: int) -> int:
+        """Delete up to batch_size expired sessions and return how many were deleted"""
+        raise NotImplementedError
+
+
+class MemorySessionBackend(SessionBackend):
+    """Sessions in a bounded in-process LRU; not shared between workers"""
+
+    def __init__(self, maxsize: int, max_age: int):
+        self._cache = LRUCache(maxsize=maxsize, ttl=max_age)
+
+    async def load(self, session_id: str) -> dict | None:
+        data = self._cache.get(session_id)
+        return json.loads(data) if data is not None else None
+
+    async def save(self, session_id: str, data: dict, max_age: int) -> None:
+        # Stored serialized, like the postgres backend, so later requests
+        # can't share nested objects with the stored copy
+        self._cache.set(session_id, json.dumps(data))
+
+    async def delete(self, session_id: str) -> None:
+        self._cache.delete(session_id)
+
+    async def sweep(self, batch_size: int) -> int:
+        return self._cache.purge_expired(batch_size)
+
+
+class PostgresSessionBackend(SessionBackend):
+    """Sessions in the web_sessions table, shared by every worker"""
+
+    async def load(self, session_id: str) -> dict | None:
+        sessionmaker = await db.get_db_sessionmaker()
+        return await db.fetch_web_session(sessionmaker, session_id)
+
+    async def save(self, session_id: str, data: dict, max_age: int) -> None:
+        sessionmaker = await db.get_db_sessionmaker()
+        await db.save_web_session(sessionmaker, session_id, data, max_age)
+
+    async def delete(self, session_id: str) -> None:
+        sessionmaker = await db.get_db_sessionmaker()
+        await db.delete_web_session(sessionmaker, session_id)
+
+    async def sweep(self, batch_size: int) -> int:
+        sessionmaker = await db.get_db_sessionmaker()
+        return await db.delete_expired_web_sessions(sessionmaker, batch_size)
+
+
+SESSION_MAX_AGE = int(os.environ.get("SESSION_MAX_AGE", 14 * 24 * 60 * 60))
+
+
+def backend_from_env() -> SessionBackend:
+    """Build the backend named by SESSION_BACKEND (postgres or memory)"""
+    name = os.environ.get("SESSION_BACKEND", "postgres")
+    if name == "memory":
+        return MemorySessionBackend(int(os.environ.get("SESSION_MEMORY_MAX", 10_000)), SESSION_MAX_AGE)
+    if name == "postgres":
+        return PostgresSessionBackend()
+    raise ValueError(f"Unknown SESSION_BACKEND: {name!r}")
+
+
+class ServerSessionMiddleware:
+    """Populate request.session from a backend keyed by a signed ID cookie,
+    or for anonymous visitors from the signed cookie itself.
+
+    The backend is only read when the request carries a session ID, and
+    only written when the handler changed a signed-in session. The session
+    gets a new ID whenever request.session["user"] changes, on login and
+    logout, so an ID planted before login (session fixation) is worthless
+    after it.
+    """
+
+    def __init__(
+            self,
+            app: ASGIApp,
+            backend: SessionBackend,
+            secret_key: str,
+            session_cookie: str = "session",
+            max_age: int = SESSION_MAX_AGE,
+            same_site: str = "lax",
+            https_only: bool = False,
+        ):
+        self.app = app
+        self.backend = backend
+        self.signer = Signer(secret_key)
+        self.session_cookie = session_cookie
+        self.max_age = max_age
+        self.security_flags = f"httponly; samesite={same_site}" + ("; secure" if https_only else "")
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        session_id, anonymous = self._read_cookie(HTTPConnection(scope))
+        loaded = await self.backend.load(session_id) if session_id else anonymous
+        stale_cookie = session_id is not None and loaded is None
+        if stale_cookie:
+            session_id = None
+        scope["session"] = dict(loaded or {})
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal session_id
+            if message["type"] == "http.response.start":
+                session = scope["session"]
+                headers = MutableHeaders(scope=message)
+                if session != (loaded or {}) or stale_cookie:
+                    if session_id is not None and session.get("user") != (loaded or {}).get("user"):
+                        await self.backend.delete(session_id)
+                        session_id = None
+                    if "user" in session:
+                        is_new = session_id is None
+                        if is_new:
+                            session_id = secrets.token_urlsafe(32)
+                        await self.backend.save(session_id, session, self.max_age)
+                        if is_new:
+                            headers.append("Set-Cookie", self._cookie(self._sign(session_id), self.max_age))
+                    elif session:
+                        headers.append("Set-Cookie", self._cookie(self._sign(_ANONYMOUS + _encode(session)), self.max_age))
+                    else:
+                        headers.append("Set-Cookie", self._cookie("null", 0))
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+    def _read_cookie(self, connection: HTTPConnection) -> tuple[str | None, dict | None]:
+        """The session ID, or the anonymous session data, the cookie carries"""
+        cookie = connection.cookies.get(self.session_cookie)
+        if not cookie:
+            return None, None
+        try:
+            value = self.signer.unsign(cookie).decode()
+        except BadSignature:
+            return None, None
+        if not value.startswith(_ANONYMOUS):
+            return value, None
+        try:
+            return None, json.loads(base64.urlsafe_b64decode(value[len(_ANONYMOUS):]))
+        except ValueError:
+            return None, None
+
+    def _sign(self, value: str) -> str:
+        return self.signer.sign(value).decode()
+
+    def _cookie(self, value: str, max_age: int) -> str:
+        return f"{self.session_cookie}={value}; path=/; Max-Age={max_age}; {self.security_flags}"
+
+
+# Marks a cookie holding anonymous session data rather than a session ID,
+# which is URL-safe base64 and so never contains "!"
+_ANONYMOUS = "!"
+
+
+def _encode(session: dict) -> str:
+    return base64.urlsafe_b64encode(json.dumps(session, separators=(",", ":")).encode()).decode()
+
+
+DB_REPLICA_PIN_SECONDS = float(os.environ.get("DB_REPLICA_PIN_SECONDS", 10))
+
+
+class ReadYourWritesMiddleware:
+    """Send a visitor's reads to the primary database for a while after they write.
+
+    A visitor who writes (see database.mark_written) gets a primary_until
+    timestamp in their session, so the page they are redirected to doesn't
+    come from a replica that hasn't replayed the write yet. Register it
+    inside ServerSessionMiddleware. Without replicas it does nothing.
+    """
+
+    def __init__(self, app: ASGIApp, pin_seconds: float = DB_REPLICA_PIN_SECONDS):
+        self.app = app
+        self.pin_seconds = pin_seconds
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not db.get_replicas():
+            await self.app(scope, receive, send)
+            return
+
+        session = scope["session"]
+        pinned = session.get("primary_until", 0) > time.time()
+        if not pinned:
+            session.pop("primary_until", None)
+        routing, token = db.begin_read_routing(pinned)
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start" and routing.wrote:
+                scope["session"]["primary_until"] = time.time() + self.pin_seconds
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            db.end_read_routing(token)
+
+
+async def sweep_expired_sessions(backend: SessionBackend, interval: float, batch_size: int) -> None:
+    """Delete expired sessions in batches every `interval` seconds, forever"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            while await backend.sweep(batch_size) == batch_size:
+                await asyncio.sleep(0)
+        except Exception:
+            logger.exception("Session sweep failed")
@@ -0,0 +1,108 @@
+"""Fingerprinted, precompressed static assets.
+
+At startup every file under the static directory is copied to a build
+directory as name.<hash>.ext along with .gz and (if the brotli package is
+installed) .br variants. Hashed names are served with an immutable
+Cache-Control header, picking the precompressed variant the client
+accepts, and templates link to them through STATIC_MANIFEST.
+"""
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import StaticFiles
+from starlette.types import Scope
+
+import gzip
+import hashlib
+import mimetypes
+import os
+import posixpath
+import tempfile
+
+try:
+    import brotli
+except ImportError:  # Optional: without it only gzip variants are built
+    brotli = None
+
+
+STATIC_BUILD_DIR = os.environ.get(
+    "STATIC_BUILD_DIR", os.path.join(tempfile.gettempdir(), "blog-static-build")
+)
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Source path (e.g. "css/style.css") -> hashed path (e.g. "css/style.1a2b3c4d5e6f.css")
+STATIC_MANIFEST: dict[str, str] = {}
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    # Several workers build the same files at startup; never expose a partial one
+    if os.path.exists(path):
+        return
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    with os.fdopen(fd, "wb") as tmp:
+        tmp.write(data)
+    os.replace(tmp_path, path)
+
+
+def build_static_assets(source_dir: str, build_dir: str = STATIC_BUILD_DIR) -> dict[str, str]:
+    """Fingerprint and precompress every file in source_dir into build_dir
+
+    Args:
+        source_dir (str): Directory of original static files
+        build_dir (str): Directory to write hashed and compressed files to
+
+    Returns:
+        dict[str, str]: Manifest mapping source paths to hashed paths
+    """
+    manifest = {}
+    for root, _, files in os.walk(source_dir):
+        for filename in files:
+            source_path = os.path.join(root, filename)
+            relative_path = os.path.relpath(source_path, source_dir).replace(os.sep, "/")
+            with open(source_path, "rb") as source:
+                data = source.read()
+
+            digest = hashlib.sha256(data).hexdigest()[:12]
+            stem, extension = posixpath.splitext(relative_path)
+            hashed_path = f"{stem}.{digest}{extension}"
+            target = os.path.join(build_dir, *hashed_path.split("/"))
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+
+            _write_atomic(target, data)
+            _write_atomic(target + ".gz", gzip.compress(data, compresslevel=9, mtime=0))
+            if brotli is not None:
+                _write_atomic(target + ".br", brotli.compress(data))
+            manifest[relative_path] = hashed_path
+    return manifest
+
+
+def static_path(path: str) -> str:
+    """Map a static path to its fingerprinted name, if it has one"""
+    normalized = posixpath.normpath(path).lstrip("/")
+    return STATIC_MANIFEST.get(normalized, path)
+
+
+class HashedStaticFiles(StaticFiles):
+    """StaticFiles that also serves the fingerprinted build of its directory"""
+
+    def __init__(self, *, directory: str, build_dir: str = STATIC_BUILD_DIR, **kwargs):
+        super().__init__(directory=directory, **kwargs)
+        self.build_dir = build_dir
+        STATIC_MANIFEST.update(build_static_assets(directory, build_dir))
+        self.hashed_paths = set(STATIC_MANIFEST.values())
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        hashed_path = path.replace(os.sep, "/")
+        if hashed_path not in self.hashed_paths:
+            return await super().get_response(path, scope)
+
+        full_path = os.path.join(self.build_dir, *hashed_path.split("/"))
+        media_type = mimetypes.guess_type(hashed_path)[0] or "application/octet-stream"
+        headers = {"Cache-Control": IMMUTABLE_CACHE_CONTROL, "Vary": "Accept-Encoding"}
+
+        accept_encoding = Headers(scope=scope).get("accept-encoding", "")
+        for encoding, suffix in (("br", ".br"), ("gzip", ".gz")):
+            if encoding in accept_encoding and os.path.exists(full_path + suffix):
+                headers["Content-Encoding"] = encoding
+                return FileResponse(full_path + suffix, headers=headers, media_type=media_type)
+        return FileResponse(full_path, headers=headers, media_type=media_type)
@@ -1,10 +1,154 @@
+from starlette.background import BackgroundTask
+from starlette.requests import Request
+from starlette.responses import Response, StreamingResponse
 from starlette.templating import Jinja2Templates
+from markupsafe import Markup, escape
+from typing import AsyncIterator, Iterator
+import jinja2
 import os
+import tempfile
 
+from ..database import SNIPPET_START, SNIPPET_STOP
+from ..static_assets import static_path
+from ..timing import current_timings, timed
+from .fragments import FragmentCacheExtension
+
+
+# "production" compiles each template once, shares compiled bytecode between
+# workers through TEMPLATES_CACHE_DIR and never stats template files again;
+# "development" reloads templates when they change on disk
+TEMPLATES_MODE = os.environ.get("TEMPLATES_MODE", "production")
+TEMPLATES_CACHE_DIR = os.environ.get(
+    "TEMPLATES_CACHE_DIR", os.path.join(tempfile.gettempdir(), "blog-jinja-cache")
+)
+
+# stream_template sends pages as they render, TEMPLATES_STREAM_CHUNK_BYTES
+# at a time and at every {{ stream_flush }} in a template
+TEMPLATES_STREAMING = os.environ.get("TEMPLATES_STREAMING", "true").lower() in ("1", "true", "yes", "on")
+TEMPLATES_STREAM_CHUNK_BYTES = int(os.environ.get("TEMPLATES_STREAM_CHUNK_BYTES", 16 * 1024))
+STREAM_FLUSH = "\x00flush\x00"
+
+
+class TimedTemplate(jinja2.Template):
+    """Template that adds its render time to the current request's timings"""
+
+    def render(self, *args, **kwargs) -> str:
+        with timed("template_seconds"):
+            return super().render(*args, **kwargs)
+
+
+def create_environment(mode: str = TEMPLATES_MODE, cache_dir: str = TEMPLATES_CACHE_DIR) -> jinja2.Environment:
+    """Build the Jinja environment for TEMPLATES_DIR in the given mode"""
+    loader = jinja2.FileSystemLoader(os.environ["TEMPLATES_DIR"])
+    if mode == "development":
+        environment = jinja2.Environment(loader=loader, autoescape=True, auto_reload=True,
+                                         extensions=[FragmentCacheExtension])
+    else:
+        os.makedirs(cache_dir, exist_ok=True)
+        environment = jinja2.Environment(
+            loader=loader,
+            autoescape=True,
+            auto_reload=False,
+            extensions=[FragmentCacheExtension],
+            bytecode_cache=jinja2.FileSystemBytecodeCache(cache_dir),
+        )
+    environment.template_class = TimedTemplate
+    return environment
+
+
+templates = Jinja2Templates(env=create_environment())
+
+_starlette_url_for = templates.env.globals["url_for"]
+
+
+@jinja2.pass_context
+def url_for(context, name, /, **path_params):
+    """Starlette's url_for, linking static files to their fingerprinted names"""
+    if name == "static" and "path" in path_params:
+        path_params["path"] = static_path(path_params["path"])
+    return _starlette_url_for(context, name, **path_params)
+
+templates.env.globals["url_for"] = url_for
+
+
+def precompile_templates() -> int:
+    """Load every template so none is compiled while serving a request
+
+    Returns:
+        int: Number of templates loaded
+    """
+    names = templates.env.list_templates(extensions=["html"])
+    for name in names:
+        templates.env.get_template(name)
+    return len(names)
+
+class StreamingTemplateResponse(StreamingResponse):
+    """A template rendered into the response as it is sent"""
+
+    def __init__(self, template: jinja2.Template, context: dict, status_code: int = 200,
+                 background: BackgroundTask | None = None):
+        self.template = template
+        self.context = context
+        super().__init__(_render_stream(template, context), status_code=status_code,
+                         media_type="text/html", background=background)
+
+
+def _render_chunks(template: jinja2.Template, context: dict) -> Iterator[str]:
+    """Join Jinja's many small output pieces into chunks, cut at size or at STREAM_FLUSH"""
+    buffer, size = [], 0
+    for piece in template.generate(context):
+        if piece == STREAM_FLUSH:
+            if buffer:
+                yield "".join(buffer)
+                buffer, size = [], 0
+            continue
+        buffer.append(piece)
+        size += len(piece)
+        if size >= TEMPLATES_STREAM_CHUNK_BYTES:
+            yield "".join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield "".join(buffer)
+
+
+async def _render_stream(template: jinja2.Template, context: dict) -> AsyncIterator[bytes]:
+    chunks = _render_chunks(template, context)
+    while True:
+        with timed("template_seconds"):
+            chunk = next(chunks, None)
+        if chunk is None:
+            return
+        yield chunk.encode()
+
+
+def stream_template(name: str, context: dict, status_code: int = 200) -> Response:
+    """Render a template as a streamed response, the head and nav first.
+
+    The session is saved when the response starts, before the body renders,
+    so the flash message is popped here and handed to base.html as
+    flash_message rather than popped by the template.
+
+    Falls back to templates.TemplateResponse when TEMPLATES_STREAMING is off.
+    """
+    if not TEMPLATES_STREAMING:
+        return templates.TemplateResponse(name, context, status_code=status_code)
+    request: Request = context["request"]
+    context.setdefault("flash_message", request.session.pop("message", None))
+    context["stream_flush"] = STREAM_FLUSH
+    timings = current_timings()
+    if timings is not None:
+        # Rendering happens after Server-Timing is sent (see timing.py)
+        timings.streamed = True
+    return StreamingTemplateResponse(templates.get_template(name), context, status_code)
 
-templates = Jinja2Templates(os.environ["TEMPLATES_DIR"])
 
 def datetime_format(value, format="%B %m, %Y"):
     return value.strftime(format)
 
+def highlight(snippet):
+    """Escape a search snippet and mark up its matched words"""
+    marked = str(escape(snippet)).replace(SNIPPET_START, "<mark>").replace(SNIPPET_STOP, "</mark>")
+    return Markup(marked)
+
 templates.env.filters["datetime_format"] = datetime_format
+templates.env.filters["highlight"] = highlight
@@ -0,0 +1,53 @@
+"""{% cache %} template tag for reusing rendered fragments"""
+
+from jinja2 import nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+
+from typing import Callable
+
+import os
+
+from ..utils.cache import LRUCache
+
+
+FRAGMENT_CACHE = LRUCache(
+    maxsize=int(os.environ.get("FRAGMENT_CACHE_SIZE", 2048)),
+    ttl=float(os.environ.get("FRAGMENT_CACHE_TTL", 3600)),
+)
+
+
+class FragmentCacheExtension(Extension):
+    """Cache the rendered body of a block under a key built from its arguments.
+
+    Include something that changes on every edit in the key, so a stale
+    fragment is never looked up again::
+
+        {% cache "byline", post.post_id, post.date_updated %}
+            {{ post.name }} {{ post.date_created|datetime_format }}
+        {% endcache %}
+
+    Keys are global, so the same fragment is shared by every template that
+    uses it. Never cache anything that depends on the visitor, including
+    absolute URLs from request.url_for, which carry the request's host;
+    use request.app.url_path_for inside a cached block.
+    """
+
+    tags = {"cache"}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        key_parts = [parser.parse_expression()]
+        while parser.stream.skip_if("comma"):
+            key_parts.append(parser.parse_expression())
+        body = parser.parse_statements(("name:endcache",), drop_needle=True)
+        call = self.call_method("_render_cached", [nodes.List(key_parts)])
+        return nodes.CallBlock(call, [], [], body).set_lineno(lineno)
+
+    def _render_cached(self, key_parts: list, caller: Callable[[], str]) -> str:
+        key = tuple(key_parts)
+        fragment = FRAGMENT_CACHE.get(key)
+        if fragment is None:
+            fragment = Markup(caller())
+            FRAGMENT_CACHE.set(key, fragment)
+        return fragment
@@ -0,0 +1,205 @@
+"""Per-request timing: where a slow page spent its time.
+
+TimingMiddleware starts a RequestTimings for every HTTP request and stores
+it in a context variable. The SQLAlchemy engine hooks, the Jinja template
+class and the password pool add their time to it. The response gets a
+Server-Timing header with the breakdown. When the request finishes, every
+figure goes into the process-wide histograms that /metrics exposes.
+Statements also go to blog.query_log for slow-query and repeated-statement
+logging.
+
+Headers go out before the body, and a streamed template renders as its
+body is sent (see templates.stream_template). For those responses the
+header therefore only has the db and pwd time spent before the first
+byte; tpl and total are left out rather than reported as near zero. The
+histograms are recorded once the body has been sent, so they cover the
+whole request either way.
+"""
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Iterator
+
+import os
+import time
+
+from . import query_log
+
+
+SERVER_TIMING_HEADER = os.environ.get("SERVER_TIMING_HEADER", "true").lower() in ("1", "true", "yes", "on")
+
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+@dataclass(slots=True)
+class RequestTimings:
+    """Time spent by one request, by kind"""
+    start: float
+    path: str = ""
+    db_seconds: float = 0.0
+    queries: int = 0
+    template_seconds: float = 0.0
+    password_seconds: float = 0.0
+    # Set for a response whose body renders after its headers are sent
+    streamed: bool = False
+    # Runs per (statement, parameters repr), for the repeated-statement detector
+    statements: Counter = field(default_factory=Counter)
+
+
+_current_timings: ContextVar[RequestTimings | None] = ContextVar("request_timings", default=None)
+
+
+def current_timings() -> RequestTimings | None:
+    """The timings of the request being handled, if any"""
+    return _current_timings.get()
+
+
+@contextmanager
+def timed(attribute: str) -> Iterator[None]:
+    """Add the time spent in the block to an attribute of the current request's timings"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings = _current_timings.get()
+        if timings is not None:
+            setattr(timings, attribute, getattr(timings, attribute) + time.perf_counter() - start)
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus sense"""
+
+    def __init__(self, name: str, help: str, buckets: tuple[float, ...]):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def metric_lines(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}\n", f"# TYPE {self.name} histogram\n"]
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{self.name}_bucket{{le="{bound}"}} {cumulative}\n')
+        lines.append(f'{self.name}_bucket{{le="+Inf"}} {self.count}\n')
+        lines.append(f"{self.name}_sum {self.sum}\n")
+        lines.append(f"{self.name}_count {self.count}\n")
+        return lines
+
+
+REQUEST_SECONDS = Histogram("blog_request_seconds", "Total time to handle a request", SECONDS_BUCKETS)
+REQUEST_DB_SECONDS = Histogram("blog_request_db_seconds", "Time a request spent in SQL queries", SECONDS_BUCKETS)
+REQUEST_QUERIES = Histogram("blog_request_queries", "SQL queries run by a request", QUERY_COUNT_BUCKETS)
+REQUEST_TEMPLATE_SECONDS = Histogram("blog_request_template_seconds",
+                                     "Time a request spent rendering templates", SECONDS_BUCKETS)
+REQUEST_PASSWORD_SECONDS = Histogram("blog_request_password_seconds",
+                                     "Time a request spent waiting for password hashing", SECONDS_BUCKETS)
+
+REQUEST_HISTOGRAMS = [
+    REQUEST_SECONDS, REQUEST_DB_SECONDS, REQUEST_QUERIES, REQUEST_TEMPLATE_SECONDS, REQUEST_PASSWORD_SECONDS,
+]
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    elapsed = time.perf_counter() - conn.info["query_start_time"].pop()
+    timings = _current_timings.get()
+    if timings is not None:
+        timings.db_seconds += elapsed
+        timings.queries += 1
+        if query_log.REPEATED_QUERY_THRESHOLD > 0:
+            timings.statements[statement, repr(parameters)] += 1
+    query_log.log_statement(conn, statement, parameters, executemany, elapsed,
+                            timings.path if timings is not None else "")
+
+
+def _handle_error(exception_context) -> None:
+    # A failed statement never reaches after_cursor_execute
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("query_start_time"):
+        connection.info["query_start_time"].pop()
+
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    """Count, time and log every statement the engine runs against the current request
+
+    Args:
+        engine (AsyncEngine): Engine to attach the hooks to
+    """
+    sync_engine = engine.sync_engine
+    if event.contains(sync_engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(sync_engine, "handle_error", _handle_error)
+
+
+def server_timing(timings: RequestTimings, total: float) -> str:
+    """Format timings as a Server-Timing header value (durations in ms)
+
+    tpl and total are omitted for streamed responses, whose rendering
+    hasn't started when the header is sent.
+    """
+    metrics = [f'db;dur={timings.db_seconds * 1000:.1f};desc="{timings.queries} queries"']
+    if not timings.streamed:
+        metrics.append(f"tpl;dur={timings.template_seconds * 1000:.1f}")
+    metrics.append(f"pwd;dur={timings.password_seconds * 1000:.1f}")
+    if not timings.streamed:
+        metrics.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(metrics)
+
+
+class TimingMiddleware:
+    """Time each HTTP request, report it in Server-Timing and record it in the histograms.
+
+    Register it outermost so the total covers the session backend and
+    compression as well as the endpoint.
+    """
+
+    def __init__(self, app: ASGIApp, header: bool = SERVER_TIMING_HEADER):
+        self.app = app
+        self.header = header
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings(start=time.perf_counter(), path=scope["path"])
+        token = _current_timings.set(timings)
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start" and self.header:
+                total = time.perf_counter() - timings.start
+                MutableHeaders(scope=message).append("Server-Timing", server_timing(timings, total))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current_timings.reset(token)
+            REQUEST_SECONDS.observe(time.perf_counter() - timings.start)
+            REQUEST_DB_SECONDS.observe(timings.db_seconds)
+            REQUEST_QUERIES.observe(timings.queries)
+            REQUEST_TEMPLATE_SECONDS.observe(timings.template_seconds)
+            REQUEST_PASSWORD_SECONDS.observe(timings.password_seconds)
+            query_log.report_repeated_statements(timings.path, timings.statements)
@@ -0,0 +1,90 @@
+"""In-process caching primitives"""
+
+from collections import OrderedDict
+from typing import Any, Hashable, Iterable
+
+import time
+
+
+class LRUCache:
+    """Bounded least-recently-used cache with a per-entry TTL.
+
+    Entries can carry tags so that a group of keys (e.g. every listing page)
+    can be purged at once without knowing the individual keys.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[Hashable, tuple[float, Any, tuple[str, ...]]] = OrderedDict()
+        self._tags: dict[str, set[Hashable]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Any | None:
+        """Return the value for key, or None if it is missing or expired"""
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= time.monotonic():
+            if entry is not None:
+                self._remove(key)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key: Hashable, value: Any, tags: Iterable[str] = ()) -> None:
+        """Store value under key, evicting the least recently used entry if full"""
+        if key in self._entries:
+            self._remove(key)
+        tags = tuple(tags)
+        self._entries[key] = (time.monotonic() + self.ttl, value, tags)
+        for tag in tags:
+            self._tags.setdefault(tag, set()).add(key)
+        while len(self._entries) > self.maxsize:
+            self._remove(next(iter(self._entries)))
+
+    def purge_tag(self, tag: str) -> None:
+        """Remove every entry stored with tag"""
+        for key in self._tags.pop(tag, set()):
+            self._remove(key)
+
+    def delete(self, key: Hashable) -> None:
+        """Remove key if present"""
+        self._remove(key)
+
+    def purge_expired(self, limit: int) -> int:
+        """Remove up to limit expired entries, least recently used first
+
+        Returns:
+            int: Number of entries removed
+        """
+        now = time.monotonic()
+        expired = []
+        for key, entry in self._entries.items():
+            if len(expired) >= limit:
+                break
+            if entry[0] <= now:
+                expired.append(key)
+        for key in expired:
+            self._remove(key)
+        return len(expired)
+
+    def clear(self) -> None:
+        """Remove every entry"""
+        self._entries.clear()
+        self._tags.clear()
+
+    def _remove(self, key: Hashable) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
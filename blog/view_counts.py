@@ -0,0 +1,102 @@
+"""Write-behind counting of post views.
+
+Each worker adds up views in memory and writes them with one batched
+upsert (see database.add_post_views) every VIEW_FLUSH_INTERVAL seconds, at
+shutdown, or sooner once VIEW_BUFFER_MAX_POSTS different posts are
+pending. A worker that dies without shutting down loses at most one
+interval of views; counts are for ranking, not billing.
+"""
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from starlette.responses import Response
+
+from collections import Counter
+from dataclasses import dataclass
+from typing import Awaitable, Callable
+
+import asyncio
+import functools
+import logging
+import os
+
+from . import database as db
+
+
+logger = logging.getLogger(__name__)
+
+VIEW_FLUSH_INTERVAL = float(os.environ.get("VIEW_FLUSH_INTERVAL", 10))
+VIEW_BUFFER_MAX_POSTS = int(os.environ.get("VIEW_BUFFER_MAX_POSTS", 10_000))
+
+
+@dataclass
+class ViewCountStats:
+    """Counters for the view buffer"""
+    recorded: int = 0
+    flushed: int = 0
+    flush_failures: int = 0
+
+
+VIEW_COUNT_STATS = ViewCountStats()
+
+
+class ViewBuffer:
+    """Views per post not yet written to the database"""
+
+    def __init__(self, max_posts: int):
+        self.max_posts = max_posts
+        self._pending: Counter[int] = Counter()
+        self._full = asyncio.Event()
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def record(self, post_id: int) -> None:
+        """Count one view of a post"""
+        self._pending[post_id] += 1
+        VIEW_COUNT_STATS.recorded += 1
+        if len(self._pending) >= self.max_posts:
+            self._full.set()
+
+    async def flush(self, async_session: async_sessionmaker[AsyncSession]) -> None:
+        """Write the pending views; on failure they stay pending for the next flush"""
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, Counter()
+        self._full.clear()
+        try:
+            await db.add_post_views(async_session, pending)
+        except BaseException:
+            VIEW_COUNT_STATS.flush_failures += 1
+            self._pending.update(pending)
+            raise
+        VIEW_COUNT_STATS.flushed += pending.total()
+
+    async def run(self, async_session: async_sessionmaker[AsyncSession], interval: float) -> None:
+        """Flush every `interval` seconds, or as soon as the buffer fills, forever"""
+        while True:
+            try:
+                await asyncio.wait_for(self._full.wait(), interval)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self.flush(async_session)
+            except Exception:
+                logger.exception("Writing %d posts' view counts failed", len(self._pending))
+
+
+VIEW_BUFFER = ViewBuffer(VIEW_BUFFER_MAX_POSTS)
+
+
+def counts_views(endpoint: Callable[..., Awaitable[Response]]) -> Callable[..., Awaitable[Response]]:
+    """Record a view of the post_no post for each page served, from cache or not.
+
+    Register it outside conditional_page and cached_page so 304s and cached
+    pages count too.
+    """
+    @functools.wraps(endpoint)
+    async def wrapper(*args, **kwargs) -> Response:
+        response = await endpoint(*args, **kwargs)
+        if response.status_code in (200, 304):
+            VIEW_BUFFER.record(kwargs["post_no"])
+        return response
+    return wrapper
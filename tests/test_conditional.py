@@ -0,0 +1,28 @@
+"""Validators without a modification time must only ever match by ETag"""
+
+from datetime import datetime
+
+from starlette.requests import Request
+
+from blog.conditional import Validator, is_not_modified
+
+
+def make_request(**headers: str) -> Request:
+    return Request({
+        "type": "http", "method": "GET", "path": "/",
+        "headers": [(name.replace("_", "-").lower().encode(), value.encode()) for name, value in headers.items()],
+    })
+
+
+def test_validator_without_last_modified_ignores_if_modified_since():
+    validator = Validator.build("l", 1, last_modified=None)
+    assert "Last-Modified" not in validator.headers()
+    assert not is_not_modified(make_request(If_Modified_Since="Fri, 01 Jan 2100 00:00:00 GMT"), validator)
+    assert is_not_modified(make_request(If_None_Match=validator.etag), validator)
+
+
+def test_validator_with_last_modified_honours_if_modified_since():
+    validator = Validator.build("p", 1, last_modified=datetime(2024, 1, 1, 12, 0, 0, 500))
+    assert validator.headers()["Last-Modified"] == "Mon, 01 Jan 2024 12:00:00 GMT"
+    assert is_not_modified(make_request(If_Modified_Since="Mon, 01 Jan 2024 12:00:00 GMT"), validator)
+    assert not is_not_modified(make_request(If_Modified_Since="Sun, 31 Dec 2023 12:00:00 GMT"), validator)
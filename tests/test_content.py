@@ -0,0 +1,27 @@
+"""render_content must keep legacy HTML posts as HTML"""
+
+from blog.content import HTML, render_content
+
+
+# As saved by the old update_post.html, which indented the textarea's content
+LEGACY_POST = "\n                <p>Hello <b>world</b></p>\n<p>Second</p>\n            "
+
+
+def test_indented_legacy_html_is_not_a_code_block():
+    rendered = render_content(LEGACY_POST, HTML)
+
+    assert rendered.html == "<p>Hello <b>world</b></p>\n<p>Second</p>"
+    assert rendered.excerpt == "Hello world Second"
+    assert rendered.word_count == 3
+
+
+def test_legacy_html_is_sanitized():
+    rendered = render_content('    <p onclick="steal()">Hi</p><script>steal()</script>', HTML)
+
+    assert rendered.html == "<p>Hi</p>"
+
+
+def test_markdown_indented_code_is_still_code():
+    rendered = render_content("Text\n\n    code line")
+
+    assert "<pre><code>code line" in rendered.html
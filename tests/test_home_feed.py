@@ -0,0 +1,121 @@
+"""HomeFeed must page exactly like the keyset queries it stands in for"""
+
+from datetime import datetime, timedelta
+
+import asyncio
+
+import pytest
+
+from blog.database import crud
+
+
+N_POSTS = 25
+LIMIT = 10
+
+
+def make_posts(n: int) -> list[crud.PostSummary]:
+    """n posts, newest first, with pairs sharing a date_created to exercise the post_id tiebreak"""
+    start = datetime(2024, 1, 1)
+    posts = [
+        crud.PostSummary(
+            post_id=i, title=f"Post {i}", description="", image_url=None,
+            date_created=start + timedelta(days=i // 2), date_updated=start,
+            reading_minutes=1, name="Author",
+        )
+        for i in range(1, n + 1)
+    ]
+    return sorted(posts, key=crud._sort_key, reverse=True)
+
+
+@pytest.fixture
+def loads() -> list[int]:
+    """Limits of the snapshot loads made by the posts fixture"""
+    return []
+
+
+@pytest.fixture
+def posts(monkeypatch, loads) -> list[crud.PostSummary]:
+    posts = make_posts(N_POSTS)
+
+    async def fetch_posts(async_session, limit, offset):
+        loads.append(limit)
+        return posts[offset:offset + limit]
+
+    monkeypatch.setattr(crud, "fetch_posts", fetch_posts)
+    return posts
+
+
+def reference_page(posts, limit, before=None, after=None) -> list[int]:
+    """What _select_posts_page returns, computed directly"""
+    if after is not None:
+        cursor = crud.decode_post_cursor(after)
+        newer = [post for post in posts if crud._sort_key(post) > cursor]
+        return [post.post_id for post in newer[-limit:]]
+    if before is not None:
+        cursor = crud.decode_post_cursor(before)
+        posts = [post for post in posts if crud._sort_key(post) < cursor]
+    return [post.post_id for post in posts[:limit]]
+
+
+def walk(feed: crud.HomeFeed) -> list[crud.PostPage]:
+    """Follow older cursors from the first page while the feed can serve them"""
+    pages = [asyncio.run(feed.page(None, LIMIT))]
+    while pages[-1] is not None and pages[-1].older_cursor:
+        pages.append(asyncio.run(feed.page(None, LIMIT, before=pages[-1].older_cursor)))
+    return pages
+
+
+def test_pages_match_keyset_queries(posts):
+    feed = crud.HomeFeed(size=N_POSTS + 5, ttl=60)
+    pages = walk(feed)
+
+    assert [post.post_id for page in pages for post in page.posts] == [post.post_id for post in posts]
+    assert pages[0].newer_cursor is None
+    assert pages[-1].older_cursor is None
+    for page in pages[1:]:
+        newer = asyncio.run(feed.page(None, LIMIT, after=page.newer_cursor))
+        assert [post.post_id for post in newer.posts] == reference_page(posts, LIMIT, after=page.newer_cursor)
+
+
+def test_pages_past_the_snapshot_fall_back_to_the_database(posts):
+    feed = crud.HomeFeed(size=15, ttl=60)
+    first = asyncio.run(feed.page(None, LIMIT))
+
+    assert [post.post_id for post in first.posts] == reference_page(posts, LIMIT)
+    assert asyncio.run(feed.page(None, LIMIT, before=first.older_cursor)) is None
+    assert asyncio.run(feed.slice(None, LIMIT, 10)) is None
+
+
+def test_upsert_keeps_order_and_size(posts):
+    feed = crud.HomeFeed(size=N_POSTS, ttl=60)
+    asyncio.run(feed.posts(None))
+    newest = crud.PostSummary(
+        post_id=100, title="New", description="", image_url=None,
+        date_created=datetime(2030, 1, 1), date_updated=datetime(2030, 1, 1),
+        reading_minutes=1, name="Author",
+    )
+    feed.upsert(newest)
+    snapshot = asyncio.run(feed.posts(None))
+
+    assert snapshot[0].post_id == 100
+    assert len(snapshot) == N_POSTS
+    assert snapshot == sorted(snapshot, key=crud._sort_key, reverse=True)
+
+
+def test_snapshot_expires_after_ttl(posts, loads, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(crud.time, "monotonic", lambda: now[0])
+    feed = crud.HomeFeed(size=N_POSTS, ttl=60)
+
+    asyncio.run(feed.posts(None))
+    asyncio.run(feed.posts(None))
+    assert len(loads) == 1
+    now[0] += 61
+    asyncio.run(feed.posts(None))
+    assert len(loads) == 2
+
+
+def test_malformed_cursor_raises(posts):
+    feed = crud.HomeFeed(size=N_POSTS, ttl=60)
+    with pytest.raises(ValueError):
+        asyncio.run(feed.page(None, LIMIT, before="not a cursor"))
@@ -0,0 +1,117 @@
+"""Login throttling: token buckets, client keys and the refund on success"""
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import pytest
+
+from blog import database as db
+from blog import passwords
+from blog import rate_limit
+from blog.rate_limit import MemoryLoginLimiter, Rate, TokenBuckets, client_key
+from blog.routers import auth
+from blog.sessions import MemorySessionBackend, ServerSessionMiddleware
+
+
+@pytest.fixture
+def now(monkeypatch) -> list[float]:
+    """The monotonic clock the buckets see; advance it by changing now[0]"""
+    now = [1000.0]
+    monkeypatch.setattr(rate_limit.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_take_spends_the_burst_then_refills(now):
+    buckets = TokenBuckets(Rate(burst=2, per_second=1), max_keys=10)
+
+    assert [buckets.take("a") for _ in range(3)] == [True, True, False]
+    assert buckets.take("b")
+    now[0] += 1
+    assert buckets.take("a")
+    assert not buckets.take("a")
+
+
+def test_give_back_returns_a_token_up_to_the_burst(now):
+    buckets = TokenBuckets(Rate(burst=2, per_second=0), max_keys=10)
+    buckets.take("a")
+    buckets.take("a")
+
+    buckets.give_back("a")
+    assert buckets.take("a")
+    assert not buckets.take("a")
+
+    buckets.give_back("a")
+    buckets.give_back("a")
+    buckets.give_back("a")
+    assert [buckets.take("a") for _ in range(3)] == [True, True, False]
+
+
+def test_least_recently_used_keys_are_dropped(now):
+    buckets = TokenBuckets(Rate(burst=1, per_second=0), max_keys=2)
+    for key in ("a", "b", "c"):
+        buckets.take(key)
+
+    assert len(buckets) == 2
+    assert buckets.take("a")  # Forgotten, so full again
+    assert not buckets.take("c")
+
+
+@pytest.mark.parametrize("host, key", [
+    ("203.0.113.7", "203.0.113.7"),
+    ("::ffff:203.0.113.7", "203.0.113.7"),
+    ("2001:db8:1:2:3:4:5:6", "2001:db8:1:2::/64"),
+    ("2001:db8:1:2:ffff::1", "2001:db8:1:2::/64"),
+    ("testclient", "testclient"),
+])
+def test_client_key(host, key):
+    assert client_key(host) == key
+
+
+@pytest.fixture
+def client(monkeypatch, now) -> TestClient:
+    """The login route with a memory limiter allowing 2 attempts per email and none refilled"""
+    user = db.User(user_id=1, email="author@example.com", password="hash", is_admin=False, name="Author")
+
+    async def get_db_sessionmaker():
+        return None
+
+    async def fetch_user(sessionmaker, email):
+        return user if email == user.email else None
+
+    async def verify_password(password, hashed):
+        return password == "right"
+
+    monkeypatch.setattr(db, "get_db_sessionmaker", get_db_sessionmaker)
+    monkeypatch.setattr(db, "fetch_user", fetch_user)
+    monkeypatch.setattr(passwords, "verify_password", verify_password)
+    monkeypatch.setattr(passwords, "needs_rehash", lambda hashed: False)
+
+    app = FastAPI()
+    app.add_middleware(ServerSessionMiddleware, backend=MemorySessionBackend(100, 60), secret_key="secret")
+    app.include_router(auth.router)
+    app.state.login_limiter = MemoryLoginLimiter(Rate(100, 0), Rate(2, 0), max_keys=100)
+    return TestClient(app, follow_redirects=False)
+
+
+def login(client: TestClient, password: str) -> int:
+    data = {"email": "author@example.com", "password": password}
+    return client.post("/auth/login", data=data).status_code
+
+
+def test_successful_logins_give_their_email_token_back(client):
+    assert [login(client, "right") for _ in range(5)] == [303] * 5
+
+
+def test_failed_logins_spend_email_tokens(client):
+    assert [login(client, "wrong") for _ in range(3)] == [303, 303, 429]
+    assert login(client, "right") == 429
+
+
+def test_throttled_attempts_leave_the_session_alone(client):
+    login(client, "wrong")
+    login(client, "wrong")
+    client.cookies.clear()
+
+    response = client.post("/auth/login", data={"email": "author@example.com", "password": "wrong"})
+    assert response.status_code == 429
+    assert "set-cookie" not in response.headers